@@ -0,0 +1,28 @@
+"""add (product_id, created_at, id) index on stock_movements for product ledger pages
+
+Revision ID: 0b9d4e6f3a21
+Revises: a7c3e9f2b184
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0b9d4e6f3a21'
+down_revision: Union[str, Sequence[str], None] = 'a7c3e9f2b184'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_stock_movements_product_created_at_id', 'stock_movements', ['product_id', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_stock_movements_product_created_at_id', table_name='stock_movements')
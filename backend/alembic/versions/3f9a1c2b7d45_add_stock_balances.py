@@ -0,0 +1,48 @@
+"""add stock_balances table
+
+Revision ID: 3f9a1c2b7d45
+Revises: ae0c47180d53
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9a1c2b7d45'
+down_revision: Union[str, Sequence[str], None] = 'ae0c47180d53'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('stock_balances',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('warehouse_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.ForeignKeyConstraint(['warehouse_id'], ['warehouses.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('product_id', 'warehouse_id', name='unique_stock_balance_product_warehouse')
+    )
+    op.create_index(op.f('ix_stock_balances_id'), 'stock_balances', ['id'], unique=False)
+    op.create_index(op.f('ix_stock_balances_warehouse_id'), 'stock_balances', ['warehouse_id'], unique=False)
+    # Backfill balances from the existing ledger
+    op.execute(
+        "INSERT INTO stock_balances (product_id, warehouse_id, quantity) "
+        "SELECT product_id, warehouse_id, SUM(quantity) FROM stock_movements "
+        "GROUP BY product_id, warehouse_id"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_stock_balances_warehouse_id'), table_name='stock_balances')
+    op.drop_index(op.f('ix_stock_balances_id'), table_name='stock_balances')
+    op.drop_table('stock_balances')
@@ -0,0 +1,51 @@
+"""add maintained warehouse_stats table and warehouses.created_at index
+
+Revision ID: 5c8e2a7f1d46
+Revises: 0b9d4e6f3a21
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c8e2a7f1d46'
+down_revision: Union[str, Sequence[str], None] = '0b9d4e6f3a21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'warehouse_stats',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('warehouse_id', sa.Integer(), nullable=False),
+        sa.Column('product_count', sa.Integer(), nullable=False),
+        sa.Column('total_value', sa.Float(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['warehouse_id'], ['warehouses.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('warehouse_id')
+    )
+    op.create_index(op.f('ix_warehouse_stats_id'), 'warehouse_stats', ['id'], unique=False)
+    op.create_index(op.f('ix_warehouses_created_at'), 'warehouses', ['created_at'], unique=False)
+    # Backfill from the balances: positive quantities of active products only
+    op.execute("""
+        INSERT INTO warehouse_stats (warehouse_id, product_count, total_value)
+        SELECT b.warehouse_id, COUNT(b.product_id), SUM(b.quantity * p.price)
+        FROM stock_balances b
+        JOIN products p ON p.id = b.product_id
+        WHERE b.quantity > 0 AND p.is_active = true
+        GROUP BY b.warehouse_id
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_warehouses_created_at'), table_name='warehouses')
+    op.drop_index(op.f('ix_warehouse_stats_id'), table_name='warehouse_stats')
+    op.drop_table('warehouse_stats')
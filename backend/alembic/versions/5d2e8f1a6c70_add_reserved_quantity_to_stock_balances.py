@@ -0,0 +1,37 @@
+"""add reserved_quantity to stock_balances
+
+Revision ID: 5d2e8f1a6c70
+Revises: 8c41d7e2a9b3
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2e8f1a6c70'
+down_revision: Union[str, Sequence[str], None] = '8c41d7e2a9b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('stock_balances', sa.Column('reserved_quantity', sa.Integer(), server_default='0', nullable=False))
+    # Reserve stock for requests that were already pending before reservations existed
+    op.execute(
+        "UPDATE stock_balances SET reserved_quantity = COALESCE(("
+        "SELECT SUM(ABS(r.quantity)) FROM stock_movement_requests r "
+        "WHERE r.status = 'pending' AND r.product_id = stock_balances.product_id AND ("
+        "(r.movement_type = 'out' AND r.warehouse_id = stock_balances.warehouse_id) OR "
+        "(r.movement_type = 'transfer' AND r.from_warehouse_id = stock_balances.warehouse_id))"
+        "), 0)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('stock_balances', 'reserved_quantity')
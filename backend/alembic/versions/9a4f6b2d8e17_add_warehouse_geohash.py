@@ -0,0 +1,42 @@
+"""add indexed geohash column to warehouses for nearest-warehouse search
+
+Revision ID: 9a4f6b2d8e17
+Revises: 5c8e2a7f1d46
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.geo import warehouse_geohash
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a4f6b2d8e17'
+down_revision: Union[str, Sequence[str], None] = '5c8e2a7f1d46'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('warehouses', sa.Column('geohash', sa.String(length=12).with_variant(sa.String(length=12, collation='C'), 'postgresql'), nullable=True))
+    op.create_index(op.f('ix_warehouses_geohash'), 'warehouses', ['geohash'], unique=False)
+    # Backfill existing coordinates
+    conn = op.get_bind()
+    rows = conn.execute(sa.text(
+        "SELECT id, latitude, longitude FROM warehouses WHERE latitude IS NOT NULL AND longitude IS NOT NULL"
+    )).all()
+    for warehouse_id, latitude, longitude in rows:
+        conn.execute(
+            sa.text("UPDATE warehouses SET geohash = :geohash WHERE id = :id"),
+            {"geohash": warehouse_geohash(latitude, longitude), "id": warehouse_id}
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_warehouses_geohash'), table_name='warehouses')
+    op.drop_column('warehouses', 'geohash')
@@ -0,0 +1,28 @@
+"""add (created_at, id) index on stock_movements for keyset pagination
+
+Revision ID: b7e3a05d9f12
+Revises: 5d2e8f1a6c70
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e3a05d9f12'
+down_revision: Union[str, Sequence[str], None] = '5d2e8f1a6c70'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_stock_movements_created_at_id', 'stock_movements', ['created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_stock_movements_created_at_id', table_name='stock_movements')
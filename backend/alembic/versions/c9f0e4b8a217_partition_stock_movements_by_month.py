@@ -0,0 +1,126 @@
+"""partition stock_movements by month on PostgreSQL
+
+Revision ID: c9f0e4b8a217
+Revises: b7e3a05d9f12
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from datetime import date, datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9f0e4b8a217'
+down_revision: Union[str, Sequence[str], None] = 'b7e3a05d9f12'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MONTHS_AHEAD = 3
+
+COLUMNS = "id, product_id, warehouse_id, movement_type, quantity, notes, created_at, reference_id, user_id"
+
+INDEXES = [
+    ('ix_stock_movements_id', ['id']),
+    ('ix_stock_movements_reference_id', ['reference_id']),
+    ('ix_stock_movements_created_at', ['created_at']),
+    ('ix_stock_movements_created_at_id', ['created_at', 'id']),
+]
+
+
+def add_months(d, months):
+    month_index = d.year * 12 + (d.month - 1) + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def drop_indexes():
+    for name, _ in INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+def create_indexes():
+    for name, columns in INDEXES:
+        op.create_index(name, 'stock_movements', columns, unique=False)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        # SQLite and other backends keep the plain table
+        op.execute("UPDATE stock_movements SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL")
+        return
+
+    op.execute("UPDATE stock_movements SET created_at = now() WHERE created_at IS NULL")
+    op.execute("ALTER TABLE stock_movements RENAME TO stock_movements_unpartitioned")
+    op.execute("ALTER TABLE stock_movements_unpartitioned RENAME CONSTRAINT stock_movements_pkey TO stock_movements_unpartitioned_pkey")
+    drop_indexes()
+    # Keep the id sequence alive when the old table is dropped
+    op.execute("ALTER SEQUENCE stock_movements_id_seq OWNED BY NONE")
+
+    op.execute("""
+        CREATE TABLE stock_movements (
+            id INTEGER NOT NULL DEFAULT nextval('stock_movements_id_seq'),
+            product_id INTEGER NOT NULL REFERENCES products (id),
+            warehouse_id INTEGER NOT NULL REFERENCES warehouses (id),
+            movement_type VARCHAR(50) NOT NULL,
+            quantity INTEGER NOT NULL,
+            notes TEXT,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now(),
+            reference_id VARCHAR(36),
+            user_id INTEGER REFERENCES users (id),
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.execute("ALTER SEQUENCE stock_movements_id_seq OWNED BY stock_movements.id")
+
+    # One partition per month from the oldest ledger row to a few months ahead. Partition
+    # bounds are UTC, so the months are too (not the session time zone's)
+    oldest = bind.execute(sa.text("SELECT MIN(created_at) FROM stock_movements_unpartitioned")).scalar()
+    this_month = datetime.now(timezone.utc).date().replace(day=1)
+    month = this_month if oldest is None else oldest.astimezone(timezone.utc).date().replace(day=1)
+    last = add_months(this_month, MONTHS_AHEAD)
+    while month <= last:
+        end = add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE stock_movements_p{month.year:04d}_{month.month:02d} PARTITION OF stock_movements "
+            f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') TO ('{end.isoformat()} 00:00:00+00')"
+        )
+        month = end
+    op.execute("CREATE TABLE stock_movements_default PARTITION OF stock_movements DEFAULT")
+
+    op.execute(f"INSERT INTO stock_movements ({COLUMNS}) SELECT {COLUMNS} FROM stock_movements_unpartitioned")
+    op.execute("DROP TABLE stock_movements_unpartitioned")
+    create_indexes()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+
+    op.execute("ALTER TABLE stock_movements RENAME TO stock_movements_partitioned")
+    drop_indexes()
+    op.execute("ALTER SEQUENCE stock_movements_id_seq OWNED BY NONE")
+    op.execute("""
+        CREATE TABLE stock_movements (
+            id INTEGER NOT NULL DEFAULT nextval('stock_movements_id_seq'),
+            product_id INTEGER NOT NULL REFERENCES products (id),
+            warehouse_id INTEGER NOT NULL REFERENCES warehouses (id),
+            movement_type VARCHAR(50) NOT NULL,
+            quantity INTEGER NOT NULL,
+            notes TEXT,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+            reference_id VARCHAR(36),
+            user_id INTEGER REFERENCES users (id),
+            CONSTRAINT stock_movements_pkey PRIMARY KEY (id)
+        )
+    """)
+    op.execute("ALTER SEQUENCE stock_movements_id_seq OWNED BY stock_movements.id")
+    op.execute(f"INSERT INTO stock_movements ({COLUMNS}) SELECT {COLUMNS} FROM stock_movements_partitioned")
+    # Dropping the parent drops every partition with it
+    op.execute("DROP TABLE stock_movements_partitioned")
+    create_indexes()
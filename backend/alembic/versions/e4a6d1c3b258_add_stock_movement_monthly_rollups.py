@@ -0,0 +1,59 @@
+"""add stock_movement_monthly_rollups table
+
+Revision ID: e4a6d1c3b258
+Revises: c9f0e4b8a217
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4a6d1c3b258'
+down_revision: Union[str, Sequence[str], None] = 'c9f0e4b8a217'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('stock_movement_monthly_rollups',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('month', sa.String(length=7), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('warehouse_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('movement_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.ForeignKeyConstraint(['warehouse_id'], ['warehouses.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('month', 'product_id', 'warehouse_id', 'user_id', name='unique_monthly_rollup_key')
+    )
+    op.create_index(op.f('ix_stock_movement_monthly_rollups_id'), 'stock_movement_monthly_rollups', ['id'], unique=False)
+    op.create_index(op.f('ix_stock_movement_monthly_rollups_month'), 'stock_movement_monthly_rollups', ['month'], unique=False)
+
+    # Backfill from the existing ledger
+    if op.get_bind().dialect.name == 'sqlite':
+        month = "strftime('%Y-%m', created_at)"
+    else:
+        month = "to_char(created_at AT TIME ZONE 'UTC', 'YYYY-MM')"
+    op.execute(
+        f"""
+        INSERT INTO stock_movement_monthly_rollups (month, product_id, warehouse_id, user_id, quantity, movement_count)
+        SELECT {month}, product_id, warehouse_id, user_id, SUM(quantity), COUNT(id)
+        FROM stock_movements
+        GROUP BY {month}, product_id, warehouse_id, user_id
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_stock_movement_monthly_rollups_month'), table_name='stock_movement_monthly_rollups')
+    op.drop_index(op.f('ix_stock_movement_monthly_rollups_id'), table_name='stock_movement_monthly_rollups')
+    op.drop_table('stock_movement_monthly_rollups')
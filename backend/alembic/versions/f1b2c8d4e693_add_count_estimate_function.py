@@ -0,0 +1,43 @@
+"""add count_estimate() planner estimate function (PostgreSQL only)
+
+Revision ID: f1b2c8d4e693
+Revises: e4a6d1c3b258
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1b2c8d4e693'
+down_revision: Union[str, Sequence[str], None] = 'e4a6d1c3b258'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION count_estimate(query text) RETURNS bigint AS $$
+        DECLARE
+            plan jsonb;
+        BEGIN
+            EXECUTE 'EXPLAIN (FORMAT JSON) ' || query INTO plan;
+            RETURN (plan->0->'Plan'->>'Plan Rows')::bigint;
+        END;
+        $$ LANGUAGE plpgsql VOLATILE STRICT
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute("DROP FUNCTION IF EXISTS count_estimate(text)")
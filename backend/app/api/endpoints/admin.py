@@ -1,23 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-from app.database import get_db
+from typing import Optional
+from datetime import datetime
+from app.database import get_db, get_pool_status
 from app import models, schemas
 from app.auth.admin_dependencies import get_current_admin_user
 
 router = APIRouter()
 
-from app.core.security import get_password_hash
+from app.core.password_hashing import password_hasher
+from app.core.security import token_cache
+from app.crud.stock_crud import rebuild_stock_balances, rebuild_movement_rollups, take_stock_snapshot, to_naive_utc
+from app.partitioning import ensure_stock_movement_partitions
+from app.api.endpoints.dashboard import stats_cache
+from app.api.endpoints.auth import user_cache, invalidate_cached_user, ensure_username_and_email_free, save_new_user
+from starlette.concurrency import run_in_threadpool
 
 @router.post("/users", response_model=schemas.User)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db), admin = Depends(get_current_admin_user)):
-    existing = db.query(models.User).filter(models.User.username == user.username).first()
-    if existing:
-        raise HTTPException(status_code=400, detail="Username already exists")
-    existing = db.query(models.User).filter(models.User.email == user.email).first()
-    if existing:
-        raise HTTPException(status_code=400, detail="Email already exists")
-    hashed_password = get_password_hash(user.password)
+async def create_user(user: schemas.UserCreate, db: Session = Depends(get_db), admin = Depends(get_current_admin_user)):
+    await run_in_threadpool(ensure_username_and_email_free, db, user.username, user.email)
+    # Release the connection while hashing
+    db.close()
+    hashed_password = await password_hasher.hash(user.password)
     db_user = models.User(
         username=user.username,
         email=user.email,
@@ -25,10 +30,7 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db), admin =
         role=user.role,
         location=user.location
     )
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    return db_user
+    return await run_in_threadpool(save_new_user, db, db_user)
 
 @router.get("/users", response_model=list[schemas.User])
 def list_users(db: Session = Depends(get_db), admin = Depends(get_current_admin_user)):
@@ -48,6 +50,7 @@ def toggle_role(user_id: int, db: Session = Depends(get_db), admin = Depends(get
         user.role = "warehouse_owner"  # Toggle to warehouse_owner, not admin
     db.add(user)
     db.commit()
+    invalidate_cached_user(user.id)
     return {"id": user.id, "role": user.role}
 
 @router.put("/users/{user_id}")
@@ -72,6 +75,7 @@ def update_user(user_id: int, payload: schemas.UserUpdate, db: Session = Depends
     if payload.location is not None:
         user.location = payload.location
     db.commit()
+    invalidate_cached_user(user.id)
     return {"id": user.id, "username": user.username, "email": user.email, "role": user.role, "location": user.location}
 
 @router.delete("/users/{user_id}")
@@ -83,6 +87,7 @@ def delete_user(user_id: int, db: Session = Depends(get_db), admin = Depends(get
         raise HTTPException(status_code=400, detail="Cannot delete admin users")
     db.delete(user)
     db.commit()
+    invalidate_cached_user(user_id)
     return {"message": "User deleted successfully"}
 
 @router.get("/analytics/global")
@@ -104,6 +109,42 @@ def global_analytics(db: Session = Depends(get_db), admin = Depends(get_current_
         "total_value": float(total_value)
     }
 
+@router.post("/stock-balances/rebuild")
+def rebuild_balances(db: Session = Depends(get_db), admin = Depends(get_current_admin_user)):
+    # The ledger is the source of truth; recompute the materialized balances and rollups from it
+    rows = rebuild_stock_balances(db)
+    rollup_rows = rebuild_movement_rollups(db)
+    db.commit()
+    stats_cache.clear()
+    return {"message": "Stock balances rebuilt from ledger", "rows": rows, "rollup_rows": rollup_rows}
+
+@router.get("/cache-stats")
+def get_cache_stats(admin = Depends(get_current_admin_user)):
+    return {"dashboard_stats": stats_cache.stats(), "users": user_cache.stats(), "tokens": token_cache.stats()}
+
+@router.get("/pool-stats")
+def get_pool_stats(admin = Depends(get_current_admin_user)):
+    return get_pool_status()
+
+@router.post("/stock-snapshots")
+def create_stock_snapshot(snapshot_at: Optional[datetime] = Query(None), db: Session = Depends(get_db), admin = Depends(get_current_admin_user)):
+    # Intended to be called daily (e.g. from cron); defaults to the start of the current UTC day
+    if snapshot_at is None:
+        snapshot_at = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    snapshot_at = to_naive_utc(snapshot_at)
+    if snapshot_at > datetime.utcnow():
+        raise HTTPException(status_code=400, detail="Snapshot time cannot be in the future")
+    rows = take_stock_snapshot(db, snapshot_at)
+    db.commit()
+    return {"snapshot_at": snapshot_at, "rows": rows}
+
+@router.post("/stock-movements/partitions")
+def create_stock_movement_partitions(months_ahead: int = Query(3, ge=0, le=24), db: Session = Depends(get_db), admin = Depends(get_current_admin_user)):
+    # Scheduler hook; startup already covers the next few months
+    partitions = ensure_stock_movement_partitions(db.connection(), months_ahead=months_ahead)
+    db.commit()
+    return {"partitions": partitions}
+
 @router.get("/warehouses/{warehouse_id}/users")
 def get_warehouse_user_usage(warehouse_id: int, db: Session = Depends(get_db), admin = Depends(get_current_admin_user)):
     warehouse = db.query(models.Warehouse).filter(models.Warehouse.id == warehouse_id).first()
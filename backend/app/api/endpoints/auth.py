@@ -1,13 +1,20 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from sqlalchemy.exc import SQLAlchemyError
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from datetime import timedelta
 import logging
 
 from ... import models, schemas
+from ...config import settings
 from ...database import get_db
+from ...async_database import get_async_db
 from ...core import security
+from ...core.cache import TTLCache
+from ...core.password_hashing import password_hasher
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -23,22 +30,91 @@ def get_user_by_username_or_email(db: Session, identifier: str):
         (models.User.username == identifier) | (models.User.email == identifier)
     ).first()
 
-def authenticate_user(db: Session, identifier: str, password: str):
+async def authenticate_user(db: Session, identifier: str, password: str):
     """Authenticates a user based on username/email and password."""
-    user = get_user_by_username_or_email(db, identifier)
-    if not user or not security.verify_password(password, user.hashed_password):
+    user = await run_in_threadpool(get_user_by_username_or_email, db, identifier)
+    # Hand the connection back to the pool before the slow hash check; the loaded user stays readable
+    db.close()
+    if not user or not await password_hasher.verify(password, user.hashed_password):
         return None
     return user
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> models.User:
-    """Gets the current user from the provided JWT token."""
+def ensure_username_and_email_free(db: Session, username: str, email: str) -> None:
+    """Raises 400 if the username or email is already taken."""
+    if db.query(models.User).filter(models.User.username == username).first():
+        raise HTTPException(status_code=400, detail="Username already exists")
+    if db.query(models.User).filter(models.User.email == email).first():
+        raise HTTPException(status_code=400, detail="Email already exists")
+
+def save_password_hash(db: Session, user_id: int, hashed_password: str) -> None:
+    db.query(models.User).filter(models.User.id == user_id).update({models.User.hashed_password: hashed_password})
+    db.commit()
+
+def save_new_user(db: Session, user: models.User) -> models.User:
+    """Insert a user checked by ensure_username_and_email_free before hashing its password.
+
+    Another request may take the username or email while the hash is computed; the
+    unique constraints catch it, and the re-check turns it into the pre-check's 400.
+    """
+    db.add(user)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        ensure_username_and_email_free(db, user.username, user.email)
+        raise
+    db.refresh(user)
+    return user
+
+# Column values of recently authenticated users, keyed by user id. Endpoints that change a
+# user drop its entry; the TTL bounds how stale another worker process can be.
+user_cache = TTLCache(settings.USER_CACHE_TTL_SECONDS, maxsize=settings.USER_CACHE_MAX_ENTRIES)
+USER_CACHE_COLUMNS = [attr.key for attr in inspect(models.User).column_attrs]
+
+def invalidate_cached_user(user_id: int) -> None:
+    user_cache.delete(user_id)
+
+def user_id_from_token(token: str) -> int:
     payload = security.decode_access_token(token)
     if not payload:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-    user_id = int(payload.get("sub"))
+    return int(payload.get("sub"))
+
+def cached_user(user_id: int):
+    """A detached copy of the cached user, or None on a miss."""
+    record = user_cache.get(user_id)
+    if record is None:
+        return None
+    user = models.User(**record)
+    make_transient_to_detached(user)
+    return user
+
+def cache_user(user: models.User) -> None:
+    user_cache.set(user.id, {key: getattr(user, key) for key in USER_CACHE_COLUMNS})
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> models.User:
+    """Gets the current user from the provided JWT token."""
+    user_id = user_id_from_token(token)
+    user = cached_user(user_id)
+    if user is not None:
+        # Attach the copy to this session without a SELECT, so endpoints can still modify and commit it
+        return db.merge(user, load=False)
     user = db.query(models.User).get(user_id)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+    cache_user(user)
+    return user
+
+async def get_current_user_async(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)) -> models.User:
+    """get_current_user for async endpoints, loading the user through the async session."""
+    user_id = user_id_from_token(token)
+    user = cached_user(user_id)
+    if user is not None:
+        return await db.merge(user, load=False)
+    user = await db.get(models.User, user_id)
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
+    cache_user(user)
     return user
 
 def get_current_admin(current_user: models.User = Depends(get_current_user)):
@@ -48,21 +124,15 @@ def get_current_admin(current_user: models.User = Depends(get_current_user)):
     return current_user
 
 @router.post("/register", response_model=schemas.UserRead, status_code=status.HTTP_201_CREATED)
-def register(payload: schemas.UserCreate, db: Session = Depends(get_db)):
+async def register(payload: schemas.UserCreate, db: Session = Depends(get_db)):
     """Registers a new user."""
     try:
-        # Check if username already exists
-        existing_username = db.query(models.User).filter(models.User.username == payload.username).first()
-        if existing_username:
-            raise HTTPException(status_code=400, detail="Username already exists")
-
-        # Check if email already exists
-        existing_email = db.query(models.User).filter(models.User.email == payload.email).first()
-        if existing_email:
-            raise HTTPException(status_code=400, detail="Email already exists")
+        # Check that username and email are free, then release the connection while hashing
+        await run_in_threadpool(ensure_username_and_email_free, db, payload.username, payload.email)
+        db.close()
 
         # Hash password and create new user
-        hashed = security.get_password_hash(payload.password)
+        hashed = await password_hasher.hash(payload.password)
         user = models.User(
             username=payload.username,
             email=payload.email,
@@ -72,10 +142,7 @@ def register(payload: schemas.UserCreate, db: Session = Depends(get_db)):
         )
         
         # Add to database and commit
-        db.add(user)
-        db.commit()
-        db.refresh(user)
-        return user
+        return await run_in_threadpool(save_new_user, db, user)
     except HTTPException as e:
         # Re-raise explicit HTTPException errors
         raise e
@@ -96,11 +163,11 @@ def register(payload: schemas.UserCreate, db: Session = Depends(get_db)):
         )
 
 @router.post("/login", response_model=schemas.Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     """Logs in an existing user and returns a JWT token."""
     try:
         # OAuth2PasswordRequestForm always sends "username" field → can be email OR username
-        user = authenticate_user(db, form_data.username, form_data.password)
+        user = await authenticate_user(db, form_data.username, form_data.password)
         if not user:
             raise HTTPException(status_code=401, detail="Incorrect username/email or password")
 
@@ -163,6 +230,7 @@ def update_me(payload: schemas.UserUpdate, db: Session = Depends(get_db), curren
             current_user.role = payload.role
 
         db.commit()
+        invalidate_cached_user(current_user.id)
         db.refresh(current_user)
         return current_user
     except HTTPException as e:
@@ -182,18 +250,21 @@ def update_me(payload: schemas.UserUpdate, db: Session = Depends(get_db), curren
         )
 
 @router.post("/change-password")
-def change_password(payload: schemas.ChangePassword, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+async def change_password(payload: schemas.ChangePassword, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     """Changes the current user's password."""
     try:
+        # Release the connection while hashing; the loaded user stays readable
+        user_id = current_user.id
+        db.close()
+
         # Verify old password
-        if not security.verify_password(payload.old_password, current_user.hashed_password):
+        if not await password_hasher.verify(payload.old_password, current_user.hashed_password):
             raise HTTPException(status_code=400, detail="Incorrect old password")
 
         # Hash new password and update
-        hashed = security.get_password_hash(payload.new_password)
-        current_user.hashed_password = hashed
-
-        db.commit()
+        hashed = await password_hasher.hash(payload.new_password)
+        await run_in_threadpool(save_password_hash, db, user_id, hashed)
+        invalidate_cached_user(user_id)
         return {"message": "Password changed successfully"}
     except HTTPException as e:
         raise e
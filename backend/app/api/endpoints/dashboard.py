@@ -1,14 +1,29 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, desc, or_, select, union_all, literal, cast, null, Integer, String, Float
 from datetime import datetime, timedelta
 from app.database import get_db
+from app.async_database import get_async_db
 from app import models
-from typing import List
-from app.api.endpoints.auth import get_current_user
+from typing import List, Iterable
+from app.api.endpoints.auth import get_current_user, get_current_user_async
+from app.config import settings
+from app.core.cache import TTLCache
 
 router = APIRouter()
 
+# /stats payloads keyed by (user_id, role); writes drop the entries whose scope they touch
+stats_cache = TTLCache(ttl_seconds=settings.DASHBOARD_CACHE_TTL_SECONDS, maxsize=settings.DASHBOARD_CACHE_MAX_ENTRIES)
+
+def invalidate_dashboard_stats(owner_ids: Iterable[int] = (), all_users: bool = False) -> int:
+    """Drop cached stats for admins, the given product/warehouse owners and, with all_users, every
+    normal user (they see all available warehouses). Call after the write has been committed."""
+    owner_ids = set(owner_ids)
+    return stats_cache.invalidate(
+        lambda key: key[1] == "admin" or key[0] in owner_ids or (all_users and key[1] == "user")
+    )
+
 @router.get("/user-analytics")
 def get_user_analytics(db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     if current_user.role != "warehouse_owner":
@@ -46,265 +61,215 @@ def get_user_analytics(db: Session = Depends(get_db), current_user: models.User
         ]
     }
 
-@router.get("/stats")
-def get_dashboard_stats(db: Session = Depends(get_db), current_user = Depends(get_current_user)):
-    # Base queries filtered by role
-    product_query = db.query(models.Product)
-    warehouse_query = db.query(models.Warehouse)
-    movement_query = db.query(models.StockMovement).join(models.Product, models.StockMovement.product_id == models.Product.id)
+LOW_STOCK_THRESHOLD = 20
+TOP_PRODUCTS_LIMIT = 5
+TREND_DAYS = 180
 
-    if current_user.role == "admin":
-        pass
-    elif current_user.role == "warehouse_owner":
-        product_query = product_query.filter(models.Product.owner_id == current_user.id)
-        warehouse_query = warehouse_query.filter(models.Warehouse.owner_id == current_user.id)
-        movement_query = movement_query.filter(models.Product.owner_id == current_user.id)
-    else:  # USER
-        product_query = product_query.filter(models.Product.owner_id == current_user.id)
-        # Warehouses that are available (ignore location and assignment for visibility)
-        assigned_warehouse_ids = select(models.UserWarehouseAssignment.warehouse_id).where(models.UserWarehouseAssignment.user_id == current_user.id)
-        warehouse_query = warehouse_query.filter(
-            models.Warehouse.is_available == True
-        )
-        movement_query = movement_query.filter(models.Product.owner_id == current_user.id).join(models.Warehouse, models.StockMovement.warehouse_id == models.Warehouse.id).filter(
-            models.Warehouse.is_available == True
-        )
+def build_dashboard_stats_query(current_user, six_months_ago: str):
+    """All /stats sections as one UNION ALL over shared, role-scoped CTEs.
 
-    # Get basic counts
-    total_products = product_query.count()
-    total_warehouses = warehouse_query.count()
+    Every row is (section, id, label, sublabel, quantity, price, value); columns a
+    section does not use are NULL.
+    """
+    Rollup = models.StockMovementMonthlyRollup
+    is_admin = current_user.role == "admin"
 
-    # Calculate total stock across all warehouses
-    total_stock = movement_query.with_entities(func.sum(models.StockMovement.quantity)).scalar() or 0
+    # Product filter applied wherever products are joined; joining the table itself (rather than
+    # a CTE of it) keeps primary key lookups available to the planner
+    product_scope = [] if is_admin else [models.Product.owner_id == current_user.id]
 
-    # Get products with low stock (less than 20% of max stock)
-    stock_per_product = db.query(
+    warehouse_scope = []
+    if current_user.role == "warehouse_owner":
+        warehouse_scope = [models.Warehouse.owner_id == current_user.id]
+    elif not is_admin:
+        warehouse_scope = [models.Warehouse.is_available == True]
+
+    # Balances of products in scope; normal users only count available warehouses
+    scoped_balances = select(
+        models.StockBalance.product_id,
+        models.StockBalance.quantity,
+        models.Warehouse.name.label("warehouse_name"),
+        models.Warehouse.owner_id.label("warehouse_owner_id")
+    ).join(
+        models.Product, models.StockBalance.product_id == models.Product.id
+    ).join(
+        models.Warehouse, models.StockBalance.warehouse_id == models.Warehouse.id
+    ).where(*product_scope)
+    if current_user.role == "user":
+        scoped_balances = scoped_balances.where(models.Warehouse.is_available == True)
+    scoped_balances = scoped_balances.cte("scoped_balances")
+
+    # Per-product totals across all warehouses, for low stock and top products
+    product_totals = select(
         models.Product.id,
         models.Product.name,
-        func.sum(models.StockMovement.quantity).label('total_stock')
-    ).join(models.StockMovement, models.Product.id == models.StockMovement.product_id).group_by(models.Product.id)
-    if current_user.role != "admin":
-        stock_per_product = stock_per_product.filter(models.Product.owner_id == current_user.id)
-    stock_per_product = stock_per_product.subquery()
+        models.Product.price,
+        func.sum(models.StockBalance.quantity).label("total_stock")
+    ).join(
+        models.StockBalance, models.StockBalance.product_id == models.Product.id
+    ).where(*product_scope).group_by(
+        models.Product.id, models.Product.name, models.Product.price
+    ).cte("product_totals")
 
-    low_stock_products = db.query(
-        models.Product,
-        stock_per_product.c.total_stock
+    # Rollup rows in scope, pre-aggregated once for both trends; only warehouse owners need
+    # the per-user and per-warehouse breakdown
+    rollup_keys = [Rollup.month]
+    if current_user.role == "warehouse_owner":
+        rollup_keys += [Rollup.user_id, Rollup.warehouse_id]
+    scoped_rollups = select(
+        *rollup_keys,
+        func.sum(Rollup.quantity).label("quantity"),
+        func.sum(Rollup.quantity * models.Product.price).label("value")
     ).join(
-        stock_per_product,
-        models.Product.id == stock_per_product.c.id
-    ).filter(
-        stock_per_product.c.total_stock <= 20  # Threshold of 20 units
-    )
-    if current_user.role != "admin":
-        low_stock_products = low_stock_products.filter(models.Product.owner_id == current_user.id)
-    low_stock_products = low_stock_products.all()
+        models.Product, Rollup.product_id == models.Product.id
+    ).where(
+        Rollup.month >= six_months_ago, *product_scope
+    ).group_by(*rollup_keys).cte("scoped_rollups")
+
+    def section(name, id=None, label=None, sublabel=None, quantity=None, price=None, value=None):
+        return [
+            literal(name, String).label("section"),
+            (id if id is not None else cast(null(), Integer)).label("id"),
+            (label if label is not None else cast(null(), String)).label("label"),
+            (sublabel if sublabel is not None else cast(null(), String)).label("sublabel"),
+            (quantity if quantity is not None else cast(null(), Integer)).label("quantity"),
+            (price if price is not None else cast(null(), Float)).label("price"),
+            (value if value is not None else cast(null(), Float)).label("value"),
+        ]
+
+    parts = [
+        select(*section("total_products", quantity=func.count())).select_from(models.Product).where(*product_scope),
+        select(*section("total_warehouses", quantity=func.count())).select_from(models.Warehouse).where(*warehouse_scope),
+        select(*section("total_stock", quantity=func.coalesce(func.sum(scoped_balances.c.quantity), 0))),
+        select(*section(
+            "low_stock", id=product_totals.c.id, label=product_totals.c.name, quantity=product_totals.c.total_stock
+        )).where(product_totals.c.total_stock <= LOW_STOCK_THRESHOLD),
+    ]
+
+    top_products = select(
+        product_totals,
+        (product_totals.c.price * product_totals.c.total_stock).label("total_value")
+    ).order_by(
+        desc("total_value"), product_totals.c.id
+    ).limit(TOP_PRODUCTS_LIMIT).subquery()
+    parts.append(select(*section(
+        "top_products", id=top_products.c.id, label=top_products.c.name, quantity=top_products.c.total_stock,
+        price=top_products.c.price, value=top_products.c.total_value
+    )))
 
-    # Get recent stock movements (last 6 months)
-    six_months_ago = datetime.utcnow() - timedelta(days=180)
+    warehouse_balances = select(*section(
+        "stock_by_warehouse", label=scoped_balances.c.warehouse_name, quantity=func.sum(scoped_balances.c.quantity)
+    ))
     if current_user.role == "warehouse_owner":
-        # For warehouse owners, get movements per user associated with their warehouses
-        if db.bind.dialect.name == 'sqlite':
-            user_movements_query = db.query(
-                func.strftime('%Y-%m', models.StockMovement.created_at).label('month'),
-                models.User.username.label('username'),
-                func.sum(models.StockMovement.quantity).label('total_quantity')
-            ).join(models.Product, models.StockMovement.product_id == models.Product.id).join(
-                models.User, models.StockMovement.user_id == models.User.id
-            ).join(
-                models.Warehouse, models.StockMovement.warehouse_id == models.Warehouse.id
-            ).filter(
-                models.StockMovement.created_at >= six_months_ago,
-                models.Warehouse.owner_id == current_user.id,
-                models.Product.owner_id == current_user.id
-            ).group_by(
-                func.strftime('%Y-%m', models.StockMovement.created_at),
-                models.User.username
-            ).order_by(
-                'month', models.User.username
-            ).all()
+        warehouse_balances = warehouse_balances.where(scoped_balances.c.warehouse_owner_id == current_user.id)
+    parts.append(warehouse_balances.group_by(scoped_balances.c.warehouse_name))
+
+    if current_user.role == "warehouse_owner":
+        # Warehouse owners see movements per user in their own warehouses
+        parts.append(select(*section(
+            "movements_trend", label=scoped_rollups.c.month, sublabel=models.User.username,
+            quantity=func.sum(scoped_rollups.c.quantity)
+        )).join(
+            models.User, scoped_rollups.c.user_id == models.User.id
+        ).join(
+            models.Warehouse, scoped_rollups.c.warehouse_id == models.Warehouse.id
+        ).where(
+            models.Warehouse.owner_id == current_user.id
+        ).group_by(scoped_rollups.c.month, models.User.username))
+    else:
+        parts.append(select(*section(
+            "movements_trend", label=scoped_rollups.c.month, quantity=scoped_rollups.c.quantity
+        )))
+
+    # Valued at current product prices
+    parts.append(select(*section(
+        "value_trend", label=scoped_rollups.c.month,
+        value=func.sum(scoped_rollups.c.value)
+    )).group_by(scoped_rollups.c.month))
+
+    return union_all(*parts)
+
+@router.get("/stats")
+async def get_dashboard_stats(db: AsyncSession = Depends(get_async_db), current_user = Depends(get_current_user_async)):
+    cache_key = (current_user.id, current_user.role)
+    cached = stats_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    six_months_ago = (datetime.utcnow() - timedelta(days=TREND_DAYS)).strftime('%Y-%m')
+    rows = (await db.execute(build_dashboard_stats_query(current_user, six_months_ago))).all()
+
+    totals = {}
+    sections = {}
+    for row in rows:
+        if row.section in ("total_products", "total_warehouses", "total_stock"):
+            totals[row.section] = row.quantity or 0
         else:
-            user_movements_query = db.query(
-                func.to_char(models.StockMovement.created_at, 'YYYY-MM').label('month'),
-                models.User.username.label('username'),
-                func.sum(models.StockMovement.quantity).label('total_quantity')
-            ).join(models.Product, models.StockMovement.product_id == models.Product.id).join(
-                models.User, models.StockMovement.user_id == models.User.id
-            ).join(
-                models.Warehouse, models.StockMovement.warehouse_id == models.Warehouse.id
-            ).filter(
-                models.StockMovement.created_at >= six_months_ago,
-                models.Warehouse.owner_id == current_user.id,
-                models.Product.owner_id == current_user.id
-            ).group_by(
-                func.to_char(models.StockMovement.created_at, 'YYYY-MM'),
-                models.User.username
-            ).order_by(
-                'month', models.User.username
-            ).all()
+            sections.setdefault(row.section, []).append(row)
 
+    low_stock_products = sorted(sections.get("low_stock", []), key=lambda r: r.id)
+    top_products = sorted(sections.get("top_products", []), key=lambda r: (-r.value, r.id))
+
+    if current_user.role == "warehouse_owner":
         # Group by month, then by user
         movements_by_month = {}
-        for movement in user_movements_query:
-            month = movement[0]
-            username = movement[1]
-            quantity = movement[2]
-            if month not in movements_by_month:
-                movements_by_month[month] = {}
-            movements_by_month[month][username] = quantity
-
-        stock_movements_trend = []
-        for month in sorted(movements_by_month.keys()):
-            users_data = movements_by_month[month]
-            stock_movements_trend.append({
+        for row in sorted(sections.get("movements_trend", []), key=lambda r: (r.label, r.sublabel)):
+            movements_by_month.setdefault(row.label, {})[row.sublabel] = row.quantity
+        stock_movements_trend = [
+            {
                 "month": month,
                 "users": [{"username": user, "quantity": qty} for user, qty in users_data.items()]
-            })
+            }
+            for month, users_data in movements_by_month.items()
+        ]
     else:
-        # For admin and normal users, keep the total trend
-        if db.bind.dialect.name == 'sqlite':
-            recent_movements_query = db.query(
-                func.strftime('%Y-%m', models.StockMovement.created_at).label('month'),
-                func.sum(models.StockMovement.quantity).label('total_quantity')
-            ).join(models.Product, models.StockMovement.product_id == models.Product.id).filter(
-                models.StockMovement.created_at >= six_months_ago
-            )
-            if current_user.role != "admin":
-                recent_movements_query = recent_movements_query.filter(models.Product.owner_id == current_user.id)
-            recent_movements = recent_movements_query.group_by(
-                func.strftime('%Y-%m', models.StockMovement.created_at)
-            ).order_by(
-                'month'
-            ).all()
-        else:
-            recent_movements_query = db.query(
-                func.to_char(models.StockMovement.created_at, 'YYYY-MM').label('month'),
-                func.sum(models.StockMovement.quantity).label('total_quantity')
-            ).join(models.Product, models.StockMovement.product_id == models.Product.id).filter(
-                models.StockMovement.created_at >= six_months_ago
-            )
-            if current_user.role != "admin":
-                recent_movements_query = recent_movements_query.filter(models.Product.owner_id == current_user.id)
-            recent_movements = recent_movements_query.group_by(
-                func.to_char(models.StockMovement.created_at, 'YYYY-MM')
-            ).order_by(
-                'month'
-            ).all()
-
         stock_movements_trend = [
             {
-                "month": movement[0],
-                "total_quantity": movement[1]
+                "month": row.label,
+                "total_quantity": row.quantity
             }
-            for movement in recent_movements
+            for row in sorted(sections.get("movements_trend", []), key=lambda r: r.label)
         ]
 
-    # Get stock distribution by warehouse
-    stock_by_warehouse_query = db.query(
-        models.Warehouse.name.label('warehouse_name'),
-        func.sum(models.StockMovement.quantity).label('total_stock')
-    ).join(
-        models.StockMovement,
-        models.Warehouse.id == models.StockMovement.warehouse_id
-    ).join(
-        models.Product,
-        models.StockMovement.product_id == models.Product.id
-    )
-    if current_user.role == "admin":
-        pass
-    elif current_user.role == "warehouse_owner":
-        stock_by_warehouse_query = stock_by_warehouse_query.filter(models.Warehouse.owner_id == current_user.id, models.Product.owner_id == current_user.id)
-    else:  # USER
-        assigned_warehouse_ids = select(models.UserWarehouseAssignment.warehouse_id).where(models.UserWarehouseAssignment.user_id == current_user.id)
-        stock_by_warehouse_query = stock_by_warehouse_query.filter(
-            models.Warehouse.is_available == True,
-            models.Product.owner_id == current_user.id
-        )
-    stock_by_warehouse = stock_by_warehouse_query.group_by(
-        models.Warehouse.name
-    ).all()
-
-    # Get top 5 products by stock value
-    top_products_query = db.query(
-        models.Product.id,
-        models.Product.name,
-        models.Product.price,
-        func.sum(models.StockMovement.quantity).label('total_stock'),
-        (models.Product.price * func.sum(models.StockMovement.quantity)).label('total_value')
-    ).join(models.StockMovement, models.Product.id == models.StockMovement.product_id).group_by(models.Product.id, models.Product.name, models.Product.price)
-    if current_user.role != "admin":
-        top_products_query = top_products_query.filter(models.Product.owner_id == current_user.id)
-    top_products = top_products_query.order_by(
-        desc((models.Product.price * func.sum(models.StockMovement.quantity)))
-    ).limit(5).all()
-
-    # Get stock value trend (last 6 months)
-    if db.bind.dialect.name == 'sqlite':
-        value_trend_query = db.query(
-            func.strftime('%Y-%m', models.StockMovement.created_at).label('month'),
-            func.sum(models.StockMovement.quantity * models.Product.price).label('total_value')
-        ).join(models.Product, models.StockMovement.product_id == models.Product.id).filter(
-            models.StockMovement.created_at >= six_months_ago
-        )
-        if current_user.role != "admin":
-            value_trend_query = value_trend_query.filter(models.Product.owner_id == current_user.id)
-        value_trend = value_trend_query.group_by(
-            func.strftime('%Y-%m', models.StockMovement.created_at)
-        ).order_by(
-            'month'
-        ).all()
-    else:
-        value_trend_query = db.query(
-            func.to_char(models.StockMovement.created_at, 'YYYY-MM').label('month'),
-            func.sum(models.StockMovement.quantity * models.Product.price).label('total_value')
-        ).join(models.Product, models.StockMovement.product_id == models.Product.id).filter(
-            models.StockMovement.created_at >= six_months_ago
-        )
-        if current_user.role != "admin":
-            value_trend_query = value_trend_query.filter(models.Product.owner_id == current_user.id)
-        value_trend = value_trend_query.group_by(
-            func.to_char(models.StockMovement.created_at, 'YYYY-MM')
-        ).order_by(
-            'month'
-        ).all()
-
-    return {
-        "total_products": total_products,
-        "total_warehouses": total_warehouses,
-        "total_stock": total_stock,
+    stats = {
+        "total_products": totals.get("total_products", 0),
+        "total_warehouses": totals.get("total_warehouses", 0),
+        "total_stock": totals.get("total_stock", 0),
         "low_stock_items": len(low_stock_products),
         "low_stock_products": [
             {
-                "id": str(product[0].id),
-                "name": product[0].name,
-                "current_stock": product[1],
-                "threshold": 20  # We can make this configurable per product later
+                "id": str(row.id),
+                "name": row.label,
+                "current_stock": row.quantity,
+                "threshold": LOW_STOCK_THRESHOLD  # We can make this configurable per product later
             }
-            for product in low_stock_products
+            for row in low_stock_products
         ],
         "stock_movements_trend": stock_movements_trend,
         "stock_by_warehouse": [
             {
-                "warehouse_name": item[0],
-                "total_stock": item[1]
+                "warehouse_name": row.label,
+                "total_stock": row.quantity
             }
-            for item in stock_by_warehouse
+            for row in sorted(sections.get("stock_by_warehouse", []), key=lambda r: r.label)
         ],
         "top_products_by_value": [
             {
-                "id": str(p[0]),
-                "name": p[1],
-                "price": float(p[2]),
-                "total_stock": p[3],
-                "total_value": float(p[4])
+                "id": str(row.id),
+                "name": row.label,
+                "price": float(row.price),
+                "total_stock": row.quantity,
+                "total_value": float(row.value)
             }
-            for p in top_products
+            for row in top_products
         ],
         "stock_value_trend": [
             {
-                "month": v[0],
-                "total_value": float(v[1])
+                "month": row.label,
+                "total_value": float(row.value)
             }
-            for v in value_trend
+            for row in sorted(sections.get("value_trend", []), key=lambda r: r.label)
         ]
     }
+    stats_cache.set(cache_key, stats)
+    return stats
@@ -1,17 +1,118 @@
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Path
+from fastapi import APIRouter, Depends, HTTPException, Query, Path, UploadFile, File, status
 from sqlalchemy.orm import Session
-from sqlalchemy import func, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, or_, tuple_
+from sqlalchemy.exc import IntegrityError
+from pydantic import ValidationError
 from typing import List, Optional
 from datetime import datetime
+import csv
+import io
 import uuid
 
 from app import models, schemas
 from app.database import get_db
-from app.api.endpoints.auth import get_current_user
+from app.async_database import get_async_db
+from app.api.endpoints.auth import get_current_user, get_current_user_async
+from app.core.pagination import encode_cursor, decode_cursor
+from app.api.endpoints.dashboard import invalidate_dashboard_stats
+from app.row_estimates import supports_row_estimates, count_estimate
+from app.product_search import apply_product_search
+from app.product_autocomplete import product_index
+from app.crud.product_crud import get_conflicting_products, bulk_insert_products, json_values
+from app.crud.stock_crud import reprice_warehouse_stats
 
 router = APIRouter()
 
+LEDGER_PREVIEW_SIZE = 20
+MAX_IMPORT_PRODUCTS = 50000
+
+def get_product_ledger_page(db: Session, product_id: int, page_size: int, cursor: Optional[str] = None):
+    """One newest-first page of a product's ledger and the cursor for the next page (None at the end)."""
+    query = db.query(models.StockMovement).filter(models.StockMovement.product_id == product_id)
+    if cursor:
+        try:
+            cursor_created_at, cursor_id = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor.")
+        query = query.filter(
+            tuple_(models.StockMovement.created_at, models.StockMovement.id) < tuple_(cursor_created_at, cursor_id)
+        )
+
+    # Fetch one extra row to know whether another page exists
+    rows = query.order_by(
+        models.StockMovement.created_at.desc(), models.StockMovement.id.desc()
+    ).limit(page_size + 1).all()
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return [schemas.StockMovementInDB.model_validate(m).model_dump() for m in rows], next_cursor
+
+def import_products(db: Session, current_user: models.User, lines: list) -> dict:
+    """Create many products for current_user with set-based conflict checks.
+
+    `lines` is a list of (line_number, ProductCreate or error message). Conflicts with the
+    owner's catalog are found in one query and duplicates inside the batch are caught in
+    memory; every remaining line is inserted in bulk. Only failed lines get a result entry.
+    """
+    products = [p for _, p in lines if not isinstance(p, str)]
+    existing_skus, existing_names = get_conflicting_products(
+        db, current_user.id, [p.sku for p in products], [p.name for p in products]
+    )
+
+    errors = []
+    rows = []
+    seen_skus = {}
+    seen_names = {}
+    for line_number, product in lines:
+        if isinstance(product, str):
+            errors.append({"line": line_number, "detail": product})
+            continue
+
+        error = None
+        if not product.name.strip() or not product.sku.strip():
+            error = "Name and SKU are required."
+        elif product.sku in existing_skus:
+            error = "A product with this SKU already exists."
+        elif product.name in existing_names:
+            error = "A product with this name already exists."
+        elif product.sku in seen_skus:
+            error = f"Duplicate SKU in import (line {seen_skus[product.sku]})."
+        elif product.name in seen_names:
+            error = f"Duplicate name in import (line {seen_names[product.name]})."
+        if error:
+            errors.append({"line": line_number, "detail": error})
+            continue
+
+        seen_skus[product.sku] = line_number
+        seen_names[product.name] = line_number
+        rows.append({**product.model_dump(), "owner_id": current_user.id})
+
+    if rows:
+        try:
+            bulk_insert_products(db, rows)
+            db.commit()
+        except IntegrityError:
+            # A concurrent create took one of the SKUs or names after the conflict check
+            db.rollback()
+            raise HTTPException(status_code=409, detail="Products were created concurrently; retry the import.")
+
+        created = db.query(models.Product).filter(
+            models.Product.owner_id == current_user.id,
+            models.Product.sku.in_(json_values(db, list(seen_skus)))
+        ).all()
+        for db_product in created:
+            product_index.upsert(db_product)
+        invalidate_dashboard_stats([current_user.id])
+
+    return {
+        "imported": len(rows),
+        "failed": len(errors),
+        "errors": errors
+    }
+
 @router.post("", response_model=schemas.ProductInDB, status_code=201)
 def create_product(product: schemas.ProductCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     existing_sku = db.query(models.Product).filter(models.Product.sku == product.sku, models.Product.owner_id == current_user.id).first()
@@ -26,120 +127,103 @@ def create_product(product: schemas.ProductCreate, db: Session = Depends(get_db)
     db.add(db_product)
     db.commit()
     db.refresh(db_product)
+    invalidate_dashboard_stats([db_product.owner_id])
+    product_index.upsert(db_product)
     return db_product
 
-@router.get("")
-def list_products(
+# --- Import many products at once ---
+@router.post("/bulk", status_code=status.HTTP_201_CREATED)
+def import_products_json(
+    payload: schemas.BulkProductCreate,
     db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    if len(payload.products) > MAX_IMPORT_PRODUCTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_IMPORT_PRODUCTS} products can be imported at once.")
+    lines = list(enumerate(payload.products, start=1))
+    return import_products(db, current_user, lines)
+
+# --- Import many products from a CSV upload ---
+@router.post("/bulk/csv", status_code=status.HTTP_201_CREATED)
+def import_products_csv(
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    try:
+        content = file.file.read().decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="CSV file must be UTF-8 encoded.")
+
+    reader = csv.DictReader(io.StringIO(content))
+    missing = {"name", "sku"} - set(reader.fieldnames or [])
+    if missing:
+        raise HTTPException(status_code=400, detail=f"CSV is missing columns: {', '.join(sorted(missing))}")
+
+    lines = []
+    # Line 1 is the header
+    for line_number, row in enumerate(reader, start=2):
+        fields = {"name": row["name"] or "", "sku": row["sku"] or "", "description": row.get("description") or None}
+        if row.get("price"):
+            fields["price"] = row["price"]
+        if row.get("is_active"):
+            fields["is_active"] = row["is_active"]
+        try:
+            lines.append((line_number, schemas.ProductCreate(**fields)))
+        except ValidationError as e:
+            lines.append((line_number, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())))
+        if len(lines) > MAX_IMPORT_PRODUCTS:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_IMPORT_PRODUCTS} products can be imported at once.")
+
+    return import_products(db, current_user, lines)
+
+@router.get("")
+async def list_products(
+    db: AsyncSession = Depends(get_async_db),
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
-    sort_by: str = Query("created_at_desc", pattern="^(name|sku|price|created_at|stock)_(asc|desc)$"),
+    sort_by: Optional[str] = Query(None, pattern="^(name|sku|price|created_at|stock|relevance)_(asc|desc)$"),
     search: Optional[str] = None,
     created_from_date: Optional[datetime] = None,
     created_to_date: Optional[datetime] = None,
     include_inactive: bool = Query(False),
     filter: Optional[str] = Query(None, pattern="^(low_stock|in_my_warehouses)$"),
     ownership_filter: Optional[str] = Query(None, pattern="^(all|my|other)$"),
-    current_user: models.User = Depends(get_current_user)
+    estimate_total: bool = Query(False),
+    current_user: models.User = Depends(get_current_user_async)
 ):
-    # Count query for total
-    if filter == "low_stock":
-        # For low_stock, count products with total_stock <= 10
-        subq = db.query(
-            models.Product.id,
-            func.coalesce(func.sum(models.StockMovement.quantity), 0).label("total_stock")
-        ).outerjoin(
-            models.StockMovement, models.Product.id == models.StockMovement.product_id
-        ).group_by(models.Product.id)
-
-        # Apply same filters to subq
-        if not include_inactive:
-            subq = subq.filter(models.Product.is_active == True)
-        if current_user.role != "admin":
-            subq = subq.filter(models.Product.owner_id == current_user.id)
-        if search:
-            subq = subq.filter(or_(
-                models.Product.name.ilike(f"%{search}%"),
-                models.Product.sku.ilike(f"%{search}%")
-            ))
-        if created_from_date:
-            subq = subq.filter(models.Product.created_at >= created_from_date)
-        if created_to_date:
-            subq = subq.filter(models.Product.created_at <= created_to_date)
-
-        subq = subq.subquery()
-        count_query = db.query(func.count(subq.c.id)).select_from(subq).filter(subq.c.total_stock <= 10)
-    elif filter == "in_my_warehouses":
-        # Count unique products in warehouses owned by current_user with ownership_filter
-        subq = db.query(
-            models.Product.id,
-            func.coalesce(func.sum(models.StockMovement.quantity), 0).label("total_stock"),
-            models.Product.owner_id
-        ).join(
-            models.StockMovement, models.Product.id == models.StockMovement.product_id
-        ).join(
-            models.Warehouse, models.StockMovement.warehouse_id == models.Warehouse.id
-        ).filter(
-            models.Warehouse.owner_id == current_user.id
-        )
-
-        # Apply ownership_filter
-        if ownership_filter == "my":
-            subq = subq.filter(models.Product.owner_id == current_user.id)
-        elif ownership_filter == "other":
-            subq = subq.filter(models.Product.owner_id != current_user.id)
-        # if ownership_filter is "all" or None, no filter applied
-
-        # Apply filters to subq
-        if not include_inactive:
-            subq = subq.filter(models.Product.is_active == True)
-        if search:
-            subq = subq.filter(or_(
-                models.Product.name.ilike(f"%{search}%"),
-                models.Product.sku.ilike(f"%{search}%")
-            ))
-        if created_from_date:
-            subq = subq.filter(models.Product.created_at >= created_from_date)
-        if created_to_date:
-            subq = subq.filter(models.Product.created_at <= created_to_date)
-
-        subq = subq.group_by(models.Product.id, models.Product.owner_id).subquery()
-
-        count_query = db.query(func.count(subq.c.id)).select_from(subq)
-    else:
-        count_query = db.query(func.count(models.Product.id))
-
-        # filter active unless include_inactive
-        if not include_inactive:
-            count_query = count_query.filter(models.Product.is_active == True)
-
-        # non-admin users see only their products
-        if current_user.role != "admin":
-            count_query = count_query.filter(models.Product.owner_id == current_user.id)
-
-        if search:
-            count_query = count_query.filter(or_(
-                models.Product.name.ilike(f"%{search}%"),
-                models.Product.sku.ilike(f"%{search}%")
-            ))
-
-        if created_from_date:
-            count_query = count_query.filter(models.Product.created_at >= created_from_date)
-
-        if created_to_date:
-            count_query = count_query.filter(models.Product.created_at <= created_to_date)
-
-    total = count_query.scalar()
+    # The query builder uses the ORM Query API; run_sync drives it over the async connection
+    return await db.run_sync(
+        get_products_page, current_user, page, page_size, sort_by, search, created_from_date,
+        created_to_date, include_inactive, filter, ownership_filter, estimate_total
+    )
 
+def get_products_page(
+    db: Session,
+    current_user: models.User,
+    page: int,
+    page_size: int,
+    sort_by: Optional[str],
+    search: Optional[str],
+    created_from_date: Optional[datetime],
+    created_to_date: Optional[datetime],
+    include_inactive: bool,
+    filter: Optional[str],
+    ownership_filter: Optional[str],
+    estimate_total: bool
+) -> dict:
+    """One page of the product listing with its total; the work behind GET /products."""
+    # Set by the search backend; ranks matches for sort_by=relevance_desc (the default when searching)
+    relevance = None
     if filter == "in_my_warehouses":
         query = db.query(
             models.Product,
             models.User.username.label("owner_name"),
-            func.coalesce(func.sum(models.StockMovement.quantity), 0).label("total_stock")
+            func.coalesce(func.sum(models.StockBalance.quantity), 0).label("total_stock")
         ).join(
-            models.StockMovement, models.Product.id == models.StockMovement.product_id
+            models.StockBalance, models.Product.id == models.StockBalance.product_id
         ).join(
-            models.Warehouse, models.StockMovement.warehouse_id == models.Warehouse.id
+            models.Warehouse, models.StockBalance.warehouse_id == models.Warehouse.id
         ).join(
             models.User, models.Product.owner_id == models.User.id
         ).filter(
@@ -158,10 +242,7 @@ def list_products(
             query = query.filter(models.Product.is_active == True)
 
         if search:
-            query = query.filter(or_(
-                models.Product.name.ilike(f"%{search}%"),
-                models.Product.sku.ilike(f"%{search}%")
-            ))
+            query, relevance = apply_product_search(query, search, db.bind.dialect.name)
 
         if created_from_date:
             query = query.filter(models.Product.created_at >= created_from_date)
@@ -173,9 +254,9 @@ def list_products(
     else:
         query = db.query(
             models.Product,
-            func.coalesce(func.sum(models.StockMovement.quantity), 0).label("total_stock")
+            func.coalesce(func.sum(models.StockBalance.quantity), 0).label("total_stock")
         ).outerjoin(
-            models.StockMovement, models.Product.id == models.StockMovement.product_id
+            models.StockBalance, models.Product.id == models.StockBalance.product_id
         )
 
         # filter active unless include_inactive
@@ -187,10 +268,7 @@ def list_products(
             query = query.filter(models.Product.owner_id == current_user.id)
 
         if search:
-            query = query.filter(or_(
-                models.Product.name.ilike(f"%{search}%"),
-                models.Product.sku.ilike(f"%{search}%")
-            ))
+            query, relevance = apply_product_search(query, search, db.bind.dialect.name)
 
         if created_from_date:
             query = query.filter(models.Product.created_at >= created_from_date)
@@ -202,14 +280,28 @@ def list_products(
 
         # Apply filter after grouping
         if filter == "low_stock":
-            query = query.having(func.coalesce(func.sum(models.StockMovement.quantity), 0) <= 10)
+            query = query.having(func.coalesce(func.sum(models.StockBalance.quantity), 0) <= 10)
+
+    # The total rides along with the page: COUNT(*) OVER() is evaluated after grouping, before LIMIT.
+    # estimate_total swaps it for the planner's row estimate so large catalogs skip the full count.
+    estimated = estimate_total and supports_row_estimates(db.bind.dialect.name)
+    if estimated:
+        total_column = count_estimate(query.statement)
+    else:
+        total_column = func.count().over()
+    count_source = query
+    query = query.add_columns(total_column.label("total_count"))
 
     # Apply sorting
+    if sort_by is None:
+        sort_by = "relevance_desc" if search else "created_at_desc"
     sort_column, sort_order = sort_by.rsplit('_', 1)
-    if sort_column == 'price':
+    if sort_column == 'relevance':
+        sort_field = relevance if relevance is not None else models.Product.created_at
+    elif sort_column == 'price':
         sort_field = models.Product.price
     elif sort_column == 'stock':
-        sort_field = func.coalesce(func.sum(models.StockMovement.quantity), 0)
+        sort_field = func.coalesce(func.sum(models.StockBalance.quantity), 0)
     else:
         sort_field = getattr(models.Product, sort_column)
 
@@ -220,15 +312,26 @@ def list_products(
 
     products_with_stock = query.offset((page - 1) * page_size).limit(page_size).all()
 
+    if products_with_stock:
+        total = int(products_with_stock[0].total_count)
+    elif page == 1:
+        total = 0
+    else:
+        # Past the last page there is no row to carry the total
+        if estimated:
+            total = db.query(count_estimate(count_source.statement)).scalar()
+        else:
+            total = db.query(func.count()).select_from(count_source.subquery()).scalar()
+
     results = []
     if filter == "in_my_warehouses":
-        for product, owner_name, total_stock in products_with_stock:
+        for product, owner_name, total_stock, _ in products_with_stock:
             product_summary = schemas.ProductSummary.model_validate(product)
             product_summary.owner_name = owner_name
             product_summary.total_stock = int(total_stock)
             results.append(product_summary)
     else:
-        for product, total_stock in products_with_stock:
+        for product, total_stock, _ in products_with_stock:
             product_summary = schemas.ProductSummary.model_validate(product)
             product_summary.total_stock = int(total_stock)
             results.append(product_summary)
@@ -241,12 +344,37 @@ def list_products(
             "total": total,
             "page": page,
             "page_size": page_size,
-            "total_pages": total_pages
+            "total_pages": total_pages,
+            "total_is_estimate": estimated
         }
     }
 
+@router.get("/autocomplete")
+def autocomplete_products(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+    include_inactive: bool = Query(False),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    # Served from the in-memory prefix index; admins search every owner's products.
+    # The index is per worker, so it is rebuilt once it is older than its max age.
+    product_index.refresh_if_stale(db)
+    return product_index.search(
+        q,
+        owner_id=current_user.id,
+        all_owners=current_user.role == "admin",
+        limit=limit,
+        include_inactive=include_inactive
+    )
+
 @router.get("/{id}", response_model=schemas.ProductDetails)
-def get_product_details(id: int = Path(...), db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
+def get_product_details(
+    id: int = Path(...),
+    ledger_limit: int = Query(LEDGER_PREVIEW_SIZE, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
     product = db.query(models.Product).filter(models.Product.id == id).first()
     if not product:
         raise HTTPException(status_code=404, detail="Product not found.")
@@ -256,11 +384,11 @@ def get_product_details(id: int = Path(...), db: Session = Depends(get_db), curr
     stock_query = db.query(
         models.Warehouse.id.label("warehouse_id"),
         models.Warehouse.name.label("warehouse_name"),
-        func.coalesce(func.sum(models.StockMovement.quantity), 0).label("stock")
+        func.coalesce(func.sum(models.StockBalance.quantity), 0).label("stock")
     ).join(
-        models.StockMovement, models.Warehouse.id == models.StockMovement.warehouse_id
+        models.StockBalance, models.Warehouse.id == models.StockBalance.warehouse_id
     ).filter(
-        models.StockMovement.product_id == id
+        models.StockBalance.product_id == id
     )
 
     if current_user.role == "admin":
@@ -280,18 +408,42 @@ def get_product_details(id: int = Path(...), db: Session = Depends(get_db), curr
         models.Warehouse.id, models.Warehouse.name
     ).all()
 
-    # Get ledger history
-    ledger_history = db.query(models.StockMovement).filter(models.StockMovement.product_id == id).order_by(models.StockMovement.created_at.desc()).all()
+    # Only the most recent ledger entries; the rest is paged through /products/{id}/ledger
+    ledger_history, ledger_next_cursor = get_product_ledger_page(db, id, ledger_limit)
 
     response = schemas.ProductDetails.model_validate(product)
     response.stock_distribution = [
         {"warehouse_id":d.warehouse_id, "warehouse_name":d.warehouse_name, "stock":int(d.stock)}
         for d in stock_distribution
     ]
-    response.ledger_history = [schemas.StockMovementInDB.model_validate(m) for m in ledger_history]
+    response.ledger_history = ledger_history
+    response.ledger_next_cursor = ledger_next_cursor
 
     return response
 
+@router.get("/{id}/ledger")
+def get_product_ledger(
+    id: int = Path(...),
+    page_size: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    product = db.query(models.Product.owner_id).filter(models.Product.id == id).first()
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found.")
+    if current_user.role != "admin" and product.owner_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    movements, next_cursor = get_product_ledger_page(db, id, page_size, cursor)
+    return {
+        "data": movements,
+        "pagination": {
+            "page_size": page_size,
+            "next_cursor": next_cursor
+        }
+    }
+
 @router.put("/{id}", response_model=schemas.ProductInDB)
 def update_product(
     id: int,
@@ -317,11 +469,15 @@ def update_product(
         if existing_name:
             raise HTTPException(status_code=400, detail="A product with this name already exists.")
 
+    old_price, old_active = db_product.price, db_product.is_active
     for key, value in product.model_dump(exclude_unset=True).items():
         setattr(db_product, key, value)
+    reprice_warehouse_stats(db, id, old_price, old_active, db_product.price, db_product.is_active)
 
     db.commit()
     db.refresh(db_product)
+    invalidate_dashboard_stats([db_product.owner_id])
+    product_index.upsert(db_product)
     return db_product
 
 @router.delete("/{id}", status_code=204)
@@ -331,9 +487,16 @@ def delete_product(id: int, db: Session = Depends(get_db), current_user: models.
         raise HTTPException(status_code=404, detail="Product not found.")
     if current_user.role != "admin" and db_product.owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Forbidden")
-    # Delete associated stock movements first
+    # Take the product out of its warehouses' stats, then delete stock movements and derived stock tables
+    reprice_warehouse_stats(db, id, db_product.price, db_product.is_active, db_product.price, False)
     db.query(models.StockMovement).filter(models.StockMovement.product_id == id).delete()
+    db.query(models.StockBalance).filter(models.StockBalance.product_id == id).delete()
+    db.query(models.StockSnapshot).filter(models.StockSnapshot.product_id == id).delete()
+    db.query(models.StockMovementMonthlyRollup).filter(models.StockMovementMonthlyRollup.product_id == id).delete()
     # Then delete the product
+    owner_id = db_product.owner_id
     db.delete(db_product)
     db.commit()
+    invalidate_dashboard_stats([owner_id])
+    product_index.remove(id)
     return
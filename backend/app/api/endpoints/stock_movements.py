@@ -1,21 +1,111 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session, aliased
-from sqlalchemy import func, or_, select
+from sqlalchemy import func, or_, select, insert, tuple_, true
+from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import ValidationError
+from typing import Optional
+from datetime import datetime
+import csv
+import io
+import json
 import uuid
 
+import numpy as np
+
 from app import models, schemas
 from app.database import get_db
-from app.api.endpoints.auth import get_current_user
+from app.async_database import get_async_db
+from app.api.endpoints.auth import get_current_user, get_current_user_async
+from app.api.endpoints.dashboard import invalidate_dashboard_stats
+from app.core.pagination import encode_cursor, decode_cursor
+from app.fulfillment import allocate
+from app.geo import haversine_km
+from app.crud.stock_crud import (
+    get_stock_balance,
+    get_available_stock,
+    apply_stock_movements,
+    get_stock_as_of,
+    to_naive_utc,
+    reserve_stock,
+    release_stock_reservation,
+    consume_stock_reservation,
+    rebuild_stock_reservations,
+    record_movement_rollups,
+)
 
 router = APIRouter()
 
+MAX_BULK_LINES = 1000
+EXPORT_BATCH_SIZE = 1000
+EXPORT_COLUMNS = ["id", "created_at", "product_id", "product_name", "warehouse_id", "movement_type", "quantity", "reference_id", "user_id", "username", "notes"]
+
 def get_current_stock(db: Session, product_id: int, warehouse_id: int) -> int:
-    """Calculate current stock for a product in a warehouse."""
-    result = db.query(func.coalesce(func.sum(models.StockMovement.quantity), 0)).filter(
-        models.StockMovement.product_id == product_id,
-        models.StockMovement.warehouse_id == warehouse_id
-    ).scalar()
-    return int(result)
+    """Get current stock for a product in a warehouse from the balance table."""
+    return get_stock_balance(db, product_id, warehouse_id)
+
+def accessible_warehouses_filter(current_user: models.User):
+    """Condition on Warehouse matching the warehouses whose stock the current user may see."""
+    if current_user.role == "admin":
+        return true()
+    elif current_user.role == "warehouse_owner":
+        return models.Warehouse.owner_id == current_user.id
+    else:  # USER
+        assigned_warehouse_ids = select(models.UserWarehouseAssignment.warehouse_id).where(models.UserWarehouseAssignment.user_id == current_user.id)
+        return or_(
+            models.Warehouse.location == current_user.location,
+            models.Warehouse.id.in_(assigned_warehouse_ids)
+        )
+
+def get_accessible_warehouses_query(db: Session, current_user: models.User):
+    """Warehouses whose stock the current user may see."""
+    return db.query(models.Warehouse).filter(accessible_warehouses_filter(current_user))
+
+def build_stock_movements(request: models.StockMovementRequest) -> list:
+    """Build the ledger rows that approving a request produces."""
+    if request.movement_type in ["in", "out"]:
+        return [models.StockMovement(
+            product_id=request.product_id,
+            warehouse_id=request.warehouse_id,
+            quantity=request.quantity,
+            movement_type=request.movement_type,
+            notes=request.notes,
+            user_id=request.user_id
+        )]
+    elif request.movement_type == "transfer":
+        ref = str(uuid.uuid4())
+        out_m = models.StockMovement(
+            product_id=request.product_id,
+            warehouse_id=request.from_warehouse_id,
+            quantity=-abs(request.quantity),
+            movement_type="transfer_out",
+            reference_id=ref,
+            notes=request.notes,
+            user_id=request.user_id
+        )
+        in_m = models.StockMovement(
+            product_id=request.product_id,
+            warehouse_id=request.to_warehouse_id,
+            quantity=abs(request.quantity),
+            movement_type="transfer_in",
+            reference_id=ref,
+            notes=request.notes,
+            user_id=request.user_id
+        )
+        return [out_m, in_m]
+    return []
+
+def scope_stock_movements_query(query, current_user: models.User):
+    """Limit a StockMovement query to the ledger rows the current user may see."""
+    if current_user.role == "admin":
+        return query
+    elif current_user.role == "warehouse_owner":
+        # Warehouse owners see movements to their warehouses
+        warehouse_ids = select(models.Warehouse.id).where(models.Warehouse.owner_id == current_user.id)
+        return query.filter(models.StockMovement.warehouse_id.in_(warehouse_ids))
+    else:  # USER
+        # Normal users see movements they created
+        return query.filter(models.StockMovement.user_id == current_user.id)
 
 # --- Request a stock movement (in/out) ---
 @router.post("/", status_code=status.HTTP_201_CREATED)
@@ -57,19 +147,18 @@ def request_stock_movement(
     else:
         quantity = abs(movement.quantity)
 
-    # Validate stock for outgoing movements
-    if quantity < 0:
-        current_stock = get_current_stock(db, movement.product_id, movement.warehouse_id)
-        if current_stock < abs(quantity):
-            raise HTTPException(
-                status_code=400,
-                detail=f"Insufficient stock. Current stock: {current_stock}, requested: {abs(quantity)}"
-            )
-
     # Check if warehouse has an owner for approval
     if not warehouse.owner_id:
         raise HTTPException(status_code=400, detail="Warehouse has no owner to approve the request.")
 
+    # Reserve stock for outgoing movements so parallel requests cannot claim the same units
+    if quantity < 0 and not reserve_stock(db, movement.product_id, movement.warehouse_id, abs(quantity)):
+        available_stock = get_available_stock(db, movement.product_id, movement.warehouse_id)
+        raise HTTPException(
+            status_code=400,
+            detail=f"Insufficient stock. Available stock: {available_stock}, requested: {abs(quantity)}"
+        )
+
     db_request = models.StockMovementRequest(
         product_id=movement.product_id,
         warehouse_id=movement.warehouse_id,
@@ -85,13 +174,148 @@ def request_stock_movement(
     return {"message": "Stock movement request submitted successfully", "request_id": db_request.id}
 
 
-# --- Request a stock transfer (between warehouses) ---
-@router.post("/transfers", status_code=status.HTTP_201_CREATED)
-def request_stock_transfer(
-    transfer: schemas.StockTransferCreate,
+def submit_bulk_movement_requests(db: Session, current_user: models.User, lines: list) -> dict:
+    """Validate and insert many in/out requests with a handful of set-based queries.
+
+    `lines` is a list of (line_number, StockMovementCreate or error message). Valid lines
+    are inserted in one batch; every line gets a result entry.
+    """
+    movements = [m for _, m in lines if not isinstance(m, str)]
+    product_ids = {m.product_id for m in movements}
+    warehouse_ids = {m.warehouse_id for m in movements}
+
+    products = {
+        p.id: p for p in db.query(models.Product).filter(
+            models.Product.id.in_(product_ids),
+            models.Product.is_active == True
+        ).all()
+    }
+    warehouses = {w.id: w for w in db.query(models.Warehouse).filter(models.Warehouse.id.in_(warehouse_ids)).all()}
+    # Unreserved stock per pair, only used to explain rejected "out" lines
+    available = {
+        (b.product_id, b.warehouse_id): b.quantity - b.reserved_quantity for b in db.query(models.StockBalance).filter(
+            models.StockBalance.product_id.in_(product_ids),
+            models.StockBalance.warehouse_id.in_(warehouse_ids)
+        ).all()
+    }
+
+    results = []
+    rows = []
+    for line_number, movement in lines:
+        if isinstance(movement, str):
+            results.append({"line": line_number, "status": "error", "detail": movement})
+            continue
+
+        product = products.get(movement.product_id)
+        warehouse = warehouses.get(movement.warehouse_id)
+        error = None
+        if movement.movement_type not in ["in", "out"]:
+            error = "Movement type must be 'in' or 'out'."
+        elif not product:
+            error = "Product not found or is inactive."
+        elif current_user.role != "admin" and product.owner_id != current_user.id:
+            error = "Forbidden"
+        elif not warehouse:
+            error = "Warehouse not found."
+        elif movement.movement_type == "in" and not warehouse.is_available:
+            error = "Cannot stock in to an unavailable warehouse."
+        elif current_user.role == "warehouse_owner" and warehouse.owner_id != current_user.id:
+            error = "Forbidden"
+        elif not warehouse.owner_id:
+            error = "Warehouse has no owner to approve the request."
+
+        quantity = -abs(movement.quantity) if movement.movement_type == "out" else abs(movement.quantity)
+        if not error and quantity < 0:
+            key = (movement.product_id, movement.warehouse_id)
+            if reserve_stock(db, movement.product_id, movement.warehouse_id, abs(quantity)):
+                available[key] = available.get(key, 0) + quantity
+            else:
+                error = f"Insufficient stock. Available stock: {available.get(key, 0)}, requested: {abs(quantity)}"
+
+        if error:
+            results.append({"line": line_number, "status": "error", "detail": error})
+            continue
+
+        rows.append({
+            "product_id": movement.product_id,
+            "warehouse_id": movement.warehouse_id,
+            "movement_type": movement.movement_type,
+            "quantity": quantity,
+            "notes": movement.notes,
+            "user_id": current_user.id,
+            "status": "pending"
+        })
+        results.append({"line": line_number, "status": "submitted"})
+
+    if rows:
+        request_ids = db.scalars(
+            insert(models.StockMovementRequest).returning(models.StockMovementRequest.id, sort_by_parameter_order=True),
+            rows
+        ).all()
+        submitted = iter(request_ids)
+        for result in results:
+            if result["status"] == "submitted":
+                result["request_id"] = next(submitted)
+        db.commit()
+
+    return {
+        "submitted": len(rows),
+        "failed": len(results) - len(rows),
+        "results": results
+    }
+
+
+# --- Request many stock movements (in/out) at once ---
+@router.post("/bulk", status_code=status.HTTP_201_CREATED)
+def request_bulk_stock_movements(
+    payload: schemas.BulkStockMovementCreate,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    if len(payload.movements) > MAX_BULK_LINES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_LINES} movements can be submitted at once.")
+    lines = list(enumerate(payload.movements, start=1))
+    return submit_bulk_movement_requests(db, current_user, lines)
+
+
+# --- Request many stock movements (in/out) from a CSV upload ---
+@router.post("/bulk/csv", status_code=status.HTTP_201_CREATED)
+def request_bulk_stock_movements_csv(
+    file: UploadFile = File(...),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
+    try:
+        content = file.file.read().decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="CSV file must be UTF-8 encoded.")
+
+    reader = csv.DictReader(io.StringIO(content))
+    missing = {"product_id", "warehouse_id", "movement_type", "quantity"} - set(reader.fieldnames or [])
+    if missing:
+        raise HTTPException(status_code=400, detail=f"CSV is missing columns: {', '.join(sorted(missing))}")
+
+    lines = []
+    # Line 1 is the header
+    for line_number, row in enumerate(reader, start=2):
+        try:
+            lines.append((line_number, schemas.StockMovementCreate(
+                product_id=row["product_id"],
+                warehouse_id=row["warehouse_id"],
+                movement_type=(row["movement_type"] or "").strip(),
+                quantity=row["quantity"],
+                notes=row.get("notes") or None
+            )))
+        except ValidationError as e:
+            lines.append((line_number, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())))
+        if len(lines) > MAX_BULK_LINES:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_LINES} movements can be submitted at once.")
+
+    return submit_bulk_movement_requests(db, current_user, lines)
+
+
+def submit_stock_transfer(db: Session, current_user: models.User, transfer: schemas.StockTransferCreate) -> models.StockMovementRequest:
+    """Validate a transfer, reserve its stock at the source and add the pending request. The caller commits."""
     if transfer.from_warehouse_id == transfer.to_warehouse_id:
         raise HTTPException(status_code=400, detail="Source and destination warehouses cannot be the same.")
 
@@ -134,18 +358,18 @@ def request_stock_transfer(
         # Allow normal users to request stock transfers
         pass
 
-    # Validate stock in from_warehouse
-    current_stock = get_current_stock(db, transfer.product_id, transfer.from_warehouse_id)
-    if current_stock < transfer.quantity:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Insufficient stock in source warehouse. Current stock: {current_stock}, requested: {transfer.quantity}"
-        )
-
     # Check if destination warehouse has an owner for approval
     if not to_wh.owner_id:
         raise HTTPException(status_code=400, detail="Destination warehouse has no owner to approve the transfer request.")
 
+    # Reserve stock in from_warehouse until the transfer is approved or rejected
+    if not reserve_stock(db, transfer.product_id, transfer.from_warehouse_id, abs(transfer.quantity)):
+        available_stock = get_available_stock(db, transfer.product_id, transfer.from_warehouse_id)
+        raise HTTPException(
+            status_code=400,
+            detail=f"Insufficient stock in source warehouse. Available stock: {available_stock}, requested: {transfer.quantity}"
+        )
+
     db_request = models.StockMovementRequest(
         product_id=transfer.product_id,
         from_warehouse_id=transfer.from_warehouse_id,
@@ -157,51 +381,168 @@ def request_stock_transfer(
         status="pending"
     )
     db.add(db_request)
+    db.flush()
+    return db_request
+
+# --- Request a stock transfer (between warehouses) ---
+@router.post("/transfers", status_code=status.HTTP_201_CREATED)
+def request_stock_transfer(
+    transfer: schemas.StockTransferCreate,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    db_request = submit_stock_transfer(db, current_user, transfer)
     db.commit()
-    db.refresh(db_request)
     return {"message": "Stock transfer request submitted successfully", "request_id": db_request.id}
 
 
+# --- Propose (and optionally request) transfers that fulfil an order at one warehouse ---
+@router.post("/allocations")
+def allocate_fulfillment(
+    payload: schemas.FulfillmentAllocationRequest,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    needed_by_product = {}
+    for item in payload.items:
+        if item.quantity <= 0:
+            raise HTTPException(status_code=400, detail="Quantities must be positive.")
+        needed_by_product[item.product_id] = needed_by_product.get(item.product_id, 0) + item.quantity
+    if not needed_by_product:
+        raise HTTPException(status_code=400, detail="At least one item is required.")
+    product_ids = list(needed_by_product)
+
+    to_wh = db.query(models.Warehouse).filter(models.Warehouse.id == payload.to_warehouse_id).first()
+    if not to_wh:
+        raise HTTPException(status_code=404, detail="Destination warehouse not found.")
+    if not to_wh.is_available:
+        raise HTTPException(status_code=400, detail="Cannot transfer to an unavailable warehouse.")
+    # Same destination check as submit_stock_transfer, applied to previews too
+    if current_user.role == "warehouse_owner" and to_wh.owner_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    products = db.query(models.Product.id, models.Product.owner_id).filter(
+        models.Product.id.in_(product_ids),
+        models.Product.is_active == True
+    ).all()
+    if len(products) != len(product_ids):
+        raise HTTPException(status_code=404, detail="Product not found or is inactive.")
+    if current_user.role != "admin" and any(owner_id != current_user.id for _, owner_id in products):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    # The whole candidate matrix in one query: unreserved stock of every ordered product
+    # in every other available warehouse this user may transfer from
+    available_quantity = models.StockBalance.quantity - models.StockBalance.reserved_quantity
+    candidates_query = db.query(
+        models.StockBalance.product_id,
+        models.StockBalance.warehouse_id,
+        models.Warehouse.latitude,
+        models.Warehouse.longitude,
+        available_quantity.label("available_quantity")
+    ).join(
+        models.Warehouse, models.Warehouse.id == models.StockBalance.warehouse_id
+    ).filter(
+        models.StockBalance.product_id.in_(product_ids),
+        available_quantity > 0,
+        models.Warehouse.is_available == True,
+        models.Warehouse.id != payload.to_warehouse_id,
+        accessible_warehouses_filter(current_user)
+    )
+    candidates = candidates_query.all()
+
+    warehouse_ids = sorted({c.warehouse_id for c in candidates})
+    warehouse_index = {warehouse_id: i for i, warehouse_id in enumerate(warehouse_ids)}
+    product_index = {product_id: i for i, product_id in enumerate(product_ids)}
+    available = np.zeros((len(product_ids), len(warehouse_ids)), dtype=np.int64)
+    latitudes = np.full(len(warehouse_ids), np.nan)
+    longitudes = np.full(len(warehouse_ids), np.nan)
+    for c in candidates:
+        column = warehouse_index[c.warehouse_id]
+        available[product_index[c.product_id], column] = c.available_quantity
+        if c.latitude is not None and c.longitude is not None:
+            latitudes[column] = c.latitude
+            longitudes[column] = c.longitude
+    if to_wh.latitude is not None and to_wh.longitude is not None:
+        distances = haversine_km(to_wh.latitude, to_wh.longitude, latitudes, longitudes)
+    else:
+        distances = np.full(len(warehouse_ids), np.nan)
+
+    needed = np.array([needed_by_product[product_id] for product_id in product_ids], dtype=np.int64)
+    picks, shortfall = allocate(needed, available, distances)
+
+    allocations = []
+    for product, warehouse, quantity in picks:
+        distance = distances[warehouse]
+        allocations.append({
+            "product_id": product_ids[product],
+            "from_warehouse_id": warehouse_ids[warehouse],
+            "quantity": quantity,
+            "distance_km": None if np.isnan(distance) else round(float(distance), 3)
+        })
+
+    request_ids = []
+    if payload.create_transfers and allocations:
+        for allocation in allocations:
+            transfer = schemas.StockTransferCreate(
+                product_id=allocation["product_id"],
+                from_warehouse_id=allocation["from_warehouse_id"],
+                to_warehouse_id=payload.to_warehouse_id,
+                quantity=allocation["quantity"],
+                notes=payload.notes
+            )
+            request_ids.append(submit_stock_transfer(db, current_user, transfer).id)
+        db.commit()
+
+    return {
+        "to_warehouse_id": payload.to_warehouse_id,
+        "fulfilled": not shortfall.any(),
+        "transfer_count": len(allocations),
+        "source_warehouse_count": len({a["from_warehouse_id"] for a in allocations}),
+        "allocations": allocations,
+        "shortfall": [
+            {"product_id": product_ids[product], "quantity": int(quantity)}
+            for product, quantity in enumerate(shortfall) if quantity > 0
+        ],
+        "request_ids": request_ids
+    }
+
+
 # --- Get product stock distribution across warehouses ---
 @router.get("/stock/{product_id}", response_model=dict)
-def get_product_stock_distribution(
+async def get_product_stock_distribution(
     product_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user_async)
 ):
-    product = db.query(models.Product).filter(
+    product = (await db.execute(select(models.Product.owner_id).where(
         models.Product.id == product_id,
         models.Product.is_active == True
-    ).first()
+    ))).first()
     if not product:
         raise HTTPException(status_code=404, detail="Product not found or is inactive.")
 
     if current_user.role != "admin" and product.owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Forbidden")
 
-    # Get accessible warehouses
-    if current_user.role == "admin":
-        warehouses = db.query(models.Warehouse).all()
-    elif current_user.role == "warehouse_owner":
-        warehouses = db.query(models.Warehouse).filter(models.Warehouse.owner_id == current_user.id).all()
-    else:  # USER
-        assigned_warehouse_ids = select(models.UserWarehouseAssignment.warehouse_id).where(models.UserWarehouseAssignment.user_id == current_user.id)
-        warehouses = db.query(models.Warehouse).filter(
-            or_(
-                models.Warehouse.location == current_user.location,
-                models.Warehouse.id.in_(assigned_warehouse_ids)
-            )
-        ).all()
+    # Stock for every accessible warehouse in one query against the balance table
+    stock_rows = (await db.execute(
+        select(
+            models.Warehouse.id,
+            models.Warehouse.name,
+            models.StockBalance.quantity
+        ).join(
+            models.StockBalance, models.StockBalance.warehouse_id == models.Warehouse.id
+        ).where(
+            accessible_warehouses_filter(current_user),
+            models.StockBalance.product_id == product_id,
+            models.StockBalance.quantity > 0
+        )
+    )).all()
 
-    # Get stock for accessible warehouses
-    stock_distribution = {}
-    for warehouse in warehouses:
-        current_stock = get_current_stock(db, product_id, warehouse.id)
-        if current_stock > 0:
-            stock_distribution[warehouse.id] = {
-                "name": warehouse.name,
-                "stock": current_stock
-            }
+    stock_distribution = {
+        warehouse_id: {"name": name, "stock": int(stock)}
+        for warehouse_id, name, stock in stock_rows
+    }
 
     return {
         "product_id": product_id,
@@ -210,6 +551,43 @@ def get_product_stock_distribution(
     }
 
 
+# --- Get product stock per warehouse at a point in time ---
+@router.get("/stock/{product_id}/as-of", response_model=dict)
+def get_product_stock_as_of(
+    product_id: int,
+    at: datetime = Query(...),
+    warehouse_id: Optional[int] = Query(None),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    product = db.query(models.Product).filter(models.Product.id == product_id).first()
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found.")
+
+    if current_user.role != "admin" and product.owner_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    warehouses_query = get_accessible_warehouses_query(db, current_user)
+    if warehouse_id:
+        warehouses_query = warehouses_query.filter(models.Warehouse.id == warehouse_id)
+    warehouse_names = {wh.id: wh.name for wh in warehouses_query.all()}
+
+    warehouse_ids = None if current_user.role == "admin" and not warehouse_id else list(warehouse_names)
+    at = to_naive_utc(at)
+    stock = get_stock_as_of(db, product_id, at, warehouse_ids)
+
+    stock_distribution = {
+        wh_id: {"name": warehouse_names.get(wh_id), "stock": quantity}
+        for wh_id, quantity in stock.items()
+    }
+    return {
+        "product_id": product_id,
+        "as_of": at,
+        "stock_distribution": stock_distribution,
+        "total_stock": sum(stock.values())
+    }
+
+
 # --- List pending stock movement requests for warehouse owners ---
 @router.get("/requests")
 def list_pending_requests(
@@ -345,43 +723,24 @@ def approve_request(
 
     action = approve.action
     if action == "approve":
+        # Re-validate outbound stock against the locked balance row and consume the reservation
+        if not consume_stock_reservation(db, request):
+            db.rollback()
+            raise HTTPException(status_code=409, detail="Insufficient stock to approve this request.")
+
         # Create the actual stock movements
-        if request.movement_type in ["in", "out"]:
-            db_movement = models.StockMovement(
-                product_id=request.product_id,
-                warehouse_id=request.warehouse_id,
-                quantity=request.quantity,
-                movement_type=request.movement_type,
-                notes=request.notes,
-                user_id=request.user_id
-            )
-            db.add(db_movement)
-        elif request.movement_type == "transfer":
-            ref = str(uuid.uuid4())
-            out_m = models.StockMovement(
-                product_id=request.product_id,
-                warehouse_id=request.from_warehouse_id,
-                quantity=-abs(request.quantity),
-                movement_type="transfer_out",
-                reference_id=ref,
-                notes=request.notes,
-                user_id=request.user_id
-            )
-            in_m = models.StockMovement(
-                product_id=request.product_id,
-                warehouse_id=request.to_warehouse_id,
-                quantity=abs(request.quantity),
-                movement_type="transfer_in",
-                reference_id=ref,
-                notes=request.notes,
-                user_id=request.user_id
-            )
-            db.add_all([out_m, in_m])
+        new_movements = build_stock_movements(request)
+        db.add_all(new_movements)
+
+        # Keep the materialized balances and monthly rollup in step with the ledger in the same transaction
+        apply_stock_movements(db, [m for m in new_movements if m.quantity > 0])
+        record_movement_rollups(db, new_movements)
 
         request.status = "approved"
         request.approved_by = current_user.id
         request.approved_at = func.now()
     elif action == "reject":
+        release_stock_reservation(db, request)
         request.status = "rejected"
         request.rejection_reason = approve.reason
         request.approved_by = current_user.id
@@ -390,8 +749,86 @@ def approve_request(
         raise HTTPException(status_code=400, detail="Invalid action.")
 
     db.commit()
+    if action == "approve":
+        invalidate_dashboard_stats([request.product.owner_id])
     return {"message": f"Request {action}d successfully"}
 
+# --- Approve or reject many stock movement requests in one transaction ---
+@router.post("/requests/bulk-approve")
+def bulk_approve_requests(
+    payload: schemas.BulkApproveRequest,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    if current_user.role not in ["admin", "warehouse_owner"]:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    request_ids = {item.request_id for item in payload.items}
+    requests_by_id = {
+        r.id: r for r in db.query(models.StockMovementRequest).filter(
+            models.StockMovementRequest.id.in_(request_ids)
+        ).all()
+    }
+
+    # Resolve ownership once instead of lazy-loading each request's warehouses
+    owned_warehouse_ids = set()
+    if current_user.role == "warehouse_owner":
+        owned_warehouse_ids = {
+            wh_id for (wh_id,) in db.query(models.Warehouse.id).filter(models.Warehouse.owner_id == current_user.id).all()
+        }
+
+    results = []
+    new_movements = []
+    for item in payload.items:
+        request = requests_by_id.get(item.request_id)
+        if not request:
+            results.append({"request_id": item.request_id, "status": "error", "detail": "Request not found."})
+            continue
+        if request.status != "pending":
+            results.append({"request_id": item.request_id, "status": "error", "detail": "Request is not pending."})
+            continue
+        if current_user.role == "warehouse_owner":
+            approver_warehouse_id = request.to_warehouse_id if request.movement_type == "transfer" else request.warehouse_id
+            if approver_warehouse_id not in owned_warehouse_ids:
+                results.append({"request_id": item.request_id, "status": "error", "detail": "Forbidden"})
+                continue
+
+        if item.action == "approve":
+            if not consume_stock_reservation(db, request):
+                results.append({"request_id": item.request_id, "status": "error", "detail": "Insufficient stock to approve this request."})
+                continue
+            new_movements.extend(build_stock_movements(request))
+            request.status = "approved"
+        elif item.action == "reject":
+            release_stock_reservation(db, request)
+            request.status = "rejected"
+            request.rejection_reason = item.reason
+        else:
+            results.append({"request_id": item.request_id, "status": "error", "detail": "Invalid action."})
+            continue
+        request.approved_by = current_user.id
+        request.approved_at = func.now()
+        results.append({"request_id": item.request_id, "status": request.status})
+
+    db.add_all(new_movements)
+    # Outbound rows were already applied when their reservations were consumed
+    apply_stock_movements(db, [m for m in new_movements if m.quantity > 0])
+    record_movement_rollups(db, new_movements)
+    db.commit()
+
+    approved_product_ids = {m.product_id for m in new_movements}
+    if approved_product_ids:
+        owner_ids = {
+            owner_id for (owner_id,) in db.query(models.Product.owner_id).filter(models.Product.id.in_(approved_product_ids)).all()
+        }
+        invalidate_dashboard_stats(owner_ids)
+
+    return {
+        "processed": sum(1 for r in results if r["status"] != "error"),
+        "failed": sum(1 for r in results if r["status"] == "error"),
+        "results": results
+    }
+
 # --- Cancel a pending stock movement request ---
 @router.delete("/my-requests/{request_id}")
 def cancel_my_request(
@@ -408,6 +845,8 @@ def cancel_my_request(
     if request.status not in ["pending", "rejected"]:
         raise HTTPException(status_code=400, detail="Only pending or rejected requests can be cancelled.")
 
+    if request.status == "pending":
+        release_stock_reservation(db, request)
     db.delete(request)
     db.commit()
     return {"message": "Request cancelled successfully"}
@@ -424,17 +863,23 @@ def clear_all_pending_requests(
     deleted_count = db.query(models.StockMovementRequest).filter(
         models.StockMovementRequest.status == "pending"
     ).delete()
+    # No pending requests remain, so nothing should stay reserved
+    rebuild_stock_reservations(db)
     db.commit()
     return {"message": f"Cleared {deleted_count} pending requests"}
 
-# --- Get all stock movements ---
+# --- Get all stock movements (keyset paginated, newest first) ---
 @router.get("/")
 def list_stock_movements(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user),
     warehouse_id: int = Query(None),
     product_id: int = Query(None),
-    movement_type: str = Query(None)
+    movement_type: str = Query(None),
+    created_from_date: Optional[datetime] = None,
+    created_to_date: Optional[datetime] = None,
+    page_size: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None
 ):
     query = db.query(
         models.StockMovement,
@@ -442,15 +887,7 @@ def list_stock_movements(
         models.User.username.label("username")
     ).select_from(models.StockMovement).join(models.Product, models.StockMovement.product_id == models.Product.id).outerjoin(models.User, models.StockMovement.user_id == models.User.id)
 
-    if current_user.role == "admin":
-        pass
-    elif current_user.role == "warehouse_owner":
-        # Warehouse owners see movements to their warehouses
-        warehouse_ids = select(models.Warehouse.id).where(models.Warehouse.owner_id == current_user.id)
-        query = query.filter(models.StockMovement.warehouse_id.in_(warehouse_ids))
-    else:  # USER
-        # Normal users see movements they created
-        query = query.filter(models.StockMovement.user_id == current_user.id)
+    query = scope_stock_movements_query(query, current_user)
 
     if warehouse_id:
         query = query.filter(models.StockMovement.warehouse_id == warehouse_id)
@@ -458,14 +895,123 @@ def list_stock_movements(
         query = query.filter(models.StockMovement.product_id == product_id)
     if movement_type:
         query = query.filter(models.StockMovement.movement_type == movement_type)
+    if created_from_date:
+        query = query.filter(models.StockMovement.created_at >= created_from_date)
+    if created_to_date:
+        query = query.filter(models.StockMovement.created_at <= created_to_date)
+
+    if cursor:
+        try:
+            cursor_created_at, cursor_id = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor.")
+        # Seek past the last row of the previous page instead of using OFFSET
+        query = query.filter(
+            tuple_(models.StockMovement.created_at, models.StockMovement.id) < tuple_(cursor_created_at, cursor_id)
+        )
 
-    movements_with_users = query.order_by(models.StockMovement.created_at.desc()).all()
+    # Fetch one extra row to know whether another page exists
+    rows = query.order_by(
+        models.StockMovement.created_at.desc(), models.StockMovement.id.desc()
+    ).limit(page_size + 1).all()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
 
     results = []
-    for movement, product_name, username in movements_with_users:
+    for movement, product_name, username in rows:
         movement_dict = schemas.StockMovementInDB.model_validate(movement).model_dump()
         movement_dict["product_name"] = product_name
         movement_dict["username"] = username or "Unknown"
         results.append(movement_dict)
 
-    return results
+    next_cursor = None
+    if has_more:
+        last_movement = rows[-1][0]
+        next_cursor = encode_cursor(last_movement.created_at, last_movement.id)
+
+    return {
+        "data": results,
+        "pagination": {
+            "page_size": page_size,
+            "next_cursor": next_cursor
+        }
+    }
+
+
+# --- Stream the stock ledger as NDJSON or CSV ---
+@router.get("/export")
+def export_stock_movements(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    warehouse_id: int = Query(None),
+    product_id: int = Query(None),
+    movement_type: str = Query(None),
+    created_from_date: Optional[datetime] = None,
+    created_to_date: Optional[datetime] = None
+):
+    # Plain columns rather than ORM entities so rows are not tracked by the session
+    query = db.query(
+        models.StockMovement.id,
+        models.StockMovement.created_at,
+        models.StockMovement.product_id,
+        models.Product.name.label("product_name"),
+        models.StockMovement.warehouse_id,
+        models.StockMovement.movement_type,
+        models.StockMovement.quantity,
+        models.StockMovement.reference_id,
+        models.StockMovement.user_id,
+        models.User.username.label("username"),
+        models.StockMovement.notes
+    ).select_from(models.StockMovement).join(models.Product, models.StockMovement.product_id == models.Product.id).outerjoin(models.User, models.StockMovement.user_id == models.User.id)
+
+    query = scope_stock_movements_query(query, current_user)
+
+    if warehouse_id:
+        query = query.filter(models.StockMovement.warehouse_id == warehouse_id)
+    if product_id:
+        query = query.filter(models.StockMovement.product_id == product_id)
+    if movement_type:
+        query = query.filter(models.StockMovement.movement_type == movement_type)
+    if created_from_date:
+        query = query.filter(models.StockMovement.created_at >= created_from_date)
+    if created_to_date:
+        query = query.filter(models.StockMovement.created_at <= created_to_date)
+
+    # Server-side cursor: rows are fetched from the database in batches as the response is written
+    rows = query.order_by(
+        models.StockMovement.created_at.asc(), models.StockMovement.id.asc()
+    ).execution_options(stream_results=True).yield_per(EXPORT_BATCH_SIZE)
+
+    def row_values(row):
+        values = dict(zip(EXPORT_COLUMNS, row))
+        values["created_at"] = values["created_at"].isoformat() if values["created_at"] else None
+        values["username"] = values["username"] or "Unknown"
+        return values
+
+    def generate_ndjson():
+        for row in rows:
+            yield json.dumps(row_values(row)) + "\n"
+
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row_values(row))
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+        yield buffer.getvalue()
+
+    if format == "csv":
+        return StreamingResponse(
+            generate_csv(),
+            media_type="text/csv",
+            headers={"Content-Disposition": "attachment; filename=stock_movements.csv"}
+        )
+    return StreamingResponse(
+        generate_ndjson(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": "attachment; filename=stock_movements.ndjson"}
+    )
@@ -1,14 +1,27 @@
 from fastapi import APIRouter, Depends, HTTPException, Query, Path
 from sqlalchemy.orm import Session
-from sqlalchemy import func, case, or_, select
-from typing import List
+from sqlalchemy import func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+import numpy as np
 
 from app import models, schemas
 from app.database import get_db
-from app.api.endpoints.auth import get_current_user
+from app.async_database import get_async_db
+from app.api.endpoints.auth import get_current_user, get_current_user_async
+from app.api.endpoints.dashboard import invalidate_dashboard_stats
+from app.api.endpoints.stock_movements import accessible_warehouses_filter
+from app.geo import warehouse_geohash, covering_prefixes, haversine_km, GEOHASH_RANGE_END
 
 router = APIRouter()
 
+def get_stocked_product_owner_ids(db: Session, warehouse_id: int) -> set:
+    """Owners of products with a balance row in the warehouse, i.e. whose dashboards show it."""
+    rows = db.query(models.Product.owner_id).join(
+        models.StockBalance, models.StockBalance.product_id == models.Product.id
+    ).filter(models.StockBalance.warehouse_id == warehouse_id).distinct().all()
+    return {owner_id for (owner_id,) in rows}
+
 @router.post("", response_model=schemas.WarehouseInDB, status_code=201)
 def create_warehouse(payload: schemas.WarehouseCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     if current_user.role not in ["admin", "warehouse_owner"]:
@@ -19,46 +32,26 @@ def create_warehouse(payload: schemas.WarehouseCreate, db: Session = Depends(get
         raise HTTPException(status_code=400, detail="Warehouse name already exists")
 
     wh = models.Warehouse(name=payload.name, location=payload.location, is_available=payload.is_available, latitude=payload.latitude, longitude=payload.longitude, owner_id=current_user.id)
+    wh.geohash = warehouse_geohash(wh.latitude, wh.longitude)
     db.add(wh)
     db.commit()
     db.refresh(wh)
+    invalidate_dashboard_stats([wh.owner_id], all_users=True)
     return wh
 
 @router.get("", response_model=List[schemas.WarehouseInDB])
-def list_warehouses(db: Session = Depends(get_db), page: int = Query(1, ge=1), page_size: int = Query(50, ge=1, le=200), current_user: models.User = Depends(get_current_user)):
-    # Get net stock per product per warehouse using subquery
-    stock_subq = db.query(
-        models.StockMovement.warehouse_id,
-        models.StockMovement.product_id,
-        func.coalesce(func.sum(models.StockMovement.quantity), 0).label("net_stock")
-    ).group_by(
-        models.StockMovement.warehouse_id, models.StockMovement.product_id
-    ).subquery()
-
-    # Get warehouses with product count (distinct products with net_stock > 0) and total value
-    warehouses_query = db.query(
+async def list_warehouses(db: AsyncSession = Depends(get_async_db), page: int = Query(1, ge=1), page_size: int = Query(50, ge=1, le=200), current_user: models.User = Depends(get_current_user_async)):
+    # Product count and stock value are maintained per warehouse by stock_crud as balances change,
+    # so the listing is a plain page over warehouses joined to one stats row each
+    warehouses_query = select(
         models.Warehouse,
-        func.count(func.distinct(case((stock_subq.c.net_stock > 0, stock_subq.c.product_id), else_=None))).label("product_count"),
-        func.coalesce(func.sum(case((stock_subq.c.net_stock > 0, stock_subq.c.net_stock * models.Product.price), else_=0)), 0).label("total_value")
+        func.coalesce(models.WarehouseStats.product_count, 0).label("product_count"),
+        func.coalesce(models.WarehouseStats.total_value, 0).label("total_value")
     ).outerjoin(
-        stock_subq, models.Warehouse.id == stock_subq.c.warehouse_id
-    ).outerjoin(
-        models.Product, stock_subq.c.product_id == models.Product.id
-    )
+        models.WarehouseStats, models.WarehouseStats.warehouse_id == models.Warehouse.id
+    ).order_by(models.Warehouse.created_at.desc())
 
-    if current_user.role == "user":
-        # Normal users see all warehouses
-        warehouses_query = warehouses_query.filter(
-            or_(models.Product.id.is_(None), models.Product.is_active == True)
-        )
-    else:  # admin and warehouse_owner see all warehouses
-        warehouses_query = warehouses_query.filter(
-            or_(models.Product.id.is_(None), models.Product.is_active == True)
-        )
-
-    warehouses_query = warehouses_query.group_by(models.Warehouse.id).order_by(models.Warehouse.created_at.desc())
-
-    warehouses_with_stats = warehouses_query.offset((page - 1) * page_size).limit(page_size).all()
+    warehouses_with_stats = (await db.execute(warehouses_query.offset((page - 1) * page_size).limit(page_size))).all()
 
     # Convert to response format
     results = []
@@ -70,6 +63,78 @@ def list_warehouses(db: Session = Depends(get_db), page: int = Query(1, ge=1), p
 
     return results
 
+@router.get("/nearest")
+def find_nearest_warehouses(
+    product_id: int = Query(...),
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    radius_km: Optional[float] = Query(None, gt=0),
+    limit: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Available warehouses holding unreserved stock of the product, closest first."""
+    product = db.query(models.Product.owner_id).filter(models.Product.id == product_id, models.Product.is_active == True).first()
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    if current_user.role != "admin" and product.owner_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+    available_quantity = (models.StockBalance.quantity - models.StockBalance.reserved_quantity).label("available_quantity")
+    candidates_query = db.query(
+        models.Warehouse.id,
+        models.Warehouse.name,
+        models.Warehouse.location,
+        models.Warehouse.latitude,
+        models.Warehouse.longitude,
+        available_quantity
+    ).join(
+        models.StockBalance, models.StockBalance.warehouse_id == models.Warehouse.id
+    ).filter(
+        models.StockBalance.product_id == product_id,
+        models.StockBalance.quantity - models.StockBalance.reserved_quantity > 0,
+        models.Warehouse.is_available == True,
+        models.Warehouse.geohash.isnot(None),
+        accessible_warehouses_filter(current_user)
+    )
+    if radius_km is not None:
+        prefixes = covering_prefixes(latitude, longitude, radius_km)
+        if prefixes is not None:
+            # Range scans on the geohash index, one per cell around the point
+            candidates_query = candidates_query.filter(or_(*(
+                (models.Warehouse.geohash >= prefix) & (models.Warehouse.geohash < prefix + GEOHASH_RANGE_END)
+                for prefix in prefixes
+            )))
+    candidates = candidates_query.all()
+    if not candidates:
+        return []
+
+    distances = haversine_km(
+        latitude, longitude,
+        np.fromiter((c.latitude for c in candidates), dtype=float, count=len(candidates)),
+        np.fromiter((c.longitude for c in candidates), dtype=float, count=len(candidates))
+    )
+    if radius_km is not None:
+        order = np.flatnonzero(distances <= radius_km)
+    else:
+        order = np.arange(len(candidates))
+    if len(order) > limit:
+        order = order[np.argpartition(distances[order], limit - 1)[:limit]]
+    order = order[np.argsort(distances[order], kind="stable")]
+
+    return [
+        {
+            "warehouse_id": candidates[i].id,
+            "name": candidates[i].name,
+            "location": candidates[i].location,
+            "latitude": candidates[i].latitude,
+            "longitude": candidates[i].longitude,
+            "available_quantity": int(candidates[i].available_quantity),
+            "distance_km": round(float(distances[i]), 3)
+        }
+        for i in order
+    ]
+
 @router.get("/{warehouse_id}", response_model=schemas.WarehouseInDB)
 def get_warehouse(warehouse_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_user)):
     wh = db.query(models.Warehouse).filter(models.Warehouse.id == warehouse_id).first()
@@ -106,8 +171,11 @@ def update_warehouse(warehouse_id: int, payload: schemas.WarehouseCreate, db: Se
     wh.is_available = payload.is_available
     wh.latitude = payload.latitude
     wh.longitude = payload.longitude
+    wh.geohash = warehouse_geohash(wh.latitude, wh.longitude)
+    affected_owner_ids = get_stocked_product_owner_ids(db, warehouse_id) | {wh.owner_id}
     db.commit()
     db.refresh(wh)
+    invalidate_dashboard_stats(affected_owner_ids, all_users=True)
     return wh
 
 @router.delete("/{warehouse_id}", status_code=204)
@@ -119,10 +187,16 @@ def delete_warehouse(warehouse_id: int, db: Session = Depends(get_db), current_u
         raise HTTPException(status_code=403, detail="Forbidden")
     if current_user.role == "warehouse_owner" and wh.owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Forbidden")
-    # Delete associated stock movements before deleting the warehouse
+    affected_owner_ids = get_stocked_product_owner_ids(db, warehouse_id) | {wh.owner_id}
+    # Delete associated stock movements and derived stock tables before deleting the warehouse
     db.query(models.StockMovement).filter(models.StockMovement.warehouse_id == warehouse_id).delete()
+    db.query(models.StockBalance).filter(models.StockBalance.warehouse_id == warehouse_id).delete()
+    db.query(models.StockSnapshot).filter(models.StockSnapshot.warehouse_id == warehouse_id).delete()
+    db.query(models.StockMovementMonthlyRollup).filter(models.StockMovementMonthlyRollup.warehouse_id == warehouse_id).delete()
+    db.query(models.WarehouseStats).filter(models.WarehouseStats.warehouse_id == warehouse_id).delete()
     db.delete(wh)
     db.commit()
+    invalidate_dashboard_stats(affected_owner_ids, all_users=True)
     return
 
 @router.patch("/{warehouse_id}/availability", response_model=schemas.WarehouseInDB)
@@ -138,8 +212,10 @@ def toggle_warehouse_availability(warehouse_id: int, db: Session = Depends(get_d
         raise HTTPException(status_code=403, detail="Forbidden")
 
     wh.is_available = not wh.is_available
+    affected_owner_ids = get_stocked_product_owner_ids(db, warehouse_id) | {wh.owner_id}
     db.commit()
     db.refresh(wh)
+    invalidate_dashboard_stats(affected_owner_ids, all_users=True)
     return wh
 
 @router.get("/{warehouse_id}/details", response_model=schemas.WarehouseDetails)
@@ -163,14 +239,12 @@ def get_warehouse_details(
         if wh.location != current_user.location and not assigned:
             raise HTTPException(status_code=403, detail="Forbidden")
 
-    # Products in stock > 0 for this warehouse using subquery
+    # Products in stock > 0 for this warehouse from the balance table
     stock_subq = db.query(
-        models.StockMovement.product_id,
-        func.coalesce(func.sum(models.StockMovement.quantity), 0).label("stock")
+        models.StockBalance.product_id,
+        models.StockBalance.quantity.label("stock")
     ).filter(
-        models.StockMovement.warehouse_id == warehouse_id
-    ).group_by(
-        models.StockMovement.product_id
+        models.StockBalance.warehouse_id == warehouse_id
     ).subquery()
 
     products_in_stock = db.query(
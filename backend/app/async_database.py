@@ -0,0 +1,55 @@
+"""Async engine and sessions for read-heavy endpoints.
+
+Endpoints declared async def with an AsyncSession wait for the database on the
+event loop instead of holding one of the threadpool's worker threads, so their
+concurrency is bounded by the connection pool rather than the threadpool. The
+engine points at the same database as app.database, through asyncpg on
+PostgreSQL (with the same pool settings) and aiosqlite on SQLite.
+"""
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.config import settings
+from app.database import PoolStats, instrument_pool
+
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def async_database_url(database_url: str) -> str:
+    """The same database URL with the backend's async driver, e.g. postgresql:// -> postgresql+asyncpg://."""
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for {backend} databases")
+    return url.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+def pool_options(database_url: str) -> dict:
+    # aiosqlite opens a connection per checkout (NullPool), which takes no sizing options
+    if make_url(database_url).get_backend_name() == "sqlite":
+        return {}
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+async_engine = create_async_engine(async_database_url(settings.DATABASE_URL), **pool_options(settings.DATABASE_URL))
+async_pool_stats = PoolStats()
+# Pool events are registered on the sync pool the async engine wraps
+instrument_pool(async_engine.sync_engine.pool, async_pool_stats)
+
+# expire_on_commit=False: attributes must stay readable without an implicit (awaitless) refresh
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+        except PoolTimeoutError:
+            async_pool_stats.record_timeout()
+            raise
@@ -0,0 +1,19 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+def encode_cursor(created_at: Optional[datetime], id: int) -> str:
+    """Encode a (created_at, id) keyset position as an opaque URL-safe token."""
+    payload = {"created_at": created_at.isoformat() if created_at else None, "id": id}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], int]:
+    """Decode a token from encode_cursor. Raises ValueError if it is malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        created_at = datetime.fromisoformat(payload["created_at"]) if payload["created_at"] else None
+        return created_at, int(payload["id"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
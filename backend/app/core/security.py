@@ -1,9 +1,12 @@
 
 import os
+import time
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from app.config import settings
+from app.core.cache import TTLCache
 
 SECRET_KEY = os.environ.get("API_SECRET_KEY", "your-super-secret-key-change-this-in-production")
 ALGORITHM = "HS256"
@@ -27,9 +30,29 @@ def create_access_token(subject: str, expires_delta: Optional[timedelta] = None,
         to_encode.update({"role": role})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
+# Payloads of tokens whose signature has already been verified, keyed by the token itself.
+# Each entry expires with its token's exp claim; failures are never cached.
+token_cache = TTLCache(settings.TOKEN_CACHE_TTL_SECONDS, maxsize=settings.TOKEN_CACHE_MAX_ENTRIES)
+
+def set_secret_key(secret_key: str) -> None:
+    """Rotate the signing key. Tokens verified under the old key must be verified again."""
+    global SECRET_KEY
+    SECRET_KEY = secret_key
+    token_cache.clear()
+
 def decode_access_token(token: str):
+    payload = token_cache.get(token)
+    if payload is not None:
+        # Entries can outlive exp by the cache's clock granularity, so check it again
+        if payload.get("exp", float("inf")) > time.time():
+            return dict(payload)
+        token_cache.delete(token)
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
     except JWTError:
         return None
+    ttl = settings.TOKEN_CACHE_TTL_SECONDS
+    if "exp" in payload:
+        ttl = min(ttl, payload["exp"] - time.time())
+    token_cache.set(token, payload, ttl_seconds=ttl)
+    return dict(payload)
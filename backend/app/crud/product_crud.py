@@ -0,0 +1,49 @@
+# app/crud/product_crud.py
+
+from sqlalchemy import func, insert, or_, select
+from sqlalchemy.orm import Session
+from typing import List, Set, Tuple
+import csv
+import io
+import json
+from app import models
+
+PRODUCT_COPY_COLUMNS = ["name", "sku", "description", "price", "is_active", "owner_id"]
+
+def json_values(db: Session, values: List[str]):
+    """SELECT over a list passed as one JSON parameter, usable in IN (...) for any list size."""
+    payload = json.dumps(values)
+    if db.bind.dialect.name == "postgresql":
+        elements = func.json_array_elements_text(payload).table_valued("value")
+    else:
+        elements = func.json_each(payload).table_valued("value")
+    return select(elements.c.value)
+
+def get_conflicting_products(db: Session, owner_id: int, skus: List[str], names: List[str]) -> Tuple[Set[str], Set[str]]:
+    """SKUs and names among the given ones that the owner already uses, in one query."""
+    rows = db.query(models.Product.sku, models.Product.name).filter(
+        models.Product.owner_id == owner_id,
+        or_(
+            models.Product.sku.in_(json_values(db, skus)),
+            models.Product.name.in_(json_values(db, names))
+        )
+    ).all()
+    return {sku for sku, _ in rows}, {name for _, name in rows}
+
+def bulk_insert_products(db: Session, rows: List[dict], batch_size: int = 5000) -> None:
+    """Insert product rows in the session's transaction: COPY on PostgreSQL, batched INSERTs elsewhere."""
+    if db.bind.dialect.name == "postgresql":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([row[column] if row[column] is not None else "" for column in PRODUCT_COPY_COLUMNS])
+        buffer.seek(0)
+        cursor = db.connection().connection.cursor()
+        try:
+            # Empty unquoted fields are NULL in COPY's csv format
+            cursor.copy_expert(f"COPY products ({', '.join(PRODUCT_COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        finally:
+            cursor.close()
+        return
+    for start in range(0, len(rows), batch_size):
+        db.execute(insert(models.Product), rows[start:start + batch_size])
@@ -0,0 +1,414 @@
+# app/crud/stock_crud.py
+
+from sqlalchemy import func, update, insert, delete, case, select, literal
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from datetime import datetime, timezone
+from typing import Optional
+from app import models
+
+def upsert_insert(db: Session, model):
+    """INSERT construct of the session's dialect, which supports ON CONFLICT upserts."""
+    if db.bind.dialect.name == 'sqlite':
+        return sqlite.insert(model)
+    return postgresql.insert(model)
+
+def get_stock_balance(db: Session, product_id: int, warehouse_id: int) -> int:
+    """Get the materialized stock balance for a product in a warehouse."""
+    result = db.query(models.StockBalance.quantity).filter(
+        models.StockBalance.product_id == product_id,
+        models.StockBalance.warehouse_id == warehouse_id
+    ).scalar()
+    return int(result or 0)
+
+def get_available_stock(db: Session, product_id: int, warehouse_id: int) -> int:
+    """Get stock that is on hand and not reserved by pending outbound requests."""
+    result = db.query(models.StockBalance.quantity - models.StockBalance.reserved_quantity).filter(
+        models.StockBalance.product_id == product_id,
+        models.StockBalance.warehouse_id == warehouse_id
+    ).scalar()
+    return int(result or 0)
+
+def get_reservation(request: models.StockMovementRequest):
+    """Return the (product_id, warehouse_id, quantity) a pending request holds, or None for inbound requests."""
+    if request.movement_type == "out":
+        return request.product_id, request.warehouse_id, abs(request.quantity)
+    if request.movement_type == "transfer":
+        return request.product_id, request.from_warehouse_id, abs(request.quantity)
+    return None
+
+def reserve_stock(db: Session, product_id: int, warehouse_id: int, quantity: int) -> bool:
+    """Atomically reserve unreserved stock for a pending outbound request.
+
+    The availability check is part of the UPDATE's WHERE clause, so the row lock taken
+    by the update serializes concurrent reservations. Returns False if too little is left.
+    """
+    result = db.execute(
+        update(models.StockBalance)
+        .where(
+            models.StockBalance.product_id == product_id,
+            models.StockBalance.warehouse_id == warehouse_id,
+            models.StockBalance.quantity - models.StockBalance.reserved_quantity >= quantity
+        )
+        .values(reserved_quantity=models.StockBalance.reserved_quantity + quantity)
+    )
+    return result.rowcount == 1
+
+def release_stock_reservation(db: Session, request: models.StockMovementRequest) -> None:
+    """Give back the stock a pending request reserved (on reject or cancel)."""
+    reservation = get_reservation(request)
+    if not reservation:
+        return
+    product_id, warehouse_id, quantity = reservation
+    db.execute(
+        update(models.StockBalance)
+        .where(
+            models.StockBalance.product_id == product_id,
+            models.StockBalance.warehouse_id == warehouse_id
+        )
+        .values(reserved_quantity=case(
+            (models.StockBalance.reserved_quantity >= quantity, models.StockBalance.reserved_quantity - quantity),
+            else_=0
+        ))
+    )
+
+def consume_stock_reservation(db: Session, request: models.StockMovementRequest) -> bool:
+    """Turn a request's reservation into an actual decrement of on-hand stock.
+
+    Re-validates against the locked balance row: the update only matches if the
+    stock and the reservation still cover the request. Returns False otherwise.
+    """
+    reservation = get_reservation(request)
+    if not reservation:
+        return True
+    product_id, warehouse_id, quantity = reservation
+    result = db.execute(
+        update(models.StockBalance)
+        .where(
+            models.StockBalance.product_id == product_id,
+            models.StockBalance.warehouse_id == warehouse_id,
+            models.StockBalance.quantity >= quantity,
+            models.StockBalance.reserved_quantity >= quantity
+        )
+        .values(
+            quantity=models.StockBalance.quantity - quantity,
+            reserved_quantity=models.StockBalance.reserved_quantity - quantity
+        )
+        .returning(models.StockBalance.quantity)
+    )
+    new_quantity = result.scalar()
+    if new_quantity is None:
+        return False
+    record_balance_change(db, product_id, warehouse_id, new_quantity + quantity, new_quantity)
+    return True
+
+def rebuild_stock_reservations(db: Session) -> None:
+    """Recompute reserved quantities from the pending requests."""
+    db.execute(update(models.StockBalance).values(reserved_quantity=0))
+    pending = db.query(models.StockMovementRequest).filter(
+        models.StockMovementRequest.status == "pending",
+        models.StockMovementRequest.movement_type.in_(["out", "transfer"])
+    ).all()
+    reserved = {}
+    for request in pending:
+        product_id, warehouse_id, quantity = get_reservation(request)
+        reserved[(product_id, warehouse_id)] = reserved.get((product_id, warehouse_id), 0) + quantity
+    for (product_id, warehouse_id), quantity in reserved.items():
+        db.execute(
+            update(models.StockBalance)
+            .where(
+                models.StockBalance.product_id == product_id,
+                models.StockBalance.warehouse_id == warehouse_id
+            )
+            .values(reserved_quantity=quantity)
+        )
+
+def apply_warehouse_stats_delta(db: Session, warehouse_id: int, product_count: int, total_value: float) -> None:
+    """Add to a warehouse's maintained aggregates, creating its row if needed."""
+    statement = upsert_insert(db, models.WarehouseStats).values(
+        warehouse_id=warehouse_id, product_count=product_count, total_value=total_value
+    )
+    db.execute(statement.on_conflict_do_update(
+        index_elements=[models.WarehouseStats.warehouse_id],
+        set_={
+            "product_count": models.WarehouseStats.product_count + statement.excluded.product_count,
+            "total_value": models.WarehouseStats.total_value + statement.excluded.total_value,
+            "updated_at": func.now()
+        }
+    ))
+
+def record_balance_change(db: Session, product_id: int, warehouse_id: int, old_quantity: int, new_quantity: int) -> None:
+    """Fold one balance change into the warehouse aggregates.
+
+    A warehouse counts an active product once while its balance is positive and values
+    it at quantity * current price, so only the positive parts of the balance matter.
+    """
+    old_in_stock = max(old_quantity, 0)
+    new_in_stock = max(new_quantity, 0)
+    if old_in_stock == new_in_stock:
+        return
+    product = db.query(models.Product.price, models.Product.is_active).filter(models.Product.id == product_id).first()
+    if not product or not product.is_active:
+        return
+    apply_warehouse_stats_delta(
+        db, warehouse_id,
+        int(new_in_stock > 0) - int(old_in_stock > 0),
+        (new_in_stock - old_in_stock) * product.price
+    )
+
+def reprice_warehouse_stats(db: Session, product_id: int, old_price: float, old_active: bool, new_price: float, new_active: bool) -> None:
+    """Adjust every warehouse holding the product after its price or active flag changed, in one UPDATE."""
+    count_delta = int(new_active) - int(old_active)
+    unit_value_delta = (new_price if new_active else 0) - (old_price if old_active else 0)
+    if count_delta == 0 and unit_value_delta == 0:
+        return
+    holding_warehouses = select(models.StockBalance.warehouse_id).where(
+        models.StockBalance.product_id == product_id,
+        models.StockBalance.quantity > 0
+    )
+    # Stock received while the product was inactive never created a stats row, so add missing ones first
+    db.execute(
+        upsert_insert(db, models.WarehouseStats)
+        .from_select(
+            ["warehouse_id", "product_count", "total_value"],
+            holding_warehouses.add_columns(literal(0), literal(0.0))
+        )
+        .on_conflict_do_nothing(index_elements=[models.WarehouseStats.warehouse_id])
+    )
+    held_quantity = select(models.StockBalance.quantity).where(
+        models.StockBalance.product_id == product_id,
+        models.StockBalance.warehouse_id == models.WarehouseStats.warehouse_id
+    ).scalar_subquery()
+    db.execute(
+        update(models.WarehouseStats)
+        .where(models.WarehouseStats.warehouse_id.in_(holding_warehouses))
+        .values(
+            product_count=models.WarehouseStats.product_count + count_delta,
+            total_value=models.WarehouseStats.total_value + unit_value_delta * held_quantity
+        ),
+        execution_options={"synchronize_session": False}
+    )
+
+def rebuild_warehouse_stats(db: Session) -> int:
+    """Recompute every warehouse's aggregates from the balances. Returns the number of rows written."""
+    db.execute(delete(models.WarehouseStats))
+    totals = db.query(
+        models.StockBalance.warehouse_id,
+        func.count(models.StockBalance.product_id).label("product_count"),
+        func.sum(models.StockBalance.quantity * models.Product.price).label("total_value")
+    ).join(
+        models.Product, models.StockBalance.product_id == models.Product.id
+    ).filter(
+        models.StockBalance.quantity > 0,
+        models.Product.is_active == True
+    ).group_by(models.StockBalance.warehouse_id)
+    result = db.execute(
+        insert(models.WarehouseStats).from_select(
+            ["warehouse_id", "product_count", "total_value"], totals.statement
+        )
+    )
+    return result.rowcount
+
+def apply_stock_delta(db: Session, product_id: int, warehouse_id: int, quantity: int) -> None:
+    """Add a ledger quantity to the matching balance row, creating the row if needed.
+
+    A single INSERT ... ON CONFLICT DO UPDATE, so concurrent transactions creating the
+    first balance for a pair do not race into a unique violation. Runs inside the
+    caller's transaction so the balance commits together with the StockMovement rows
+    it mirrors.
+    """
+    statement = upsert_insert(db, models.StockBalance).values(
+        product_id=product_id, warehouse_id=warehouse_id, quantity=quantity
+    )
+    statement = statement.on_conflict_do_update(
+        index_elements=[models.StockBalance.product_id, models.StockBalance.warehouse_id],
+        set_={
+            "quantity": models.StockBalance.quantity + statement.excluded.quantity,
+            "updated_at": func.now()
+        }
+    ).returning(models.StockBalance.quantity)
+    new_quantity = db.execute(statement).scalar()
+    record_balance_change(db, product_id, warehouse_id, new_quantity - quantity, new_quantity)
+
+def apply_stock_movements(db: Session, movements: list) -> None:
+    """Apply a batch of new StockMovement rows to the balance table, one statement per pair."""
+    deltas = {}
+    for movement in movements:
+        key = (movement.product_id, movement.warehouse_id)
+        deltas[key] = deltas.get(key, 0) + movement.quantity
+    for (product_id, warehouse_id), quantity in deltas.items():
+        apply_stock_delta(db, product_id, warehouse_id, quantity)
+
+def to_naive_utc(moment: datetime) -> datetime:
+    """Convert a timezone-aware datetime to the naive UTC form the ledger timestamps are compared in."""
+    if moment.tzinfo is None:
+        return moment
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+def month_key(moment: datetime) -> str:
+    """Rollup month of a ledger timestamp, taken in UTC."""
+    return to_naive_utc(moment).strftime('%Y-%m')
+
+def ledger_month(db: Session):
+    """SQL expression for the UTC rollup month of StockMovement.created_at."""
+    if db.bind.dialect.name == 'sqlite':
+        # SQLite stores the UTC wall time the ORM wrote
+        return func.strftime('%Y-%m', models.StockMovement.created_at)
+    return func.to_char(func.timezone('UTC', models.StockMovement.created_at), 'YYYY-MM')
+
+def record_movement_rollups(db: Session, movements: list) -> None:
+    """Add new StockMovement rows to the monthly rollup, one upsert per rollup key.
+
+    Each movement counts towards the UTC month of its created_at. Rows that have not
+    been flushed yet are stamped here so the ledger and the rollup agree on the month.
+    """
+    deltas = {}
+    for movement in movements:
+        if movement.created_at is None:
+            movement.created_at = models.utc_now()
+        key = (month_key(movement.created_at), movement.product_id, movement.warehouse_id, movement.user_id)
+        quantity, count = deltas.get(key, (0, 0))
+        deltas[key] = (quantity + movement.quantity, count + 1)
+
+    rollup = models.StockMovementMonthlyRollup
+    for (month, product_id, warehouse_id, user_id), (quantity, count) in deltas.items():
+        stmt = upsert_insert(db, rollup).values(
+            month=month, product_id=product_id, warehouse_id=warehouse_id, user_id=user_id,
+            quantity=quantity, movement_count=count
+        )
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[rollup.month, rollup.product_id, rollup.warehouse_id, rollup.user_id],
+            set_={
+                "quantity": rollup.quantity + stmt.excluded.quantity,
+                "movement_count": rollup.movement_count + stmt.excluded.movement_count,
+            }
+        ))
+
+def rebuild_movement_rollups(db: Session) -> int:
+    """Recompute the monthly rollup from the ledger. Returns the number of rows written."""
+    month = ledger_month(db)
+    db.execute(delete(models.StockMovementMonthlyRollup))
+    ledger_totals = db.query(
+        month.label("month"),
+        models.StockMovement.product_id,
+        models.StockMovement.warehouse_id,
+        models.StockMovement.user_id,
+        func.sum(models.StockMovement.quantity).label("quantity"),
+        func.count(models.StockMovement.id).label("movement_count")
+    ).group_by(
+        month, models.StockMovement.product_id, models.StockMovement.warehouse_id, models.StockMovement.user_id
+    )
+    result = db.execute(
+        insert(models.StockMovementMonthlyRollup).from_select(
+            ["month", "product_id", "warehouse_id", "user_id", "quantity", "movement_count"], ledger_totals.statement
+        )
+    )
+    return result.rowcount
+
+def rebuild_stock_balances(db: Session) -> int:
+    """Recompute every balance row from the ledger. Returns the number of rows written."""
+    db.execute(delete(models.StockBalance))
+    ledger_totals = db.query(
+        models.StockMovement.product_id,
+        models.StockMovement.warehouse_id,
+        func.sum(models.StockMovement.quantity).label("quantity")
+    ).group_by(
+        models.StockMovement.product_id, models.StockMovement.warehouse_id
+    )
+    result = db.execute(
+        insert(models.StockBalance).from_select(
+            ["product_id", "warehouse_id", "quantity"], ledger_totals.statement
+        )
+    )
+    rebuild_stock_reservations(db)
+    rebuild_warehouse_stats(db)
+    return result.rowcount
+
+def get_latest_snapshot_at(db: Session, before: datetime, inclusive: bool = True) -> Optional[datetime]:
+    """Get the most recent checkpoint time at (or strictly before) the given moment."""
+    query = db.query(func.max(models.StockSnapshot.snapshot_at))
+    if inclusive:
+        query = query.filter(models.StockSnapshot.snapshot_at <= before)
+    else:
+        query = query.filter(models.StockSnapshot.snapshot_at < before)
+    return query.scalar()
+
+def take_stock_snapshot(db: Session, snapshot_at: datetime) -> int:
+    """Write checkpoint rows for every non-zero balance as of snapshot_at.
+
+    Starts from the previous checkpoint and only sums the ledger rows created since,
+    so the cost does not grow with the age of the ledger. Re-running for the same
+    snapshot_at replaces the earlier rows. Returns the number of rows written.
+    """
+    base_at = get_latest_snapshot_at(db, snapshot_at, inclusive=False)
+
+    totals = {}
+    if base_at is not None:
+        base_rows = db.query(
+            models.StockSnapshot.product_id,
+            models.StockSnapshot.warehouse_id,
+            models.StockSnapshot.quantity
+        ).filter(models.StockSnapshot.snapshot_at == base_at).all()
+        for product_id, warehouse_id, quantity in base_rows:
+            totals[(product_id, warehouse_id)] = quantity
+
+    delta_query = db.query(
+        models.StockMovement.product_id,
+        models.StockMovement.warehouse_id,
+        func.sum(models.StockMovement.quantity)
+    ).filter(models.StockMovement.created_at < snapshot_at)
+    if base_at is not None:
+        delta_query = delta_query.filter(models.StockMovement.created_at >= base_at)
+    delta_rows = delta_query.group_by(
+        models.StockMovement.product_id, models.StockMovement.warehouse_id
+    ).all()
+    for product_id, warehouse_id, quantity in delta_rows:
+        key = (product_id, warehouse_id)
+        totals[key] = totals.get(key, 0) + int(quantity)
+
+    db.query(models.StockSnapshot).filter(models.StockSnapshot.snapshot_at == snapshot_at).delete()
+    rows = [
+        {"product_id": product_id, "warehouse_id": warehouse_id, "quantity": quantity, "snapshot_at": snapshot_at}
+        for (product_id, warehouse_id), quantity in totals.items() if quantity != 0
+    ]
+    if rows:
+        db.execute(insert(models.StockSnapshot), rows)
+    return len(rows)
+
+def get_stock_as_of(db: Session, product_id: int, as_of: datetime, warehouse_ids: Optional[list] = None) -> dict:
+    """Get a product's stock per warehouse at a point in time.
+
+    Reads the latest checkpoint at or before as_of and adds the ledger rows created
+    after it. Returns {warehouse_id: quantity} for warehouses with non-zero stock.
+    """
+    snapshot_at = get_latest_snapshot_at(db, as_of)
+
+    stock = {}
+    if snapshot_at is not None:
+        snapshot_query = db.query(
+            models.StockSnapshot.warehouse_id,
+            models.StockSnapshot.quantity
+        ).filter(
+            models.StockSnapshot.snapshot_at == snapshot_at,
+            models.StockSnapshot.product_id == product_id
+        )
+        if warehouse_ids is not None:
+            snapshot_query = snapshot_query.filter(models.StockSnapshot.warehouse_id.in_(warehouse_ids))
+        for warehouse_id, quantity in snapshot_query.all():
+            stock[warehouse_id] = quantity
+
+    delta_query = db.query(
+        models.StockMovement.warehouse_id,
+        func.sum(models.StockMovement.quantity)
+    ).filter(
+        models.StockMovement.product_id == product_id,
+        models.StockMovement.created_at <= as_of
+    )
+    if snapshot_at is not None:
+        delta_query = delta_query.filter(models.StockMovement.created_at >= snapshot_at)
+    if warehouse_ids is not None:
+        delta_query = delta_query.filter(models.StockMovement.warehouse_id.in_(warehouse_ids))
+    for warehouse_id, quantity in delta_query.group_by(models.StockMovement.warehouse_id).all():
+        stock[warehouse_id] = stock.get(warehouse_id, 0) + int(quantity)
+
+    return {warehouse_id: quantity for warehouse_id, quantity in stock.items() if quantity != 0}
@@ -1,27 +1,129 @@
-from sqlalchemy import create_engine, event, text
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import SQLAlchemyError, TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
 from fastapi import HTTPException, status
 from app.config import settings
 import logging
+import threading
+import time
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Create engine with connection pool settings
+class PoolStats:
+    """Counters for one connection pool's activity, reported by the admin pool-stats endpoint."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.connects = 0
+            self.checkouts = 0
+            self.checkins = 0
+            self.invalidations = 0
+            self.timeouts = 0
+            self.total_hold_seconds = 0.0
+            self.max_hold_seconds = 0.0
+
+    def record_checkout(self) -> None:
+        with self._lock:
+            self.checkouts += 1
+
+    def record_checkin(self, held_seconds: float) -> None:
+        with self._lock:
+            self.checkins += 1
+            self.total_hold_seconds += held_seconds
+            self.max_hold_seconds = max(self.max_hold_seconds, held_seconds)
+
+    def record_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+    def record_connect(self) -> None:
+        with self._lock:
+            self.connects += 1
+
+    def record_invalidation(self) -> None:
+        with self._lock:
+            self.invalidations += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "invalidations": self.invalidations,
+                "timeouts": self.timeouts,
+                "avg_hold_ms": round(self.total_hold_seconds / self.checkins * 1000, 3) if self.checkins else 0.0,
+                "max_hold_ms": round(self.max_hold_seconds * 1000, 3),
+            }
+
+def instrument_pool(pool, stats: PoolStats) -> None:
+    """Collect stats for a pool through its public connect/checkout/checkin/invalidate events."""
+
+    @event.listens_for(pool, "connect")
+    def connect(dbapi_connection, connection_record):
+        stats.record_connect()
+        logger.debug("Database connection established")
+
+    @event.listens_for(pool, "checkout")
+    def checkout(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info["checked_out_at"] = time.perf_counter()
+        stats.record_checkout()
+
+    @event.listens_for(pool, "checkin")
+    def checkin(dbapi_connection, connection_record):
+        checked_out_at = connection_record.info.pop("checked_out_at", None)
+        if checked_out_at is not None:
+            stats.record_checkin(time.perf_counter() - checked_out_at)
+
+    @event.listens_for(pool, "invalidate")
+    def invalidate(dbapi_connection, connection_record, exception):
+        stats.record_invalidation()
+        logger.warning(f"Database connection invalidated: {exception}")
+
+def pool_status(pool, stats: PoolStats) -> dict:
+    """Occupancy of a pool (for sizing pools such as QueuePool) plus its collected counters."""
+    status_fields = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status_fields.update({
+            "pool_size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": pool.overflow(),
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "timeout_seconds": pool.timeout(),
+        })
+    return {**status_fields, **stats.snapshot()}
+
+pool_stats = PoolStats()
+
+# Create engine with connection pool settings. pre_ping checks a pooled connection is alive
+# when it is checked out, so stale connections are replaced transparently.
 engine = create_engine(
     settings.DATABASE_URL,
-    pool_size=5,
-    max_overflow=10,
-    pool_timeout=30,
-    pool_recycle=1800  # Recycle connections after 30 minutes
+    poolclass=QueuePool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=True
 )
+instrument_pool(engine.pool, pool_stats)
 
-# Add engine event listener for debugging
-@event.listens_for(engine, "connect")
-def connect(dbapi_connection, connection_record):
-    logger.info("Database connection established")
+def get_pool_status() -> dict:
+    """Status of the sync and async engines' pools, with the counters collected since startup."""
+    # Imported here: app.async_database imports this module
+    from app.async_database import async_engine, async_pool_stats
+    return {
+        "sync": pool_status(engine.pool, pool_stats),
+        "async": pool_status(async_engine.sync_engine.pool, async_pool_stats),
+    }
 
 # Create SessionLocal for working with database session
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -29,19 +131,15 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # Base class for ORM models
 Base = declarative_base()
 
-# Function to get the DB session and check DB connection
+# Function to get the DB session; the pool's pre-ping handles connection liveness
 def get_db():
     db = SessionLocal()  # Get session
     try:
-        # Test the database connection with a raw SQL query using engine.connect()
-        with engine.connect() as conn:
-            query = text("SELECT 1")
-            conn.execute(query)  # Execute raw SQL query
-            logger.info("Database connection is successful.")
-        
         yield db  # Yield the database session for the request
     except SQLAlchemyError as e:
         # If there's any error with the database connection
+        if isinstance(e, PoolTimeoutError):
+            pool_stats.record_timeout()
         logger.error(f"Database connection failed: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -49,4 +147,3 @@ def get_db():
         )
     finally:
         db.close()  # Always close the session
-
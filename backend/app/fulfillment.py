@@ -0,0 +1,41 @@
+"""Greedy multi-warehouse allocation of an order's lines to source warehouses.
+
+The input is a products x warehouses matrix of available units, the units
+needed per product and each warehouse's distance to the destination. Every
+transfer is one (product, source warehouse) pair, so the fewer warehouses an
+order is pulled from, the fewer transfers it needs. Each round the solver
+picks the warehouse that completes the most outstanding lines, then the one
+covering the most outstanding units, then the nearest, and takes everything
+it can from it. This is the usual greedy set-cover heuristic: not always
+optimal, but within a log factor and cheap for thousands of sites.
+"""
+from typing import List, Tuple
+
+import numpy as np
+
+def allocate(needed: np.ndarray, available: np.ndarray, distances: np.ndarray) -> Tuple[List[Tuple[int, int, int]], np.ndarray]:
+    """Allocate needed[p] units of each product p from the columns of available[p, w].
+
+    Returns (allocations, shortfall): allocations are (product index, warehouse
+    index, quantity) triples in pick order, shortfall is the units left unmet
+    per product.
+    """
+    remaining = needed.astype(np.int64).copy()
+    stock = available.astype(np.int64).copy()
+    # Unknown distances sort after every known one
+    distances = np.where(np.isnan(distances), np.inf, distances)
+    allocations = []
+    while remaining.any():
+        takes = np.minimum(stock, remaining[:, None])
+        covered = takes.sum(axis=0)
+        if not covered.any():
+            break
+        completed = ((takes == remaining[:, None]) & (remaining[:, None] > 0)).sum(axis=0)
+        # lexsort orders by its last key first
+        best = np.lexsort((distances, -covered, -completed))[0]
+        for product in np.flatnonzero(takes[:, best]):
+            quantity = int(takes[product, best])
+            allocations.append((int(product), int(best), quantity))
+            remaining[product] -= quantity
+            stock[product, best] -= quantity
+    return allocations, remaining
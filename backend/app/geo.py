@@ -0,0 +1,85 @@
+"""Geohash encoding and vectorized great-circle distances for warehouse lookups.
+
+Warehouses store the geohash of their coordinates in an indexed column. Every
+point inside a geohash cell has that cell's hash as a prefix, so "warehouses
+within a cell" is a B-tree range scan on the column. A circle of radius r fits
+inside the 3x3 block of cells around its centre once cells are at least r wide
+and tall, which is how radius searches pick their candidate prefixes; exact
+distances are then computed with numpy over the candidates only.
+"""
+import math
+from typing import List, Optional
+
+import numpy as np
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 12
+# Sorts after every geohash character, so [prefix, prefix + GEOHASH_RANGE_END) covers a cell
+GEOHASH_RANGE_END = "{"
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+
+def geohash_encode(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        value, interval = (longitude, lon_range) if even else (latitude, lat_range)
+        middle = (interval[0] + interval[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+    return "".join(chars)
+
+def warehouse_geohash(latitude: Optional[float], longitude: Optional[float]) -> Optional[str]:
+    if latitude is None or longitude is None:
+        return None
+    return geohash_encode(latitude, longitude)
+
+def cell_size_degrees(precision: int):
+    """(height, width) in degrees of a geohash cell at the given precision."""
+    lon_bits = math.ceil(precision * 5 / 2)
+    lat_bits = precision * 5 // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+def covering_prefixes(latitude: float, longitude: float, radius_km: float) -> Optional[List[str]]:
+    """Geohash prefixes whose cells together contain the circle, or None if it needs the whole globe."""
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size_degrees(precision)
+        # The circle is widest, in degrees of longitude, at its edge nearest a pole
+        edge_latitude = min(abs(latitude) + radius_km / KM_PER_DEGREE, 90.0)
+        width_km = width * KM_PER_DEGREE * math.cos(math.radians(edge_latitude))
+        if height * KM_PER_DEGREE >= radius_km and width_km >= radius_km:
+            break
+    else:
+        return None
+    prefixes = set()
+    for lat_step in (-1, 0, 1):
+        cell_latitude = latitude + lat_step * height
+        if not -90.0 <= cell_latitude <= 90.0:
+            continue
+        for lon_step in (-1, 0, 1):
+            cell_longitude = (longitude + lon_step * width + 180.0) % 360.0 - 180.0
+            prefixes.add(geohash_encode(cell_latitude, cell_longitude, precision))
+    return sorted(prefixes)
+
+def haversine_km(latitude: float, longitude: float, latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """Great-circle distances in km from one point to arrays of points."""
+    lat1 = math.radians(latitude)
+    lat2 = np.radians(latitudes)
+    dlat = lat2 - lat1
+    dlon = np.radians(longitudes) - math.radians(longitude)
+    a = np.sin(dlat / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
@@ -3,9 +3,15 @@ from sqlalchemy import text # Add this import to main.py
 from app.database import SessionLocal
 from fastapi import FastAPI
 from app.database import Base, engine, get_db
+from app.async_database import async_engine
 from app.api.endpoints import products, warehouses, stock_movements, auth, dashboard, admin, assignments, scraped_products
 from sqlalchemy.orm import Session
 from app.core import security
+from app.core.password_hashing import password_hasher
+from app.partitioning import ensure_stock_movement_partitions
+from app.row_estimates import ensure_count_estimate_function
+from app.product_search import ensure_product_search_index
+from app.product_autocomplete import product_index
 from app import models
 from fastapi.middleware.cors import CORSMiddleware
 import os
@@ -38,11 +44,28 @@ async def lifespan(app: FastAPI):
     Base.metadata.create_all(bind=engine)
     logger.info("Database tables created or already exist")
 
+    # Make sure upcoming monthly ledger partitions exist (PostgreSQL only)
+    with engine.begin() as conn:
+        ensure_stock_movement_partitions(conn)
+        # Planner-estimate helper behind ?estimate_total=true listings (PostgreSQL only)
+        ensure_count_estimate_function(conn)
+        ensure_product_search_index(conn)
+
     # Ensure admin user exists
     ensure_admin()
 
+    # Load the SKU/name autocomplete index; product endpoints keep it current afterwards
+    db = SessionLocal()
+    try:
+        logger.info(f"Indexed {product_index.rebuild(db)} products for autocomplete")
+    finally:
+        db.close()
+
     yield
 
+    password_hasher.shutdown()
+    await async_engine.dispose()
+
 app = FastAPI(
     title="Inventory Management API",
     description="Inventory Management System API",
@@ -1,9 +1,14 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean, Float, UniqueConstraint, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean, Float, UniqueConstraint, Index, PrimaryKeyConstraint, Sequence, Enum as SQLEnum
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+from datetime import datetime, timezone
 from enum import Enum
 from .database import Base
 
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
 class UserRole(Enum):
     ADMIN = "admin"
     WAREHOUSE_OWNER = "warehouse_owner"
@@ -55,7 +60,10 @@ class Warehouse(Base):
     is_available = Column(Boolean, default=True, nullable=False)
     latitude = Column(Float, nullable=True)
     longitude = Column(Float, nullable=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Geohash of (latitude, longitude), kept in sync by the warehouse endpoints; see app/geo.py.
+    # Byte-order collation on PostgreSQL so prefix range scans can use the B-tree index
+    geohash = Column(String(12).with_variant(String(12, collation="C"), "postgresql"), nullable=True, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
 
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     owner = relationship("User", back_populates="warehouses")
@@ -102,13 +110,18 @@ class StockMovementRequest(Base):
 
 class StockMovement(Base):
     __tablename__ = "stock_movements"
-    id = Column(Integer, primary_key=True, index=True)
+    # The primary key is (id, created_at), matching the partitioned table on PostgreSQL,
+    # where every unique constraint must include the partition key; ids come from the sequence
+    id = Column(Integer, Sequence("stock_movements_id_seq"), primary_key=True, index=True)
     product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
     warehouse_id = Column(Integer, ForeignKey("warehouses.id"), nullable=False)
     movement_type = Column(String(50), nullable=False)
     quantity = Column(Integer, nullable=False)
     notes = Column(Text)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Partition key on PostgreSQL (see app/partitioning.py), so it must always be set.
+    # Set in Python with microseconds: SQLite's CURRENT_TIMESTAMP stores whole seconds in a text
+    # format that does not compare equal to a bound datetime, which breaks (created_at, id) keyset cursors.
+    created_at = Column(DateTime(timezone=True), primary_key=True, default=utc_now, server_default=func.now(), nullable=False, index=True)
     reference_id = Column(String(36), index=True, nullable=True)
 
     product = relationship("Product")
@@ -117,6 +130,76 @@ class StockMovement(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     user = relationship("User", back_populates="stock_movements")
 
+    __table_args__ = (
+        # Keyset pagination walks the ledger newest first on (created_at, id)
+        Index('ix_stock_movements_created_at_id', 'created_at', 'id'),
+        # Per-product ledger pages (product details) walk the same order within one product
+        Index('ix_stock_movements_product_created_at_id', 'product_id', 'created_at', 'id'),
+    )
+
+@compiles(PrimaryKeyConstraint, "sqlite")
+def compile_sqlite_primary_key(constraint, compiler, **kw):
+    # SQLite only assigns ids to a single INTEGER PRIMARY KEY, and its stock_movements is not partitioned
+    if constraint.table.name == StockMovement.__tablename__:
+        return "PRIMARY KEY (id)"
+    return compiler.visit_primary_key_constraint(constraint, **kw)
+
+class StockBalance(Base):
+    """Current on-hand quantity per product and warehouse, derived from the stock_movements ledger."""
+    __tablename__ = "stock_balances"
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    warehouse_id = Column(Integer, ForeignKey("warehouses.id"), nullable=False, index=True)
+    quantity = Column(Integer, default=0, nullable=False)
+    # Held by pending outbound requests (out and transfer source); released on approval, rejection or cancel
+    reserved_quantity = Column(Integer, default=0, server_default="0", nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    product = relationship("Product")
+    warehouse = relationship("Warehouse")
+
+    __table_args__ = (
+        UniqueConstraint('product_id', 'warehouse_id', name='unique_stock_balance_product_warehouse'),
+    )
+
+class WarehouseStats(Base):
+    """Per-warehouse aggregates over positive balances of active products, maintained by stock_crud."""
+    __tablename__ = "warehouse_stats"
+    id = Column(Integer, primary_key=True, index=True)
+    warehouse_id = Column(Integer, ForeignKey("warehouses.id"), nullable=False, unique=True)
+    product_count = Column(Integer, default=0, nullable=False)
+    total_value = Column(Float, default=0.0, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class StockMovementMonthlyRollup(Base):
+    """Ledger quantities summed per month, product, warehouse and user; feeds the dashboard trends."""
+    __tablename__ = "stock_movement_monthly_rollups"
+    id = Column(Integer, primary_key=True, index=True)
+    month = Column(String(7), nullable=False, index=True)  # YYYY-MM
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    warehouse_id = Column(Integer, ForeignKey("warehouses.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    quantity = Column(Integer, default=0, nullable=False)
+    movement_count = Column(Integer, default=0, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint('month', 'product_id', 'warehouse_id', 'user_id', name='unique_monthly_rollup_key'),
+    )
+
+class StockSnapshot(Base):
+    """Checkpoint of a product's stock in a warehouse, covering ledger rows created before snapshot_at."""
+    __tablename__ = "stock_snapshots"
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    warehouse_id = Column(Integer, ForeignKey("warehouses.id"), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    snapshot_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        UniqueConstraint('snapshot_at', 'product_id', 'warehouse_id', name='unique_stock_snapshot_product_warehouse'),
+    )
+
 class ScrapedProduct(Base):
     __tablename__ = "scraped_products"
     id = Column(Integer, primary_key=True, index=True)
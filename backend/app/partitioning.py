@@ -0,0 +1,111 @@
+"""Monthly range partitions for the stock_movements ledger.
+
+On PostgreSQL the migration turns stock_movements into a table partitioned by
+RANGE (created_at) with one partition per month and a DEFAULT partition as a
+safety net. SQLite (tests) and databases created with create_all keep a plain
+table; every helper here is a no-op for them.
+
+Rows for a month without its own partition land in the DEFAULT partition, and
+PostgreSQL refuses to create a partition whose range the default partition
+already holds rows for. ensure_stock_movement_partitions then splits the
+default partition: it detaches it, creates the month's partition, moves the
+month's rows into it and attaches the default partition again.
+"""
+from datetime import date, datetime, timezone
+from typing import List
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import SQLAlchemyError
+import logging
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = "stock_movements"
+DEFAULT_PARTITION = f"{PARENT_TABLE}_default"
+COLUMNS = "id, product_id, warehouse_id, movement_type, quantity, notes, created_at, reference_id, user_id"
+
+def month_start(d: date) -> date:
+    return date(d.year, d.month, 1)
+
+def add_months(d: date, months: int) -> date:
+    month_index = d.year * 12 + (d.month - 1) + months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_p{month.year:04d}_{month.month:02d}"
+
+def month_bounds(month: date) -> tuple:
+    """UTC timestamp literals bounding `month`, as [start, end)."""
+    start = month_start(month)
+    end = add_months(start, 1)
+    return f"'{start.isoformat()} 00:00:00+00'", f"'{end.isoformat()} 00:00:00+00'"
+
+def partition_ddl(month: date) -> str:
+    """CREATE statement for the partition holding rows created during `month` (UTC)."""
+    start, end = month_bounds(month)
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {PARENT_TABLE} "
+        f"FOR VALUES FROM ({start}) TO ({end})"
+    )
+
+def split_default_partition_ddl(month: date) -> List[str]:
+    """Statements that carve `month` out of the DEFAULT partition once it holds rows for it."""
+    start, end = month_bounds(month)
+    in_month = f"created_at >= {start} AND created_at < {end}"
+    return [
+        f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {DEFAULT_PARTITION}",
+        partition_ddl(month),
+        f"INSERT INTO {PARENT_TABLE} ({COLUMNS}) SELECT {COLUMNS} FROM {DEFAULT_PARTITION} WHERE {in_month}",
+        f"DELETE FROM {DEFAULT_PARTITION} WHERE {in_month}",
+        f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT",
+    ]
+
+def is_partitioned(conn: Connection) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    return conn.execute(text(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table pt "
+        "JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = :name)"
+    ), {"name": PARENT_TABLE}).scalar()
+
+def default_partition_has_rows(conn: Connection, month: date) -> bool:
+    if conn.execute(text("SELECT to_regclass(:name)"), {"name": DEFAULT_PARTITION}).scalar() is None:
+        return False
+    start, end = month_bounds(month)
+    return conn.execute(text(
+        f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE created_at >= {start} AND created_at < {end})"
+    )).scalar()
+
+def ensure_month_partition(conn: Connection, month: date) -> None:
+    if conn.execute(text("SELECT to_regclass(:name)"), {"name": partition_name(month)}).scalar() is not None:
+        return
+    if not default_partition_has_rows(conn, month):
+        conn.execute(text(partition_ddl(month)))
+        return
+    # Inserts are blocked by the locks these statements take until the transaction commits
+    logger.info(f"Moving {month:%Y-%m} rows out of {DEFAULT_PARTITION} into {partition_name(month)}")
+    for statement in split_default_partition_ddl(month):
+        conn.execute(text(statement))
+
+def ensure_stock_movement_partitions(conn: Connection, today: date = None, months_ahead: int = 3) -> List[str]:
+    """Create the partitions for the current UTC month and the next `months_ahead` months.
+
+    Safe to call repeatedly (at startup or from a scheduler). Each month runs in its
+    own savepoint; a month that fails is logged and skipped rather than aborting the
+    caller. Returns the names of the partitions it made sure exist.
+    """
+    if not is_partitioned(conn):
+        return []
+    current = month_start(today or datetime.now(timezone.utc).date())
+    names = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        try:
+            with conn.begin_nested():
+                ensure_month_partition(conn, month)
+        except SQLAlchemyError as e:
+            logger.error(f"Could not create stock_movements partition {partition_name(month)}: {e}")
+            continue
+        names.append(partition_name(month))
+    logger.info(f"Ensured stock_movements partitions: {', '.join(names)}")
+    return names
@@ -0,0 +1,144 @@
+"""In-process prefix index over product SKUs and names for autocomplete.
+
+Each owner has a sorted list of (key, product_id) pairs; a lookup is a bisect to
+the first key starting with the prefix followed by a short forward scan, so it
+never touches the database. Keys are the lowercased SKU, the lowercased name and
+every suffix of the name that starts at a word boundary (so "wid" finds "Blue
+widget"). The index is rebuilt at startup and patched by the product endpoints
+after their writes commit.
+
+The index lives in each worker process, and only that worker's own writes patch
+it. With several workers, writes handled elsewhere (or made directly in the
+database) show up when the index expires: once it is older than max_age_seconds,
+the next lookup rebuilds it from the database while concurrent lookups keep
+using the old copy. A max age of 0 never expires it, which suits a single worker.
+"""
+import heapq
+import threading
+import time
+from bisect import bisect_left, insort
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import settings
+
+def index_keys(sku: str, name: str) -> set:
+    name = name.lower()
+    keys = {sku.lower(), name}
+    for position, char in enumerate(name):
+        if position > 0 and name[position - 1] == " " and char != " ":
+            keys.add(name[position:])
+    return keys
+
+class ProductPrefixIndex:
+    def __init__(self, max_age_seconds: float = 0):
+        self.max_age_seconds = max_age_seconds
+        self.built_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._products: Dict[int, Tuple[Optional[int], str, str, bool]] = {}
+        self._keys_by_owner: Dict[Optional[int], List[Tuple[str, int]]] = {}
+
+    def rebuild(self, db: Session) -> int:
+        """Reload every product from the database. Returns the number indexed."""
+        # The age counts from before the read, so writes committed while it runs are caught by the next rebuild
+        started = time.monotonic()
+        rows = db.query(
+            models.Product.id, models.Product.owner_id, models.Product.sku, models.Product.name, models.Product.is_active
+        ).all()
+        products = {}
+        keys_by_owner = {}
+        for product_id, owner_id, sku, name, is_active in rows:
+            products[product_id] = (owner_id, sku, name, is_active)
+            keys_by_owner.setdefault(owner_id, []).extend((key, product_id) for key in index_keys(sku, name))
+        for keys in keys_by_owner.values():
+            keys.sort()
+        with self._lock:
+            self._products = products
+            self._keys_by_owner = keys_by_owner
+            self.built_at = started
+        return len(products)
+
+    def is_stale(self) -> bool:
+        if self.built_at is None:
+            return True
+        return self.max_age_seconds > 0 and time.monotonic() - self.built_at >= self.max_age_seconds
+
+    def refresh_if_stale(self, db: Session) -> bool:
+        """Rebuild if never built or past max age. Returns True if this call rebuilt it."""
+        if not self.is_stale() or not self._rebuild_lock.acquire(blocking=False):
+            return False
+        try:
+            if not self.is_stale():
+                return False
+            self.rebuild(db)
+            return True
+        finally:
+            self._rebuild_lock.release()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._products = {}
+            self._keys_by_owner = {}
+            self.built_at = None
+
+    def _remove_locked(self, product_id: int) -> None:
+        existing = self._products.pop(product_id, None)
+        if existing is None:
+            return
+        owner_id, sku, name, _ = existing
+        keys = self._keys_by_owner.get(owner_id, [])
+        for key in index_keys(sku, name):
+            position = bisect_left(keys, (key, product_id))
+            if position < len(keys) and keys[position] == (key, product_id):
+                del keys[position]
+
+    def upsert(self, product: models.Product) -> None:
+        with self._lock:
+            self._remove_locked(product.id)
+            self._products[product.id] = (product.owner_id, product.sku, product.name, product.is_active)
+            keys = self._keys_by_owner.setdefault(product.owner_id, [])
+            for key in index_keys(product.sku, product.name):
+                insort(keys, (key, product.id))
+
+    def remove(self, product_id: int) -> None:
+        with self._lock:
+            self._remove_locked(product_id)
+
+    def _matches(self, keys: List[Tuple[str, int]], prefix: str) -> Iterator[Tuple[str, int]]:
+        position = bisect_left(keys, (prefix,))
+        while position < len(keys) and keys[position][0].startswith(prefix):
+            yield keys[position]
+            position += 1
+
+    def search(self, prefix: str, owner_id: Optional[int] = None, all_owners: bool = False,
+               limit: int = 10, include_inactive: bool = False) -> List[dict]:
+        """Products whose SKU or name (or a word in it) starts with prefix, in key order."""
+        prefix = prefix.lower()
+        if not prefix:
+            return []
+        with self._lock:
+            if all_owners:
+                matches = heapq.merge(*(self._matches(keys, prefix) for keys in self._keys_by_owner.values()))
+            else:
+                matches = self._matches(self._keys_by_owner.get(owner_id, []), prefix)
+            results = []
+            seen = set()
+            for _, product_id in matches:
+                if product_id in seen:
+                    continue
+                seen.add(product_id)
+                _, sku, name, is_active = self._products[product_id]
+                if not is_active and not include_inactive:
+                    continue
+                results.append({"id": product_id, "sku": sku, "name": name})
+                if len(results) == limit:
+                    break
+            return results
+
+    def __len__(self) -> int:
+        return len(self._products)
+
+product_index = ProductPrefixIndex(settings.PRODUCT_INDEX_MAX_AGE_SECONDS)
@@ -0,0 +1,106 @@
+"""Indexed substring search over product name and SKU.
+
+PostgreSQL uses pg_trgm GIN indexes on products.name and products.sku, which
+serve ILIKE '%term%' directly and rank with similarity(). SQLite keeps an FTS5
+shadow table (products_fts, trigram tokenizer) in sync with products through
+triggers and ranks with bm25(). Both are created by the migration and, through
+the DDL listeners below, whenever create_all creates the products table.
+
+Trigram indexes cannot serve terms shorter than three characters, so those
+fall back to a plain ILIKE scan on every backend.
+"""
+from typing import Tuple
+from sqlalchemy import DDL, event, func, or_, case, select, literal_column, table, column, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Query
+import logging
+
+from app import models
+
+logger = logging.getLogger(__name__)
+
+MIN_INDEXED_TERM_LENGTH = 3
+
+SQLITE_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5("
+    "name, sku, content='products', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN "
+    "INSERT INTO products_fts(rowid, name, sku) VALUES (new.id, new.name, new.sku); END",
+    "CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN "
+    "INSERT INTO products_fts(products_fts, rowid, name, sku) VALUES ('delete', old.id, old.name, old.sku); END",
+    "CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF name, sku ON products BEGIN "
+    "INSERT INTO products_fts(products_fts, rowid, name, sku) VALUES ('delete', old.id, old.name, old.sku); "
+    "INSERT INTO products_fts(rowid, name, sku) VALUES (new.id, new.name, new.sku); END",
+]
+
+SQLITE_FTS_DROP_DDL = ["DROP TABLE IF EXISTS products_fts"]
+
+POSTGRES_TRGM_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_products_name_trgm ON products USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_products_sku_trgm ON products USING gin (sku gin_trgm_ops)",
+]
+
+for statement in SQLITE_FTS_DDL:
+    event.listen(models.Product.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+for statement in SQLITE_FTS_DROP_DDL:
+    event.listen(models.Product.__table__, "before_drop", DDL(statement).execute_if(dialect="sqlite"))
+for statement in POSTGRES_TRGM_DDL:
+    event.listen(models.Product.__table__, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+
+products_fts = table("products_fts", column("rowid"), column("rank"))
+
+def ensure_product_search_index(conn: Connection) -> None:
+    """Create the search structures for databases whose products table predates them."""
+    if conn.dialect.name == "sqlite":
+        exists = conn.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'products_fts'"
+        )).first()
+        for statement in SQLITE_FTS_DDL:
+            conn.execute(text(statement))
+        if not exists:
+            conn.execute(text("INSERT INTO products_fts(products_fts) VALUES ('rebuild')"))
+            logger.info("Built products_fts search index")
+    elif conn.dialect.name == "postgresql":
+        for statement in POSTGRES_TRGM_DDL:
+            conn.execute(text(statement))
+
+def substring_filter(term: str):
+    return or_(
+        models.Product.name.ilike(f"%{term}%"),
+        models.Product.sku.ilike(f"%{term}%")
+    )
+
+def fts5_phrase(term: str) -> str:
+    """Quote term as a single FTS5 phrase so its characters match literally."""
+    return '"' + term.replace('"', '""') + '"'
+
+def apply_product_search(query: Query, term: str, dialect_name: str) -> Tuple[Query, object]:
+    """Restrict a grouped product query to rows matching term.
+
+    Returns the filtered query and a relevance expression (higher is better) that
+    is valid in its ORDER BY.
+    """
+    if len(term) >= MIN_INDEXED_TERM_LENGTH and dialect_name == "postgresql":
+        relevance = func.greatest(
+            func.similarity(models.Product.name, term),
+            func.similarity(models.Product.sku, term)
+        )
+        return query.filter(substring_filter(term)), relevance
+
+    if len(term) >= MIN_INDEXED_TERM_LENGTH and dialect_name == "sqlite":
+        matches = select(
+            products_fts.c.rowid.label("product_id"),
+            products_fts.c.rank
+        ).where(literal_column("products_fts").op("MATCH")(fts5_phrase(term))).subquery("product_matches")
+        # FTS5's rank column is bm25(), which is lower for better matches
+        return query.join(matches, matches.c.product_id == models.Product.id), -func.min(matches.c.rank)
+
+    relevance = case(
+        (func.lower(models.Product.name) == term.lower(), 3),
+        (func.lower(models.Product.sku) == term.lower(), 3),
+        (models.Product.name.ilike(f"{term}%"), 2),
+        (models.Product.sku.ilike(f"{term}%"), 2),
+        else_=1
+    )
+    return query.filter(substring_filter(term)), relevance
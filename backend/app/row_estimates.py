@@ -0,0 +1,44 @@
+"""Planner-statistics row counts for large listings.
+
+On PostgreSQL a count_estimate(query text) function returns the row estimate
+from EXPLAIN for any SELECT, which lets a listing report an approximate total
+without scanning every matching row. The migration creates the function and
+startup re-creates it for databases built with create_all. SQLite has no
+equivalent, so callers fall back to exact counts there.
+"""
+from sqlalchemy import func, literal, select, text, String
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine import Connection
+from sqlalchemy.sql import Select
+
+COUNT_ESTIMATE_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION count_estimate(query text) RETURNS bigint AS $$
+DECLARE
+    plan jsonb;
+BEGIN
+    EXECUTE 'EXPLAIN (FORMAT JSON) ' || query INTO plan;
+    RETURN (plan->0->'Plan'->>'Plan Rows')::bigint;
+END;
+$$ LANGUAGE plpgsql VOLATILE STRICT
+"""
+
+def supports_row_estimates(dialect_name: str) -> bool:
+    return dialect_name == "postgresql"
+
+def ensure_count_estimate_function(conn: Connection) -> bool:
+    """Create count_estimate() on PostgreSQL. Returns False for other databases."""
+    if not supports_row_estimates(conn.dialect.name):
+        return False
+    conn.execute(text(COUNT_ESTIMATE_FUNCTION_SQL))
+    return True
+
+def count_estimate(stmt: Select):
+    """Scalar subquery estimating how many rows stmt returns, for use inside another query.
+
+    As an uncorrelated subquery it runs once per statement (an InitPlan), not once per row
+    when used as a select-list column. stmt is rendered with its parameters inlined, since
+    EXPLAIN runs it as text. It is compiled with the named paramstyle: psycopg2's pyformat
+    doubles every % in literals, and the text reaches EXPLAIN as a value, not a statement.
+    """
+    sql = str(stmt.compile(dialect=postgresql.dialect(paramstyle="named"), compile_kwargs={"literal_binds": True}))
+    return select(func.count_estimate(literal(sql, String))).scalar_subquery()
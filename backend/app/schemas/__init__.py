@@ -16,6 +16,7 @@ from .auth_schemas import (
 from .product_schemas import (
     ProductBase,
     ProductCreate,
+    BulkProductCreate,
     ProductInDB,
     ProductSummary,
     ProductDetails,
@@ -31,12 +32,17 @@ from .warehouse_schemas import (
 from .stock_movement_schemas import (
     StockMovementBase,
     StockMovementCreate,
+    BulkStockMovementCreate,
     StockMovementInDB,
     StockTransferCreate,
     StockMovementRequestBase,
     StockMovementRequestCreate,
     StockMovementRequestInDB,
     ApproveRequest,
+    BulkApproveItem,
+    BulkApproveRequest,
+    AllocationItem,
+    FulfillmentAllocationRequest,
 )
 
 from .assignment_schemas import (
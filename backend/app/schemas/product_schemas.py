@@ -13,6 +13,9 @@ class ProductBase(BaseModel):
 class ProductCreate(ProductBase):
     pass
 
+class BulkProductCreate(BaseModel):
+    products: List[ProductCreate]
+
 class ProductInDB(ProductBase):
     id: int
     is_active: bool
@@ -33,3 +36,4 @@ class ProductSummary(ProductInDB):
 class ProductDetails(ProductInDB):
     stock_distribution: Optional[List[dict]] = []
     ledger_history: Optional[List[dict]] = []
+    ledger_next_cursor: Optional[str] = None
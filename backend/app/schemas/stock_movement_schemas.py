@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List
 from datetime import datetime
 
 # -- Stock Movement --
@@ -22,6 +22,9 @@ class StockMovementInDB(StockMovementBase):
     class Config:
         from_attributes = True
 
+class BulkStockMovementCreate(BaseModel):
+    movements: List[StockMovementCreate]
+
 # ✅ New schema for transfers
 class StockTransferCreate(BaseModel):
     product_id: int
@@ -58,3 +61,19 @@ class StockMovementRequestInDB(StockMovementRequestBase):
 class ApproveRequest(BaseModel):
     action: str
     reason: Optional[str] = None
+
+class BulkApproveItem(ApproveRequest):
+    request_id: int
+
+class BulkApproveRequest(BaseModel):
+    items: List[BulkApproveItem]
+
+class AllocationItem(BaseModel):
+    product_id: int
+    quantity: int
+
+class FulfillmentAllocationRequest(BaseModel):
+    to_warehouse_id: int
+    items: List[AllocationItem]
+    create_transfers: bool = False
+    notes: Optional[str] = None
@@ -0,0 +1,179 @@
+"""Load-test the hot read endpoints: highest request rate sustained at a fixed p99.
+
+Starts the app under uvicorn (or targets --base-url), then drives each endpoint
+with an open-loop load generator. Requests are issued on a fixed schedule
+whatever the response times, and latency is measured from each request's
+scheduled start, so queueing inside the server is not hidden. Every step rate
+in --rates runs for --duration seconds. The result per endpoint is the highest
+rate whose p99 stayed within --p99-ms with no errors and at least 95% of the
+offered rate completed.
+
+To compare revisions, seed once and point --base-url at a server started from
+the other checkout against the same DATABASE_URL.
+
+    cd backend
+    DATABASE_URL=sqlite:////tmp/bench_reads.db API_SECRET_KEY=x python scalability/benchmark_async_reads.py
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from sqlalchemy import insert
+
+from app import models
+from app.core.security import get_password_hash
+from app.crud.stock_crud import rebuild_stock_balances, rebuild_movement_rollups
+from app.database import Base, engine, SessionLocal
+
+USERNAME = "bench_reads"
+PASSWORD = "Password1!"
+ENDPOINTS = [
+    "/products?page=1&page_size=20",
+    "/warehouses?page=1&page_size=50",
+    "/dashboard/stats",
+    "/stock-movements/stock/{product_id}",
+]
+
+def seed(products: int, warehouses: int, movements: int) -> int:
+    """Seed the benchmark user and its stock once. Returns a stocked product id."""
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        user = db.query(models.User).filter(models.User.username == USERNAME).first()
+        if user is None:
+            rng = random.Random(42)
+            user = models.User(username=USERNAME, email=f"{USERNAME}@example.com", hashed_password=get_password_hash(PASSWORD), role="admin")
+            db.add(user)
+            db.flush()
+            db.execute(insert(models.Warehouse), [
+                {"name": f"Bench warehouse {i}", "location": "Bench", "owner_id": user.id} for i in range(warehouses)
+            ])
+            db.execute(insert(models.Product), [
+                {"name": f"Bench product {i}", "sku": f"BENCH{i:06d}", "price": round(rng.uniform(1, 500), 2), "owner_id": user.id}
+                for i in range(products)
+            ])
+            product_ids = [p for (p,) in db.query(models.Product.id).filter(models.Product.owner_id == user.id)]
+            warehouse_ids = [w for (w,) in db.query(models.Warehouse.id).filter(models.Warehouse.owner_id == user.id)]
+            now = datetime.utcnow()
+            db.execute(insert(models.StockMovement), [
+                {
+                    "product_id": rng.choice(product_ids),
+                    "warehouse_id": rng.choice(warehouse_ids),
+                    "user_id": user.id,
+                    "movement_type": "in",
+                    "quantity": rng.randint(1, 50),
+                    "created_at": now - timedelta(minutes=rng.randint(0, 60 * 24 * 365)),
+                }
+                for _ in range(movements)
+            ])
+            rebuild_stock_balances(db)
+            rebuild_movement_rollups(db)
+            db.commit()
+        return db.query(models.StockBalance.product_id).join(
+            models.Product, models.Product.id == models.StockBalance.product_id
+        ).filter(models.Product.owner_id == user.id).first()[0]
+    finally:
+        db.close()
+
+def start_server(port: int) -> subprocess.Popen:
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=backend_dir
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/docs").status_code == 200:
+                return server
+        except httpx.TransportError:
+            pass
+        time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError("server did not start")
+
+async def run_step(client: httpx.AsyncClient, path: str, rate: int, duration: float) -> dict:
+    latencies, errors = [], 0
+    total = int(rate * duration)
+
+    async def one(scheduled: float):
+        nonlocal errors
+        try:
+            response = await client.get(path)
+            if response.status_code != 200:
+                errors += 1
+        except httpx.HTTPError:
+            errors += 1
+        latencies.append(time.perf_counter() - scheduled)
+
+    started = time.perf_counter()
+    tasks = []
+    for i in range(total):
+        scheduled = started + i / rate
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(one(scheduled)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1000,
+        "errors": errors,
+        "achieved": total / elapsed,
+    }
+
+async def run(base_url: str, product_id: int, endpoints, rates, duration: float, p99_ms: float) -> None:
+    limits = httpx.Limits(max_connections=2000, max_keepalive_connections=200)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        token = (await client.post("/auth/login", data={"username": USERNAME, "password": PASSWORD})).json()["access_token"]
+        client.headers["Authorization"] = f"Bearer {token}"
+        for template in endpoints:
+            path = template.format(product_id=product_id)
+            await client.get(path)  # warm caches and connections
+            best = 0
+            for rate in rates:
+                result = await run_step(client, path, rate, duration)
+                ok = result["p99_ms"] <= p99_ms and not result["errors"] and result["achieved"] >= rate * 0.95
+                print(
+                    f"  {path:<40} {rate:6d} req/s  p50 {result['p50_ms']:8.1f} ms  p99 {result['p99_ms']:8.1f} ms"
+                    f"  errors {result['errors']}  {'ok' if ok else 'over'}"
+                )
+                if not ok:
+                    break
+                best = rate
+            print(f"{path}: max {best} req/s at p99 <= {p99_ms:.0f} ms")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", help="target a running server instead of starting one")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--endpoints", nargs="+", default=ENDPOINTS)
+    parser.add_argument("--rates", type=int, nargs="+", default=[25, 50, 100, 200, 400, 800])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--p99-ms", type=float, default=250.0)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--warehouses", type=int, default=40)
+    parser.add_argument("--movements", type=int, default=200_000)
+    args = parser.parse_args()
+
+    product_id = seed(args.products, args.warehouses, args.movements)
+    server = None if args.base_url else start_server(args.port)
+    try:
+        asyncio.run(run(args.base_url or f"http://127.0.0.1:{args.port}", product_id, args.endpoints, args.rates, args.duration, args.p99_ms))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+if __name__ == "__main__":
+    main()
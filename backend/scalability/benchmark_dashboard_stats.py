@@ -0,0 +1,115 @@
+"""Benchmark GET /dashboard/stats against a seeded stock ledger.
+
+Seeds users, products, warehouses and a stock_movements ledger of --rows rows
+(default 5,000,000) into DATABASE_URL, derives balances and monthly rollups from
+it, then times get_dashboard_stats per role with the stats cache cleared before
+every call. Seeding is skipped when the ledger already holds rows, so the same
+database can be reused to compare revisions.
+
+    cd backend
+    DATABASE_URL=sqlite:////tmp/bench.db API_SECRET_KEY=x python scalability/benchmark_dashboard_stats.py
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event, func, insert
+
+from app import models
+from app.database import Base, engine, SessionLocal
+from app.async_database import AsyncSessionLocal, async_engine
+from app.crud.stock_crud import rebuild_stock_balances, rebuild_movement_rollups
+from app.api.endpoints.dashboard import get_dashboard_stats, stats_cache
+
+ROLES = ["admin", "warehouse_owner", "user"]
+
+def seed(db, rows: int, products: int, warehouses: int, batch_size: int = 50_000) -> None:
+    rng = random.Random(42)
+    db.execute(insert(models.User), [
+        {"username": f"bench_{role}", "email": f"bench_{role}@example.com", "hashed_password": "x", "role": role}
+        for role in ROLES
+    ])
+    user_ids = [u.id for u in db.query(models.User).filter(models.User.username.like("bench_%")).order_by(models.User.id)]
+    db.execute(insert(models.Warehouse), [
+        {"name": f"Warehouse {i}", "location": "Bench", "is_available": i % 5 != 0, "owner_id": user_ids[1]}
+        for i in range(warehouses)
+    ])
+    db.execute(insert(models.Product), [
+        {"name": f"Product {i}", "sku": f"SKU{i:06d}", "price": round(rng.uniform(1, 500), 2), "owner_id": user_ids[i % len(user_ids)]}
+        for i in range(products)
+    ])
+    product_ids = [p for (p,) in db.query(models.Product.id)]
+    warehouse_ids = [w for (w,) in db.query(models.Warehouse.id)]
+    now = datetime.utcnow()
+
+    written = 0
+    while written < rows:
+        batch = []
+        for _ in range(min(batch_size, rows - written)):
+            quantity = rng.randint(1, 50) * (1 if rng.random() < 0.6 else -1)
+            batch.append({
+                "product_id": rng.choice(product_ids),
+                "warehouse_id": rng.choice(warehouse_ids),
+                "user_id": rng.choice(user_ids),
+                "movement_type": "in" if quantity > 0 else "out",
+                "quantity": quantity,
+                "created_at": now - timedelta(minutes=rng.randint(0, 60 * 24 * 730)),
+            })
+        db.execute(insert(models.StockMovement), batch)
+        written += len(batch)
+        print(f"  seeded {written:,}/{rows:,} ledger rows", end="\r", flush=True)
+    print()
+    rebuild_stock_balances(db)
+    rebuild_movement_rollups(db)
+    db.commit()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--products", type=int, default=2_000)
+    parser.add_argument("--warehouses", type=int, default=40)
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if db.query(models.StockMovement.id).first() is None:
+            started = time.perf_counter()
+            seed(db, args.rows, args.products, args.warehouses)
+            print(f"seeded in {time.perf_counter() - started:.1f}s")
+        print(f"ledger rows: {db.query(func.count(models.StockMovement.id)).scalar():,}")
+
+        statements = []
+        event.listen(async_engine.sync_engine, "before_cursor_execute", lambda *a: statements.append(a[2]))
+
+        async def time_stats(user) -> float:
+            async with AsyncSessionLocal() as async_db:
+                started = time.perf_counter()
+                await get_dashboard_stats(db=async_db, current_user=user)
+                return (time.perf_counter() - started) * 1000
+
+        for role in ROLES:
+            user = db.query(models.User).filter(models.User.username == f"bench_{role}").one()
+            timings = []
+            for _ in range(args.iterations):
+                stats_cache.clear()
+                statements.clear()
+                timings.append(asyncio.run(time_stats(user)))
+            print(
+                f"{role:>16}: median {statistics.median(timings):8.1f} ms"
+                f"  p95 {sorted(timings)[int(len(timings) * 0.95) - 1]:8.1f} ms"
+                f"  statements {len(statements)}"
+            )
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Benchmark POST /auth/login throughput under concurrent load.
+
+Seeds one user into DATABASE_URL, then fires --logins logins from --concurrency
+concurrent clients against the app in-process (httpx ASGI transport). Each
+hasher mode is run in turn: the threadpool (--workers 0, the old inline
+behaviour) and a process pool of each size given in --workers. While the storm
+runs, a second client polls GET /auth/me. Its latency shows how much the
+hashing starves unrelated requests.
+
+    cd backend
+    DATABASE_URL=sqlite:////tmp/bench_login.db API_SECRET_KEY=x python scalability/benchmark_login.py
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from app import models
+from app.core import security
+from app.core.password_hashing import PasswordHasher
+from app.api.endpoints import auth
+from app.database import Base, engine, SessionLocal
+from app.main import app
+
+USERNAME = "bench_login"
+PASSWORD = "Password1!"
+
+def seed() -> None:
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if not db.query(models.User).filter(models.User.username == USERNAME).first():
+            db.add(models.User(
+                username=USERNAME, email=f"{USERNAME}@example.com",
+                hashed_password=security.get_password_hash(PASSWORD), role="user"
+            ))
+            db.commit()
+    finally:
+        db.close()
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[max(int(len(ordered) * fraction) - 1, 0)]
+
+async def run(logins: int, concurrency: int) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        response = await client.post("/auth/login", data={"username": USERNAME, "password": PASSWORD})
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        remaining = iter(range(logins))
+        login_latencies, me_latencies, failures = [], [], 0
+        done = asyncio.Event()
+
+        async def login_worker():
+            nonlocal failures
+            for _ in remaining:
+                started = time.perf_counter()
+                response = await client.post("/auth/login", data={"username": USERNAME, "password": PASSWORD})
+                login_latencies.append(time.perf_counter() - started)
+                failures += response.status_code != 200
+
+        async def me_poller():
+            while not done.is_set():
+                started = time.perf_counter()
+                await client.get("/auth/me", headers=headers)
+                me_latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(0.01)
+
+        poller = asyncio.create_task(me_poller())
+        started = time.perf_counter()
+        await asyncio.gather(*(login_worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await poller
+
+    return {
+        "logins_per_second": logins / elapsed,
+        "login_p95_ms": percentile(login_latencies, 0.95) * 1000,
+        "me_median_ms": statistics.median(me_latencies) * 1000 if me_latencies else 0.0,
+        "me_p95_ms": percentile(me_latencies, 0.95) * 1000 if me_latencies else 0.0,
+        "failures": failures,
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 2, 4])
+    parser.add_argument("--max-pending", type=int, default=256)
+    args = parser.parse_args()
+
+    seed()
+    for workers in args.workers:
+        hasher = PasswordHasher(workers, args.max_pending)
+        auth.password_hasher = hasher
+        try:
+            result = asyncio.run(run(args.logins, args.concurrency))
+        finally:
+            hasher.shutdown()
+        mode = "threadpool" if workers == 0 else f"{workers} processes"
+        print(
+            f"{mode:>14}: {result['logins_per_second']:7.1f} logins/s"
+            f"  login p95 {result['login_p95_ms']:8.1f} ms"
+            f"  /auth/me median {result['me_median_ms']:7.1f} ms  p95 {result['me_p95_ms']:7.1f} ms"
+            f"  failures {result['failures']}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Microbenchmark autocomplete lookups against the in-memory prefix index.
+
+Fills a ProductPrefixIndex with --products synthetic products spread over
+--owners owners (no database needed) and times --lookups prefix searches.
+
+    cd backend
+    DATABASE_URL=sqlite:////tmp/bench_autocomplete.db API_SECRET_KEY=x python scalability/benchmark_product_autocomplete.py
+"""
+import argparse
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.product_autocomplete import ProductPrefixIndex
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--owners", type=int, default=50)
+    parser.add_argument("--lookups", type=int, default=10_000)
+    args = parser.parse_args()
+
+    index = ProductPrefixIndex()
+    started = time.perf_counter()
+    for i in range(args.products):
+        index.upsert(SimpleNamespace(
+            id=i, sku=f"SKU{i:06d}", name=f"Product {i} widget", owner_id=i % args.owners, is_active=True
+        ))
+    print(f"indexed {len(index)} products in {time.perf_counter() - started:.2f}s")
+
+    started = time.perf_counter()
+    for i in range(args.lookups):
+        index.search(f"sku0{i % 10}", owner_id=i % args.owners)
+    owner_ms = (time.perf_counter() - started) / args.lookups * 1000
+
+    started = time.perf_counter()
+    for i in range(args.lookups // 10):
+        index.search(f"sku0{i % 10}", all_owners=True)
+    all_owners_ms = (time.perf_counter() - started) / (args.lookups // 10) * 1000
+    print(f"per-owner lookup: {owner_ms:.4f} ms  all-owners lookup: {all_owners_ms:.4f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Benchmark concurrent reserve-and-approve throughput for outbound requests.
+
+Seeds one product with --stock units in one warehouse in DATABASE_URL, then
+runs --workers threads. Each thread reserves one unit, records the pending
+request, then consumes the reservation and applies the movement, the same
+path POST /stock-movements and its approval take. It reports approvals per
+second and checks that the balance never went negative.
+
+    cd backend
+    DATABASE_URL=sqlite:////tmp/bench_reservations.db API_SECRET_KEY=x python scalability/benchmark_reservations.py
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import delete
+
+from app import models
+from app.api.endpoints.stock_movements import build_stock_movements
+from app.crud.stock_crud import reserve_stock, consume_stock_reservation, apply_stock_movements
+from app.database import Base, engine, SessionLocal
+
+USERNAME = "bench_reservations"
+
+def seed(stock: int) -> tuple:
+    """Reset the benchmark product's stock. Returns (user_id, product_id, warehouse_id)."""
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        user = db.query(models.User).filter(models.User.username == USERNAME).first()
+        if user is None:
+            user = models.User(username=USERNAME, email=f"{USERNAME}@example.com", hashed_password="x", role="admin")
+            db.add(user)
+            db.flush()
+            db.add(models.Product(name="Bench product", sku="BENCHRES", price=1.0, owner_id=user.id))
+            db.add(models.Warehouse(name="Bench warehouse", location="Bench", owner_id=user.id))
+            db.flush()
+        product = db.query(models.Product).filter(models.Product.sku == "BENCHRES").one()
+        warehouse = db.query(models.Warehouse).filter(models.Warehouse.owner_id == user.id).first()
+        db.execute(delete(models.StockMovement).where(models.StockMovement.product_id == product.id))
+        db.execute(delete(models.StockMovementRequest).where(models.StockMovementRequest.product_id == product.id))
+        db.execute(delete(models.StockBalance).where(models.StockBalance.product_id == product.id))
+        db.add(models.StockBalance(product_id=product.id, warehouse_id=warehouse.id, quantity=stock))
+        db.commit()
+        return user.id, product.id, warehouse.id
+    finally:
+        db.close()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--stock", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=400)
+    args = parser.parse_args()
+
+    user_id, product_id, warehouse_id = seed(args.stock)
+    approved, observed, errors = [], [], []
+    start_barrier = threading.Barrier(args.workers)
+
+    def worker():
+        session = SessionLocal()
+        try:
+            start_barrier.wait()
+            if not reserve_stock(session, product_id, warehouse_id, 1):
+                session.rollback()
+                return
+            request = models.StockMovementRequest(
+                product_id=product_id, warehouse_id=warehouse_id, movement_type="out",
+                quantity=-1, user_id=user_id, status="pending"
+            )
+            session.add(request)
+            session.commit()
+
+            if not consume_stock_reservation(session, request):
+                session.rollback()
+                return
+            movements = build_stock_movements(request)
+            session.add_all(movements)
+            apply_stock_movements(session, [m for m in movements if m.quantity > 0])
+            request.status = "approved"
+            session.commit()
+            approved.append(request.id)
+            observed.append(session.query(models.StockBalance.quantity).filter(
+                models.StockBalance.product_id == product_id
+            ).scalar())
+        except Exception as e:
+            errors.append(e)
+            session.rollback()
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(args.workers)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    print(f"{len(approved)} approvals in {elapsed:.3f}s ({len(approved) / elapsed:.1f} approvals/s)")
+    print(f"lowest observed balance: {min(observed, default=0)}  errors: {len(errors)}")
+
+if __name__ == "__main__":
+    main()
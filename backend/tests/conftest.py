@@ -1,10 +1,21 @@
+import os
 import pytest
+
+# Hash passwords in the threadpool; spawning a process pool per test module only slows the suite
+os.environ.setdefault("PASSWORD_HASH_WORKERS", "0")
+
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from fastapi.testclient import TestClient
 from app.database import Base, get_db
+from app.async_database import get_async_db
 from app.main import app
 from app.config import settings
+from app.api.endpoints.dashboard import stats_cache
+from app.product_autocomplete import product_index
+from app.api.endpoints.auth import user_cache
+from app.core.security import token_cache
 
 # Use an in-memory SQLite database for testing
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
@@ -14,6 +25,10 @@ engine = create_engine(
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# The async endpoints read the same file through aiosqlite
+async_engine = create_async_engine("sqlite+aiosqlite:///./test.db")
+AsyncTestingSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
 Base.metadata.create_all(bind=engine)
 
 def override_get_db():
@@ -23,7 +38,12 @@ def override_get_db():
     finally:
         db.close()
 
+async def override_get_async_db():
+    async with AsyncTestingSessionLocal() as db:
+        yield db
+
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_async_db] = override_get_async_db
 
 @pytest.fixture(scope="module")
 def client():
@@ -41,6 +61,10 @@ def db():
         db.close()
         # Drop all tables after test
         Base.metadata.drop_all(bind=engine)
+        stats_cache.clear()
+        product_index.clear()
+        user_cache.clear()
+        token_cache.clear()
 
 @pytest.fixture(scope="function")
 def auth_client(client, db):
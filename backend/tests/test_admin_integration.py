@@ -71,3 +71,70 @@ def test_get_warehouse_user_usage(auth_client):
     data = response.json()
     assert data["warehouse_id"] == warehouse_id
     assert "users" in data
+
+def test_rebuild_stock_balances(auth_client, db):
+    from app import models
+    auth_client.post("/products", json={"name": "Test Product", "sku": "TEST001", "price": 10.0})
+    auth_client.post("/warehouses", json={"name": "Test Warehouse", "location": "Test Location"})
+    db.add_all([
+        models.StockMovement(product_id=1, warehouse_id=1, movement_type="in", quantity=7),
+        models.StockMovement(product_id=1, warehouse_id=1, movement_type="out", quantity=-2),
+    ])
+    db.commit()
+
+    response = auth_client.post("/admin/stock-balances/rebuild")
+    assert response.status_code == 200
+    assert response.json()["rows"] == 1
+    balance = db.query(models.StockBalance).one()
+    assert balance.quantity == 5
+
+def test_pool_stats(auth_client):
+    import asyncio
+    from app.database import SessionLocal
+    from app.async_database import AsyncSessionLocal
+    from sqlalchemy import text
+    session = SessionLocal()
+    try:
+        session.execute(text("SELECT 1"))
+        response = auth_client.get("/admin/pool-stats")
+    finally:
+        session.close()
+    assert response.status_code == 200
+    data = response.json()
+    assert data["sync"]["checked_out"] >= 1
+    assert data["sync"]["checkouts"] >= 1
+    assert data["sync"]["checkins"] >= 1
+    for key in ("pool_size", "overflow", "timeouts", "avg_hold_ms", "max_hold_ms"):
+        assert key in data["sync"]
+
+    async def read_async():
+        async with AsyncSessionLocal() as async_session:
+            await async_session.execute(text("SELECT 1"))
+    asyncio.run(read_async())
+    data = auth_client.get("/admin/pool-stats").json()
+    assert data["async"]["checkouts"] >= 1
+    assert data["async"]["checkins"] >= 1
+
+def test_admin_create_user(auth_client, client):
+    payload = {"username": "created", "email": "created@example.com", "password": "Password1!", "role": "user"}
+    response = auth_client.post("/admin/users", json=payload)
+    assert response.status_code == 200
+    assert response.json()["username"] == "created"
+    assert auth_client.post("/admin/users", json=payload).status_code == 400
+    assert client.post("/auth/login", data={"username": "created", "password": "Password1!"}).status_code == 200
+
+def test_admin_create_user_email_taken_while_hashing(auth_client, db, monkeypatch):
+    from app import models
+    from app.core.password_hashing import password_hasher
+    hash_password = password_hasher.hash
+
+    async def racing_hash(password):
+        db.add(models.User(username="someone", email="created@example.com", hashed_password="x", role="user"))
+        db.commit()
+        return await hash_password(password)
+
+    monkeypatch.setattr(password_hasher, "hash", racing_hash)
+    payload = {"username": "created", "email": "created@example.com", "password": "Password1!", "role": "user"}
+    response = auth_client.post("/admin/users", json=payload)
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Email already exists"
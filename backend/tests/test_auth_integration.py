@@ -49,6 +49,26 @@ def test_register_duplicate_email(client, db):
     assert response.status_code == 400
     assert "Email already exists" in response.json()["detail"]
 
+def test_register_duplicate_taken_while_hashing(client, db, monkeypatch):
+    from app.core.password_hashing import password_hasher
+    hash_password = password_hasher.hash
+
+    async def racing_hash(password):
+        # Another registration for the same username commits while this one hashes
+        db.add(models.User(username="testuser", email="other@example.com", hashed_password="x", role="user"))
+        db.commit()
+        return await hash_password(password)
+
+    monkeypatch.setattr(password_hasher, "hash", racing_hash)
+    response = client.post("/auth/register", json={
+        "username": "testuser",
+        "email": "test@example.com",
+        "password": "Password1!",
+        "role": "user"
+    })
+    assert response.status_code == 400
+    assert "Username already exists" in response.json()["detail"]
+
 def test_register_weak_password(client, db):
     response = client.post("/auth/register", json={
         "username": "testuser",
@@ -110,3 +130,44 @@ def test_get_me_authenticated(client, db):
     assert response.status_code == 200
     data = response.json()
     assert data["username"] == "testuser"
+
+def test_current_user_cached_and_invalidated_on_update(auth_client, db):
+    from sqlalchemy import event
+    auth_client.get("/auth/me")
+    statements = []
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(db.get_bind(), "before_cursor_execute", count_statement)
+    try:
+        assert auth_client.get("/auth/me").json()["username"] == "testuser"
+    finally:
+        event.remove(db.get_bind(), "before_cursor_execute", count_statement)
+    assert statements == []
+
+    # Updating through a cached user still persists, and the next request sees the change
+    response = auth_client.put("/auth/me", json={"location": "Berlin"})
+    assert response.status_code == 200
+    assert auth_client.get("/auth/me").json()["location"] == "Berlin"
+
+def test_admin_changes_invalidate_cached_user(auth_client, client):
+    client.post("/auth/register", json={
+        "username": "other", "email": "other@example.com", "password": "Password1!", "role": "user"
+    })
+    token = client.post("/auth/login", data={"username": "other", "password": "Password1!"}).json()["access_token"]
+    other_headers = {"Authorization": f"Bearer {token}"}
+    other = client.get("/auth/me", headers=other_headers).json()
+    assert other["role"] == "user"
+
+    auth_client.post(f"/admin/users/{other['id']}/toggle_role")
+    assert client.get("/auth/me", headers=other_headers).json()["role"] == "warehouse_owner"
+
+    auth_client.delete(f"/admin/users/{other['id']}")
+    assert client.get("/auth/me", headers=other_headers).status_code == 401
+
+def test_change_password(auth_client, client):
+    response = auth_client.post("/auth/change-password", json={"old_password": "wrong", "new_password": "Password2!"})
+    assert response.status_code == 400
+    response = auth_client.post("/auth/change-password", json={"old_password": "Password1!", "new_password": "Password2!"})
+    assert response.status_code == 200
+    assert client.post("/auth/login", data={"username": "testuser", "password": "Password1!"}).status_code == 401
+    assert client.post("/auth/login", data={"username": "testuser", "password": "Password2!"}).status_code == 200
@@ -31,3 +31,59 @@ def test_password_validation_no_special():
     with pytest.raises(ValidationError) as exc_info:
         UserCreate(username="test", email="test@example.com", password="Password1")
     assert "Password must contain at least one special character" in str(exc_info.value)
+
+def test_password_hasher_round_trip_in_process_pool():
+    import asyncio
+    from app.core.password_hashing import PasswordHasher
+    hasher = PasswordHasher(max_workers=1, max_pending=4)
+    try:
+        hashed = asyncio.run(hasher.hash("Password1!"))
+        assert asyncio.run(hasher.verify("Password1!", hashed))
+        assert not asyncio.run(hasher.verify("wrong", hashed))
+    finally:
+        hasher.shutdown()
+
+def test_password_hasher_rejects_when_queue_full():
+    import asyncio
+    from app.core.password_hashing import PasswordHasher, PasswordHasherBusy
+    hasher = PasswordHasher(max_workers=0, max_pending=2)
+
+    async def burst():
+        return await asyncio.gather(*(hasher.hash("Password1!") for _ in range(5)), return_exceptions=True)
+
+    results = asyncio.run(burst())
+    rejected = [r for r in results if isinstance(r, PasswordHasherBusy)]
+    assert len(rejected) == 3
+    assert rejected[0].status_code == 503
+    assert hasher.rejected == 3
+
+def test_decode_access_token_caches_verified_payloads():
+    from datetime import timedelta
+    from app.core import security
+    security.token_cache.clear()
+    token = security.create_access_token("42", expires_delta=timedelta(minutes=5), role="user")
+    before = security.token_cache.stats()
+    assert security.decode_access_token(token)["sub"] == "42"
+    assert security.decode_access_token(token)["sub"] == "42"
+    after = security.token_cache.stats()
+    assert (after["misses"] - before["misses"], after["hits"] - before["hits"]) == (1, 1)
+    # Invalid tokens are rejected and never cached
+    assert security.decode_access_token(token + "x") is None
+    assert security.token_cache.stats()["size"] == 1
+
+def test_decode_access_token_respects_expiry_and_key_rotation():
+    from datetime import timedelta
+    from app.core import security
+    original_key = security.SECRET_KEY
+    security.token_cache.clear()
+    expired = security.create_access_token("1", expires_delta=timedelta(seconds=-1))
+    assert security.decode_access_token(expired) is None
+    assert security.token_cache.stats()["size"] == 0
+
+    token = security.create_access_token("1", expires_delta=timedelta(minutes=5))
+    assert security.decode_access_token(token) is not None
+    try:
+        security.set_secret_key("rotated")
+        assert security.decode_access_token(token) is None
+    finally:
+        security.set_secret_key(original_key)
@@ -24,3 +24,107 @@ def test_get_dashboard(auth_client):
     assert "total_warehouses" in data
     assert "total_stock" in data
     assert "low_stock_products" in data
+
+def test_dashboard_trends_read_monthly_rollup(auth_client, db):
+    from datetime import datetime
+    from app import models
+    auth_client.post("/products", json={"name": "Test Product", "sku": "TEST001", "price": 10.0})
+    auth_client.post("/warehouses", json={"name": "Test Warehouse", "location": "Test Location"})
+    for quantity in (10, 5):
+        request_id = auth_client.post("/stock-movements", json={
+            "product_id": 1,
+            "warehouse_id": 1,
+            "movement_type": "in",
+            "quantity": quantity
+        }).json()["request_id"]
+        response = auth_client.post(f"/stock-movements/requests/{request_id}/approve", json={"action": "approve"})
+        assert response.status_code == 200
+
+    rollup = db.query(models.StockMovementMonthlyRollup).one()
+    assert rollup.quantity == 15
+    assert rollup.movement_count == 2
+
+    data = auth_client.get("/dashboard/stats").json()
+    month = datetime.utcnow().strftime('%Y-%m')
+    assert data["stock_movements_trend"] == [{"month": month, "total_quantity": 15}]
+    assert data["stock_value_trend"] == [{"month": month, "total_value": 150.0}]
+
+def test_dashboard_stats_cache_invalidated_by_writes(auth_client):
+    auth_client.post("/products", json={"name": "Test Product", "sku": "TEST001", "price": 10.0})
+    before = auth_client.get("/admin/cache-stats").json()["dashboard_stats"]
+
+    assert auth_client.get("/dashboard/stats").json()["total_products"] == 1
+    assert auth_client.get("/dashboard/stats").json()["total_products"] == 1
+    after = auth_client.get("/admin/cache-stats").json()["dashboard_stats"]
+    assert after["misses"] == before["misses"] + 1
+    assert after["hits"] == before["hits"] + 1
+
+    # Creating a product in the user's scope drops the cached payload
+    auth_client.post("/products", json={"name": "Second Product", "sku": "TEST002", "price": 5.0})
+    assert auth_client.get("/dashboard/stats").json()["total_products"] == 2
+    auth_client.post("/warehouses", json={"name": "Test Warehouse", "location": "Test Location"})
+    assert auth_client.get("/dashboard/stats").json()["total_warehouses"] == 1
+
+def test_dashboard_stats_single_round_trip(auth_client, db):
+    from sqlalchemy import event
+    from tests.conftest import async_engine
+    from app import models
+    for i, price in enumerate([10.0, 2.0], start=1):
+        auth_client.post("/products", json={"name": f"Product {i}", "sku": f"TEST00{i}", "price": price})
+    for i in range(1, 3):
+        auth_client.post("/warehouses", json={"name": f"Warehouse {i}", "location": "Test Location"})
+    db.add_all([
+        models.StockBalance(product_id=1, warehouse_id=1, quantity=5),
+        models.StockBalance(product_id=1, warehouse_id=2, quantity=5),
+        models.StockBalance(product_id=2, warehouse_id=1, quantity=100),
+    ])
+    db.commit()
+
+    statements = []
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(async_engine.sync_engine, "before_cursor_execute", count_statement)
+    try:
+        data = auth_client.get("/dashboard/stats").json()
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", count_statement)
+
+    # The user comes from the cache filled by earlier requests, leaving a single stats query
+    assert len(statements) == 1
+    assert data["total_products"] == 2
+    assert data["total_warehouses"] == 2
+    assert data["total_stock"] == 110
+    assert data["low_stock_products"] == [{"id": "1", "name": "Product 1", "current_stock": 10, "threshold": 20}]
+    assert data["stock_by_warehouse"] == [
+        {"warehouse_name": "Warehouse 1", "total_stock": 105},
+        {"warehouse_name": "Warehouse 2", "total_stock": 5},
+    ]
+    assert [p["id"] for p in data["top_products_by_value"]] == ["2", "1"]
+    assert data["top_products_by_value"][0]["total_value"] == 200.0
+
+def test_movement_rollups_key_on_utc_month_of_created_at(auth_client, db):
+    from datetime import datetime, timedelta, timezone
+    from app import models
+    from app.crud.stock_crud import month_key, record_movement_rollups, rebuild_movement_rollups
+    auth_client.post("/products", json={"name": "Test Product", "sku": "TEST001", "price": 10.0})
+    auth_client.post("/warehouses", json={"name": "Test Warehouse", "location": "Test Location"})
+    # 23:30 on Jan 31 at UTC-5 is already February in UTC
+    late_january = datetime(2024, 1, 31, 23, 30, tzinfo=timezone(timedelta(hours=-5)))
+    assert month_key(late_january) == "2024-02"
+    late_january = late_january.astimezone(timezone.utc)
+    movements = [
+        models.StockMovement(product_id=1, warehouse_id=1, user_id=1, movement_type="in", quantity=4, created_at=late_january),
+        models.StockMovement(product_id=1, warehouse_id=1, user_id=1, movement_type="in", quantity=6, created_at=late_january),
+    ]
+    db.add_all(movements)
+    record_movement_rollups(db, movements[:1])
+    record_movement_rollups(db, movements[1:])
+    db.commit()
+
+    rollup = db.query(models.StockMovementMonthlyRollup).one()
+    assert (rollup.month, rollup.quantity, rollup.movement_count) == ("2024-02", 10, 2)
+
+    rebuild_movement_rollups(db)
+    db.commit()
+    rollup = db.query(models.StockMovementMonthlyRollup).one()
+    assert (rollup.month, rollup.quantity, rollup.movement_count) == ("2024-02", 10, 2)
@@ -0,0 +1,19 @@
+import numpy as np
+
+from app.fulfillment import allocate
+
+def test_allocate_prefers_single_source_over_nearer_split():
+    needed = np.array([5, 5])
+    available = np.array([[5, 0, 5], [0, 5, 5]])
+    distances = np.array([1.0, 1.0, 100.0])
+    allocations, shortfall = allocate(needed, available, distances)
+    assert allocations == [(0, 2, 5), (1, 2, 5)]
+    assert not shortfall.any()
+
+def test_allocate_breaks_ties_by_distance_and_reports_shortfall():
+    needed = np.array([8])
+    available = np.array([[3, 3, 1]])
+    distances = np.array([50.0, 10.0, np.nan])
+    allocations, shortfall = allocate(needed, available, distances)
+    assert allocations == [(0, 1, 3), (0, 0, 3), (0, 2, 1)]
+    assert shortfall.tolist() == [1]
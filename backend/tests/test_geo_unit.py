@@ -0,0 +1,24 @@
+import numpy as np
+
+from app.geo import geohash_encode, covering_prefixes, haversine_km
+
+def test_geohash_encode_matches_reference():
+    assert geohash_encode(57.64911, 10.40744, 11) == "u4pruydqqvj"
+
+def test_covering_prefixes_contain_points_within_radius():
+    rng = np.random.default_rng(7)
+    for latitude, longitude in ((48.85, 2.35), (-33.86, 151.2), (0.0, 179.99), (64.1, -21.9)):
+        prefixes = covering_prefixes(latitude, longitude, 25)
+        for bearing, distance in zip(rng.uniform(0, 2 * np.pi, 50), rng.uniform(0, 25, 50)):
+            point_lat = latitude + np.degrees(distance * np.cos(bearing) / 6371.0088)
+            point_lon = longitude + np.degrees(distance * np.sin(bearing) / 6371.0088 / np.cos(np.radians(point_lat)))
+            point_lon = (point_lon + 180) % 360 - 180
+            if haversine_km(latitude, longitude, np.array([point_lat]), np.array([point_lon]))[0] > 25:
+                continue
+            point_hash = geohash_encode(point_lat, point_lon)
+            assert any(point_hash.startswith(prefix) for prefix in prefixes)
+
+def test_haversine_is_vectorized():
+    distances = haversine_km(48.8566, 2.3522, np.array([48.8566, 51.5074]), np.array([2.3522, -0.1278]))
+    assert distances[0] == 0
+    assert 340 < distances[1] < 350
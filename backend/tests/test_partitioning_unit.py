@@ -0,0 +1,38 @@
+from datetime import date
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateTable
+
+from app import models
+from app.partitioning import add_months, partition_name, partition_ddl, split_default_partition_ddl, ensure_stock_movement_partitions
+
+def test_add_months_rolls_over_year():
+    assert add_months(date(2024, 11, 1), 1) == date(2024, 12, 1)
+    assert add_months(date(2024, 12, 1), 1) == date(2025, 1, 1)
+    assert add_months(date(2024, 1, 1), -1) == date(2023, 12, 1)
+
+def test_partition_ddl_covers_one_month():
+    assert partition_name(date(2024, 2, 15)) == "stock_movements_p2024_02"
+    ddl = partition_ddl(date(2024, 2, 15))
+    assert "stock_movements_p2024_02 PARTITION OF stock_movements" in ddl
+    assert "FROM ('2024-02-01 00:00:00+00') TO ('2024-03-01 00:00:00+00')" in ddl
+
+def test_ensure_partitions_is_noop_on_sqlite():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        assert ensure_stock_movement_partitions(conn) == []
+
+def test_split_default_partition_moves_the_month_out_before_reattaching():
+    statements = split_default_partition_ddl(date(2024, 12, 5))
+    assert statements[0] == "ALTER TABLE stock_movements DETACH PARTITION stock_movements_default"
+    assert statements[1] == partition_ddl(date(2024, 12, 1))
+    month = "created_at >= '2024-12-01 00:00:00+00' AND created_at < '2025-01-01 00:00:00+00'"
+    assert statements[2].startswith("INSERT INTO stock_movements (") and statements[2].endswith(f"FROM stock_movements_default WHERE {month}")
+    assert statements[3] == f"DELETE FROM stock_movements_default WHERE {month}"
+    assert statements[4] == "ALTER TABLE stock_movements ATTACH PARTITION stock_movements_default DEFAULT"
+
+def test_stock_movement_primary_key_matches_partitioned_table():
+    assert [c.name for c in models.StockMovement.__table__.primary_key] == ["id", "created_at"]
+    assert "PRIMARY KEY (id, created_at)" in str(CreateTable(models.StockMovement.__table__).compile(dialect=postgresql.dialect()))
+    # SQLite keeps a single INTEGER PRIMARY KEY so it still assigns ids
+    assert "PRIMARY KEY (id)" in str(CreateTable(models.StockMovement.__table__).compile(create_engine("sqlite://")))
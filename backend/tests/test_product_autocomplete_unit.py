@@ -0,0 +1,50 @@
+import time
+from types import SimpleNamespace
+from app.product_autocomplete import ProductPrefixIndex, index_keys
+
+def make_product(id, sku, name, owner_id=1, is_active=True):
+    return SimpleNamespace(id=id, sku=sku, name=name, owner_id=owner_id, is_active=is_active)
+
+def test_index_keys_cover_sku_name_and_word_suffixes():
+    assert index_keys("AB-1", "Blue  Widget") == {"ab-1", "blue  widget", "widget"}
+
+def test_search_matches_prefixes_per_owner():
+    index = ProductPrefixIndex()
+    index.upsert(make_product(1, "WID-001", "Widget"))
+    index.upsert(make_product(2, "HLD-001", "Blue widget holder"))
+    index.upsert(make_product(3, "WID-002", "Widget", owner_id=2))
+
+    assert [p["id"] for p in index.search("wid", owner_id=1)] == [1, 2]
+    assert [p["id"] for p in index.search("WID-0", owner_id=2)] == [3]
+    assert [p["id"] for p in index.search("wid", all_owners=True)] == [1, 3, 2]
+    assert index.search("wid", owner_id=1, limit=1) == [{"id": 1, "sku": "WID-001", "name": "Widget"}]
+    assert index.search("zzz", owner_id=1) == []
+
+def test_upsert_and_remove_patch_the_index():
+    index = ProductPrefixIndex()
+    index.upsert(make_product(1, "WID-001", "Widget"))
+    index.upsert(make_product(1, "GAD-001", "Gadget"))
+    assert index.search("wid", owner_id=1) == []
+    assert [p["id"] for p in index.search("gad", owner_id=1)] == [1]
+
+    index.upsert(make_product(1, "GAD-001", "Gadget", is_active=False))
+    assert index.search("gad", owner_id=1) == []
+    assert [p["id"] for p in index.search("gad", owner_id=1, include_inactive=True)] == [1]
+
+    index.remove(1)
+    assert index.search("gad", owner_id=1, include_inactive=True) == []
+    assert len(index) == 0
+
+def test_index_expires_after_max_age():
+    index = ProductPrefixIndex(max_age_seconds=60)
+    assert index.is_stale()
+    index.built_at = time.monotonic()
+    assert not index.is_stale()
+    index.built_at -= 61
+    assert index.is_stale()
+
+    never_expires = ProductPrefixIndex()
+    never_expires.built_at = time.monotonic() - 10_000
+    assert not never_expires.is_stale()
+    never_expires.clear()
+    assert never_expires.is_stale()
@@ -40,6 +40,37 @@ def test_list_products_pagination(auth_client):
     assert data["pagination"]["total"] == 5
     assert data["pagination"]["page"] == 1
 
+def test_list_products_total_in_single_statement(auth_client, db):
+    from sqlalchemy import event
+    from tests.conftest import async_engine
+    for i in range(5):
+        auth_client.post("/products", json={"name": f"Product {i}", "sku": f"SKU{i:03d}", "price": 10.0})
+
+    statements = []
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(async_engine.sync_engine, "before_cursor_execute", count_statement)
+    try:
+        data = auth_client.get("/products?page=2&page_size=2").json()
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", count_statement)
+
+    # The user comes from the cache, leaving one page query carrying COUNT(*) OVER()
+    assert len(statements) == 1
+    assert len(data["data"]) == 2
+    assert data["pagination"]["total"] == 5
+    assert data["pagination"]["total_pages"] == 3
+
+    # Past the last page the total still comes back
+    data = auth_client.get("/products?page=9&page_size=2").json()
+    assert data["data"] == []
+    assert data["pagination"]["total"] == 5
+
+    # SQLite has no planner estimates, so the exact total is used
+    data = auth_client.get("/products?page=1&page_size=2&estimate_total=true").json()
+    assert data["pagination"]["total"] == 5
+    assert data["pagination"]["total_is_estimate"] is False
+
 def test_list_products_search(auth_client):
     auth_client.post("/products", json={
         "name": "Apple",
@@ -85,6 +116,38 @@ def test_get_product_details(auth_client):
     data = response.json()
     assert data["name"] == "Test Product"
 
+def test_product_details_ledger_preview_and_pages(auth_client, db):
+    from app import models
+    auth_client.post("/products", json={"name": "Test Product", "sku": "TEST001", "price": 10.0})
+    auth_client.post("/warehouses", json={"name": "Warehouse A", "location": "Location A"})
+    auth_client.post("/warehouses", json={"name": "Warehouse B", "location": "Location B"})
+    response = auth_client.post("/stock-movements", json={"product_id": 1, "warehouse_id": 1, "movement_type": "in", "quantity": 10})
+    auth_client.post(f"/stock-movements/requests/{response.json()['request_id']}/approve", json={"action": "approve"})
+    # Each approved transfer writes two ledger rows within the same second
+    for _ in range(2):
+        response = auth_client.post("/stock-movements/transfers", json={
+            "product_id": 1, "from_warehouse_id": 1, "to_warehouse_id": 2, "quantity": 1
+        })
+        auth_client.post(f"/stock-movements/requests/{response.json()['request_id']}/approve", json={"action": "approve"})
+    expected = [m.id for m in db.query(models.StockMovement).order_by(
+        models.StockMovement.created_at.desc(), models.StockMovement.id.desc()
+    )]
+    assert len(expected) == 5
+
+    data = auth_client.get("/products/1?ledger_limit=2").json()
+    assert [m["id"] for m in data["ledger_history"]] == expected[:2]
+    cursor = data["ledger_next_cursor"]
+
+    seen = []
+    while cursor and len(seen) <= len(expected):
+        page = auth_client.get("/products/1/ledger", params={"page_size": 1, "cursor": cursor}).json()
+        seen.extend(m["id"] for m in page["data"])
+        cursor = page["pagination"]["next_cursor"]
+    assert seen == expected[2:]
+
+    assert auth_client.get("/products/1/ledger?cursor=bogus").status_code == 400
+    assert auth_client.get("/products/99/ledger").status_code == 404
+
 def test_update_product(auth_client):
     auth_client.post("/products", json={
         "name": "Test Product",
@@ -111,3 +174,107 @@ def test_delete_product(auth_client):
     # Check if deleted
     response = auth_client.get("/products/1")
     assert response.status_code == 404
+
+def test_list_products_search_ranks_by_relevance(auth_client):
+    for name, sku in [("Blue widget holder", "HLD001"), ("Widget", "WID001"), ("Gadget", "GAD001")]:
+        auth_client.post("/products", json={"name": name, "sku": sku, "price": 1.0})
+    # Renames are picked up by the search index
+    auth_client.put("/products/3", json={"name": "Widget stand", "sku": "GAD001", "price": 1.0})
+
+    data = auth_client.get("/products?search=widget").json()
+    assert [p["name"] for p in data["data"]] == ["Widget", "Widget stand", "Blue widget holder"]
+    assert data["pagination"]["total"] == 3
+
+    # SKU substrings match too
+    data = auth_client.get("/products?search=ld00").json()
+    assert [p["name"] for p in data["data"]] == ["Blue widget holder"]
+
+    # Terms too short for the trigram index fall back to a substring scan
+    data = auth_client.get("/products?search=wi&sort_by=name_asc").json()
+    assert [p["name"] for p in data["data"]] == ["Blue widget holder", "Widget", "Widget stand"]
+
+    auth_client.delete("/products/2")
+    data = auth_client.get("/products?search=widget").json()
+    assert [p["name"] for p in data["data"]] == ["Widget stand", "Blue widget holder"]
+
+def test_autocomplete_products(auth_client):
+    auth_client.post("/products", json={"name": "Widget", "sku": "WID001", "price": 1.0})
+    auth_client.post("/products", json={"name": "Blue widget holder", "sku": "HLD001", "price": 1.0})
+    auth_client.post("/products", json={"name": "Gadget", "sku": "GAD001", "price": 1.0})
+
+    response = auth_client.get("/products/autocomplete?q=wid")
+    assert response.status_code == 200
+    assert [p["sku"] for p in response.json()] == ["WID001", "HLD001"]
+
+    # Updates and deletes patch the index
+    auth_client.put("/products/3", json={"name": "Gadget", "sku": "WID002", "price": 1.0})
+    auth_client.delete("/products/2")
+    assert [p["sku"] for p in auth_client.get("/products/autocomplete?q=WID").json()] == ["WID001", "WID002"]
+    assert auth_client.get("/products/autocomplete?q=wid&limit=1").json() == [{"id": 1, "sku": "WID001", "name": "Widget"}]
+
+def test_autocomplete_index_picks_up_other_workers_writes_after_max_age(auth_client, db):
+    from app import models
+    from app.product_autocomplete import product_index
+    auth_client.post("/products", json={"name": "Widget", "sku": "WID001", "price": 1.0})
+    assert [p["sku"] for p in auth_client.get("/products/autocomplete?q=wid").json()] == ["WID001"]
+
+    # Written by another worker: this process's index is not patched
+    db.add(models.Product(name="Widget stand", sku="WID002", price=1.0, owner_id=1))
+    db.commit()
+    assert [p["sku"] for p in auth_client.get("/products/autocomplete?q=wid").json()] == ["WID001"]
+
+    product_index.built_at -= product_index.max_age_seconds
+    assert [p["sku"] for p in auth_client.get("/products/autocomplete?q=wid").json()] == ["WID001", "WID002"]
+
+def test_bulk_import_products_reports_conflicts_per_row(auth_client):
+    auth_client.post("/products", json={"name": "Existing", "sku": "EX001", "price": 1.0})
+    response = auth_client.post("/products/bulk", json={"products": [
+        {"name": "New A", "sku": "NA001", "price": 2.5},
+        {"name": "New B", "sku": "EX001"},
+        {"name": "Existing", "sku": "NB001"},
+        {"name": "New C", "sku": "NA001"},
+        {"name": "New A", "sku": "NC001"},
+        {"name": "", "sku": "ND001"},
+    ]})
+    assert response.status_code == 201
+    data = response.json()
+    assert data["imported"] == 1
+    assert data["errors"] == [
+        {"line": 2, "detail": "A product with this SKU already exists."},
+        {"line": 3, "detail": "A product with this name already exists."},
+        {"line": 4, "detail": "Duplicate SKU in import (line 1)."},
+        {"line": 5, "detail": "Duplicate name in import (line 1)."},
+        {"line": 6, "detail": "Name and SKU are required."},
+    ]
+    products = auth_client.get("/products?sort_by=name_asc").json()["data"]
+    assert [(p["name"], p["price"]) for p in products] == [("Existing", 1.0), ("New A", 2.5)]
+    # Imported products are searchable through autocomplete right away
+    assert [p["sku"] for p in auth_client.get("/products/autocomplete?q=NA").json()] == ["NA001"]
+
+def test_bulk_import_products_csv(auth_client):
+    content = "name,sku,price,description\nWidget,WID001,3.5,Small widget\nGadget,GAD001,abc,\n"
+    response = auth_client.post("/products/bulk/csv", files={"file": ("products.csv", content, "text/csv")})
+    assert response.status_code == 201
+    data = response.json()
+    assert data["imported"] == 1
+    assert data["failed"] == 1
+    assert data["errors"][0]["line"] == 3
+    assert "price" in data["errors"][0]["detail"]
+
+def test_bulk_import_products_large_batch_uses_few_statements(auth_client, db):
+    from sqlalchemy import event
+    rows = [{"name": f"Product {i}", "sku": f"SKU{i:06d}", "price": 1.0} for i in range(20000)]
+
+    statements = []
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(db.get_bind(), "before_cursor_execute", count_statement)
+    try:
+        response = auth_client.post("/products/bulk", json={"products": rows})
+    finally:
+        event.remove(db.get_bind(), "before_cursor_execute", count_statement)
+
+    assert response.json()["imported"] == 20000
+    # User lookup, conflict check, four insert batches and reading back the new ids
+    assert len(statements) <= 8
+    assert auth_client.get("/products?page_size=1").json()["pagination"]["total"] == 20000
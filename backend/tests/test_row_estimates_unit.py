@@ -0,0 +1,20 @@
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql
+
+from app import models
+from app.row_estimates import count_estimate
+
+def test_count_estimate_runs_once_per_statement():
+    page = select(models.Product.id).where(models.Product.name.ilike("%bolt%"))
+    query = page.add_columns(count_estimate(page).label("total_count")).limit(20)
+    sql = str(query.compile(dialect=postgresql.dialect()))
+    # A scalar subquery in the select list, which PostgreSQL evaluates once as an InitPlan
+    assert "(SELECT count_estimate(" in sql
+
+def test_count_estimate_keeps_like_wildcards_intact():
+    page = select(models.Product.id).where(models.Product.name.ilike("%bolt%"), models.Product.sku.like("A_%"))
+    compiled = select(count_estimate(page)).compile(dialect=postgresql.dialect())
+    explained = next(value for value in compiled.params.values() if isinstance(value, str))
+    assert "'%bolt%'" in explained
+    assert "'A_%'" in explained
+    assert "%%" not in explained
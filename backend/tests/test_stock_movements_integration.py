@@ -70,3 +70,400 @@ def test_record_negative_stock_movement(auth_client):
         "quantity": 5
     })
     assert response.status_code == 201
+
+def test_approve_request_updates_stock_balance(auth_client, db):
+    auth_client.post("/products", json={
+        "name": "Test Product",
+        "sku": "TEST001",
+        "price": 10.0
+    })
+    auth_client.post("/warehouses", json={
+        "name": "Warehouse A",
+        "location": "Location A"
+    })
+    auth_client.post("/warehouses", json={
+        "name": "Warehouse B",
+        "location": "Location B"
+    })
+    response = auth_client.post("/stock-movements", json={
+        "product_id": 1,
+        "warehouse_id": 1,
+        "movement_type": "in",
+        "quantity": 10
+    })
+    request_id = response.json()["request_id"]
+    response = auth_client.post(f"/stock-movements/requests/{request_id}/approve", json={"action": "approve"})
+    assert response.status_code == 200
+
+    response = auth_client.post("/stock-movements/transfers", json={
+        "product_id": 1,
+        "from_warehouse_id": 1,
+        "to_warehouse_id": 2,
+        "quantity": 4
+    })
+    request_id = response.json()["request_id"]
+    auth_client.post(f"/stock-movements/requests/{request_id}/approve", json={"action": "approve"})
+
+    from app import models
+    balances = {b.warehouse_id: b.quantity for b in db.query(models.StockBalance).all()}
+    assert balances == {1: 6, 2: 4}
+
+    data = auth_client.get("/stock-movements/stock/1").json()
+    assert data["total_stock"] == 10
+    assert data["stock_distribution"]["1"]["stock"] == 6
+
+def test_stock_as_of_uses_snapshot_and_later_movements(auth_client, db):
+    from datetime import datetime
+    from app import models
+    auth_client.post("/products", json={
+        "name": "Test Product",
+        "sku": "TEST001",
+        "price": 10.0
+    })
+    auth_client.post("/warehouses", json={
+        "name": "Test Warehouse",
+        "location": "Test Location"
+    })
+    db.add_all([
+        models.StockMovement(product_id=1, warehouse_id=1, movement_type="in", quantity=10, created_at=datetime(2024, 1, 1, 12)),
+        models.StockMovement(product_id=1, warehouse_id=1, movement_type="out", quantity=-3, created_at=datetime(2024, 1, 2, 12)),
+        models.StockMovement(product_id=1, warehouse_id=1, movement_type="in", quantity=5, created_at=datetime(2024, 1, 3, 12)),
+    ])
+    db.commit()
+
+    response = auth_client.post("/admin/stock-snapshots", params={"snapshot_at": "2024-01-02T00:00:00"})
+    assert response.status_code == 200
+    assert response.json()["rows"] == 1
+    auth_client.post("/admin/stock-snapshots", params={"snapshot_at": "2024-01-03T00:00:00"})
+    snapshot = db.query(models.StockSnapshot).filter(models.StockSnapshot.snapshot_at == datetime(2024, 1, 3)).one()
+    assert snapshot.quantity == 7
+
+    for at, expected in [("2023-12-31T00:00:00", 0), ("2024-01-01T13:00:00", 10), ("2024-01-02T13:00:00", 7), ("2024-01-04T00:00:00", 12)]:
+        data = auth_client.get("/stock-movements/stock/1/as-of", params={"at": at}).json()
+        assert data["total_stock"] == expected
+
+def test_stock_snapshot_accepts_timezone_aware_times(auth_client, db):
+    from datetime import datetime
+    from app import models
+    auth_client.post("/products", json={
+        "name": "Test Product",
+        "sku": "TEST001",
+        "price": 10.0
+    })
+    auth_client.post("/warehouses", json={
+        "name": "Test Warehouse",
+        "location": "Test Location"
+    })
+    db.add(models.StockMovement(product_id=1, warehouse_id=1, movement_type="in", quantity=10, created_at=datetime(2024, 1, 1, 12)))
+    db.commit()
+
+    response = auth_client.post("/admin/stock-snapshots", params={"snapshot_at": "2024-01-02T00:00:00Z"})
+    assert response.status_code == 200
+    assert response.json()["rows"] == 1
+    # +02:00 is 22:00 UTC the day before, i.e. after the first snapshot
+    response = auth_client.post("/admin/stock-snapshots", params={"snapshot_at": "2024-01-03T00:00:00+02:00"})
+    assert response.status_code == 200
+    snapshot_times = {s.snapshot_at.replace(tzinfo=None) for s in db.query(models.StockSnapshot).all()}
+    assert snapshot_times == {datetime(2024, 1, 2), datetime(2024, 1, 2, 22)}
+
+    response = auth_client.post("/admin/stock-snapshots", params={"snapshot_at": "2999-01-01T00:00:00Z"})
+    assert response.status_code == 400
+
+    data = auth_client.get("/stock-movements/stock/1/as-of", params={"at": "2024-01-01T13:00:00+02:00"}).json()
+    assert data["total_stock"] == 0
+    data = auth_client.get("/stock-movements/stock/1/as-of", params={"at": "2024-01-01T13:00:00Z"}).json()
+    assert data["total_stock"] == 10
+
+def test_stock_distribution_query_count_is_constant(auth_client, db):
+    from sqlalchemy import event
+    from tests.conftest import async_engine
+    from app import models
+    auth_client.post("/products", json={
+        "name": "Test Product",
+        "sku": "TEST001",
+        "price": 10.0
+    })
+    for i in range(1, 6):
+        auth_client.post("/warehouses", json={"name": f"Warehouse {i}", "location": "Test Location"})
+        db.add(models.StockBalance(product_id=1, warehouse_id=i, quantity=i))
+    db.commit()
+
+    statements = []
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(async_engine.sync_engine, "before_cursor_execute", count_statement)
+    try:
+        response = auth_client.get("/stock-movements/stock/1")
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", count_statement)
+
+    data = response.json()
+    assert data["total_stock"] == 15
+    assert len(data["stock_distribution"]) == 5
+    # Product lookup and a single stock query; the user comes from the cache
+    assert len(statements) == 2
+
+def test_bulk_approve_requests(auth_client, db):
+    from app import models
+    auth_client.post("/products", json={
+        "name": "Test Product",
+        "sku": "TEST001",
+        "price": 10.0
+    })
+    auth_client.post("/warehouses", json={
+        "name": "Test Warehouse",
+        "location": "Test Location"
+    })
+    request_ids = []
+    for quantity in (3, 4, 5):
+        response = auth_client.post("/stock-movements", json={
+            "product_id": 1,
+            "warehouse_id": 1,
+            "movement_type": "in",
+            "quantity": quantity
+        })
+        request_ids.append(response.json()["request_id"])
+
+    response = auth_client.post("/stock-movements/requests/bulk-approve", json={"items": [
+        {"request_id": request_ids[0], "action": "approve"},
+        {"request_id": request_ids[1], "action": "approve"},
+        {"request_id": request_ids[2], "action": "reject", "reason": "Damaged"},
+        {"request_id": request_ids[0], "action": "approve"},
+        {"request_id": 999, "action": "approve"},
+    ]})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["processed"] == 3
+    assert data["failed"] == 2
+    assert [r["status"] for r in data["results"]] == ["approved", "approved", "rejected", "error", "error"]
+
+    assert db.query(models.StockMovement).count() == 2
+    assert db.query(models.StockBalance).one().quantity == 7
+
+def test_bulk_stock_movement_requests(auth_client, db):
+    from app import models
+    auth_client.post("/products", json={
+        "name": "Test Product",
+        "sku": "TEST001",
+        "price": 10.0
+    })
+    auth_client.post("/warehouses", json={
+        "name": "Test Warehouse",
+        "location": "Test Location"
+    })
+    db.add(models.StockBalance(product_id=1, warehouse_id=1, quantity=5))
+    db.commit()
+
+    response = auth_client.post("/stock-movements/bulk", json={"movements": [
+        {"product_id": 1, "warehouse_id": 1, "movement_type": "in", "quantity": 10},
+        {"product_id": 1, "warehouse_id": 1, "movement_type": "out", "quantity": 4},
+        {"product_id": 1, "warehouse_id": 1, "movement_type": "out", "quantity": 4},
+        {"product_id": 2, "warehouse_id": 1, "movement_type": "in", "quantity": 1},
+    ]})
+    assert response.status_code == 201
+    data = response.json()
+    assert data["submitted"] == 2
+    assert [r["status"] for r in data["results"]] == ["submitted", "submitted", "error", "error"]
+    assert data["results"][2]["detail"].startswith("Insufficient stock")
+
+    requests = db.query(models.StockMovementRequest).order_by(models.StockMovementRequest.id).all()
+    assert [r.quantity for r in requests] == [10, -4]
+    assert [r.id for r in requests] == [data["results"][0]["request_id"], data["results"][1]["request_id"]]
+
+def test_bulk_stock_movement_requests_csv(auth_client, db):
+    from app import models
+    auth_client.post("/products", json={
+        "name": "Test Product",
+        "sku": "TEST001",
+        "price": 10.0
+    })
+    auth_client.post("/warehouses", json={
+        "name": "Test Warehouse",
+        "location": "Test Location"
+    })
+    content = "product_id,warehouse_id,movement_type,quantity,notes\n1,1,in,3,pallet A\n1,1,in,abc,\n"
+    response = auth_client.post(
+        "/stock-movements/bulk/csv",
+        files={"file": ("movements.csv", content, "text/csv")}
+    )
+    assert response.status_code == 201
+    data = response.json()
+    assert data["submitted"] == 1
+    assert data["results"][1]["line"] == 3
+    assert data["results"][1]["status"] == "error"
+    assert db.query(models.StockMovementRequest).one().notes == "pallet A"
+
+def approve_transfers(auth_client, count):
+    """Stock warehouse 1 and approve `count` transfers to warehouse 2; ledger rows land within the same second."""
+    auth_client.post("/products", json={
+        "name": "Test Product",
+        "sku": "TEST001",
+        "price": 10.0
+    })
+    auth_client.post("/warehouses", json={"name": "Warehouse A", "location": "Location A"})
+    auth_client.post("/warehouses", json={"name": "Warehouse B", "location": "Location B"})
+    response = auth_client.post("/stock-movements", json={
+        "product_id": 1,
+        "warehouse_id": 1,
+        "movement_type": "in",
+        "quantity": 10
+    })
+    auth_client.post(f"/stock-movements/requests/{response.json()['request_id']}/approve", json={"action": "approve"})
+    for _ in range(count):
+        response = auth_client.post("/stock-movements/transfers", json={
+            "product_id": 1,
+            "from_warehouse_id": 1,
+            "to_warehouse_id": 2,
+            "quantity": 1
+        })
+        auth_client.post(f"/stock-movements/requests/{response.json()['request_id']}/approve", json={"action": "approve"})
+
+def test_list_stock_movements_keyset_pagination(auth_client, db):
+    from app import models
+    # Each approved transfer writes two ledger rows in one transaction
+    approve_transfers(auth_client, 2)
+    expected = [m.id for m in db.query(models.StockMovement).order_by(
+        models.StockMovement.created_at.desc(), models.StockMovement.id.desc()
+    )]
+    assert len(expected) == 5
+
+    for page_size in (1, 2):
+        seen = []
+        cursor = None
+        while len(seen) <= len(expected):
+            params = {"page_size": page_size}
+            if cursor:
+                params["cursor"] = cursor
+            data = auth_client.get("/stock-movements", params=params).json()
+            seen.extend(m["id"] for m in data["data"])
+            cursor = data["pagination"]["next_cursor"]
+            if not cursor:
+                break
+        assert seen == expected
+
+    response = auth_client.get("/stock-movements", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+def test_list_stock_movements_date_filters(auth_client, db):
+    from datetime import datetime
+    from app import models
+    auth_client.post("/products", json={
+        "name": "Test Product",
+        "sku": "TEST001",
+        "price": 10.0
+    })
+    auth_client.post("/warehouses", json={
+        "name": "Test Warehouse",
+        "location": "Test Location"
+    })
+    timestamps = [datetime(2024, 1, day) for day in (1, 2, 2, 3, 4)]
+    db.add_all([
+        models.StockMovement(product_id=1, warehouse_id=1, movement_type="in", quantity=i + 1, created_at=ts)
+        for i, ts in enumerate(timestamps)
+    ])
+    db.commit()
+
+    data = auth_client.get("/stock-movements", params={"created_from_date": "2024-01-02T00:00:00", "created_to_date": "2024-01-03T00:00:00"}).json()
+    assert [m["id"] for m in data["data"]] == [4, 3, 2]
+
+def test_export_stock_movements(auth_client, db):
+    import csv
+    import io
+    import json
+    from datetime import datetime
+    from app import models
+    auth_client.post("/products", json={
+        "name": "Test Product",
+        "sku": "TEST001",
+        "price": 10.0
+    })
+    auth_client.post("/warehouses", json={
+        "name": "Test Warehouse",
+        "location": "Test Location"
+    })
+    db.add_all([
+        models.StockMovement(product_id=1, warehouse_id=1, movement_type="in", quantity=10, user_id=1, created_at=datetime(2024, 1, 1)),
+        models.StockMovement(product_id=1, warehouse_id=1, movement_type="out", quantity=-4, user_id=1, created_at=datetime(2024, 1, 2), notes="order, #12"),
+    ])
+    db.commit()
+
+    response = auth_client.get("/stock-movements/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [r["quantity"] for r in rows] == [10, -4]
+    assert rows[0]["product_name"] == "Test Product"
+    assert rows[0]["username"] == "testuser"
+
+    response = auth_client.get("/stock-movements/export", params={"format": "csv", "movement_type": "out"})
+    assert response.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(rows) == 1
+    assert rows[0]["quantity"] == "-4"
+    assert rows[0]["notes"] == "order, #12"
+
+def test_fulfillment_allocation_prefers_fewest_sources_then_nearest(auth_client, db):
+    from app import models
+    auth_client.post("/products", json={"name": "Widget", "sku": "W1", "price": 1.0})
+    auth_client.post("/products", json={"name": "Gadget", "sku": "G1", "price": 1.0})
+    sites = [("Destination", 48.8566, 2.3522), ("Near", 48.8049, 2.1204), ("Far", 51.5074, -0.1278), ("Farther", 52.52, 13.405)]
+    for name, latitude, longitude in sites:
+        auth_client.post("/warehouses", json={"name": name, "location": name, "latitude": latitude, "longitude": longitude})
+    # Near holds only widgets; Far and Farther hold both, so one of them can fill the whole order
+    for product_id, warehouse_id, quantity in ((1, 2, 10), (1, 3, 6), (2, 3, 4), (1, 4, 6), (2, 4, 4)):
+        request_id = auth_client.post("/stock-movements", json={
+            "product_id": product_id, "warehouse_id": warehouse_id, "movement_type": "in", "quantity": quantity
+        }).json()["request_id"]
+        auth_client.post(f"/stock-movements/requests/{request_id}/approve", json={"action": "approve"})
+
+    payload = {"to_warehouse_id": 1, "items": [{"product_id": 1, "quantity": 5}, {"product_id": 2, "quantity": 3}]}
+    response = auth_client.post("/stock-movements/allocations", json=payload)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["fulfilled"] is True
+    assert data["source_warehouse_count"] == 1
+    assert {(a["product_id"], a["from_warehouse_id"], a["quantity"]) for a in data["allocations"]} == {(1, 3, 5), (2, 3, 3)}
+    assert data["request_ids"] == []
+
+    short = auth_client.post("/stock-movements/allocations", json={
+        "to_warehouse_id": 1, "items": [{"product_id": 2, "quantity": 10}]
+    }).json()
+    assert short["fulfilled"] is False
+    assert short["shortfall"] == [{"product_id": 2, "quantity": 2}]
+
+    created = auth_client.post("/stock-movements/allocations", json={**payload, "create_transfers": True}).json()
+    assert len(created["request_ids"]) == 2
+    requests = db.query(models.StockMovementRequest).filter(models.StockMovementRequest.id.in_(created["request_ids"])).all()
+    assert {(r.movement_type, r.from_warehouse_id, r.to_warehouse_id, r.quantity) for r in requests} == {
+        ("transfer", 3, 1, 5), ("transfer", 3, 1, 3)
+    }
+    balance = db.query(models.StockBalance).filter_by(product_id=1, warehouse_id=3).one()
+    assert balance.reserved_quantity == 5
+
+def test_fulfillment_allocation_preview_checks_warehouse_access(auth_client, client):
+    auth_client.post("/warehouses", json={"name": "Admin warehouse", "location": "Paris", "latitude": 48.8566, "longitude": 2.3522})
+    client.post("/auth/register", json={
+        "username": "other", "email": "other@example.com", "password": "Password1!", "role": "warehouse_owner"
+    })
+    token = client.post("/auth/login", data={"username": "other", "password": "Password1!"}).json()["access_token"]
+    other_headers = {"Authorization": f"Bearer {token}"}
+    client.post("/products", json={"name": "Widget", "sku": "W1", "price": 1.0}, headers=other_headers)
+    for name, latitude, longitude in (("Own A", 48.8049, 2.1204), ("Own B", 51.5074, -0.1278)):
+        client.post("/warehouses", json={"name": name, "location": name, "latitude": latitude, "longitude": longitude}, headers=other_headers)
+    for warehouse_id, quantity in ((1, 10), (3, 3)):
+        request_id = auth_client.post("/stock-movements", json={
+            "product_id": 1, "warehouse_id": warehouse_id, "movement_type": "in", "quantity": quantity
+        }).json()["request_id"]
+        auth_client.post(f"/stock-movements/requests/{request_id}/approve", json={"action": "approve"})
+
+    items = [{"product_id": 1, "quantity": 5}]
+    # Destination owned by someone else, even without creating transfers
+    response = client.post("/stock-movements/allocations", json={"to_warehouse_id": 1, "items": items}, headers=other_headers)
+    assert response.status_code == 403
+
+    # Stock in warehouses the caller cannot see is not offered as a source
+    response = client.post("/stock-movements/allocations", json={"to_warehouse_id": 2, "items": items}, headers=other_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert [(a["from_warehouse_id"], a["quantity"]) for a in data["allocations"]] == [(3, 3)]
+    assert data["shortfall"] == [{"product_id": 1, "quantity": 2}]
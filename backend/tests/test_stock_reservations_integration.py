@@ -0,0 +1,152 @@
+import threading
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.crud.stock_crud import reserve_stock, consume_stock_reservation, apply_stock_movements, apply_stock_delta
+from app.api.endpoints.stock_movements import build_stock_movements
+
+def create_product_and_warehouse(auth_client):
+    auth_client.post("/products", json={
+        "name": "Test Product",
+        "sku": "TEST001",
+        "price": 10.0
+    })
+    auth_client.post("/warehouses", json={
+        "name": "Test Warehouse",
+        "location": "Test Location"
+    })
+
+def test_out_request_reserves_stock(auth_client, db):
+    create_product_and_warehouse(auth_client)
+    db.add(models.StockBalance(product_id=1, warehouse_id=1, quantity=10))
+    db.commit()
+
+    response = auth_client.post("/stock-movements", json={
+        "product_id": 1,
+        "warehouse_id": 1,
+        "movement_type": "out",
+        "quantity": 7
+    })
+    assert response.status_code == 201
+    request_id = response.json()["request_id"]
+
+    # Only 3 units are left unreserved
+    response = auth_client.post("/stock-movements", json={
+        "product_id": 1,
+        "warehouse_id": 1,
+        "movement_type": "out",
+        "quantity": 4
+    })
+    assert response.status_code == 400
+    assert "Available stock: 3" in response.json()["detail"]
+
+    auth_client.post(f"/stock-movements/requests/{request_id}/approve", json={"action": "reject"})
+    db.expire_all()
+    balance = db.query(models.StockBalance).one()
+    assert (balance.quantity, balance.reserved_quantity) == (10, 0)
+
+def test_approval_revalidates_against_balance(auth_client, db):
+    create_product_and_warehouse(auth_client)
+    db.add(models.StockBalance(product_id=1, warehouse_id=1, quantity=10))
+    db.commit()
+    response = auth_client.post("/stock-movements", json={
+        "product_id": 1,
+        "warehouse_id": 1,
+        "movement_type": "out",
+        "quantity": 6
+    })
+    request_id = response.json()["request_id"]
+
+    # Stock disappears behind the reservation's back (e.g. a ledger correction)
+    db.query(models.StockBalance).update({models.StockBalance.quantity: 2})
+    db.commit()
+
+    response = auth_client.post(f"/stock-movements/requests/{request_id}/approve", json={"action": "approve"})
+    assert response.status_code == 409
+    assert db.query(models.StockMovement).count() == 0
+
+def test_concurrent_reserve_and_approve_never_oversells(auth_client, db):
+    create_product_and_warehouse(auth_client)
+    initial_stock = 20
+    workers = 40
+    db.add(models.StockBalance(product_id=1, warehouse_id=1, quantity=initial_stock))
+    db.commit()
+
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=db.get_bind())
+    approved = []
+    observed = []
+    errors = []
+    start_barrier = threading.Barrier(workers)
+
+    def worker():
+        session = Session()
+        try:
+            start_barrier.wait()
+            if not reserve_stock(session, 1, 1, 1):
+                session.rollback()
+                return
+            request = models.StockMovementRequest(
+                product_id=1, warehouse_id=1, movement_type="out", quantity=-1, user_id=1, status="pending"
+            )
+            session.add(request)
+            session.commit()
+
+            if not consume_stock_reservation(session, request):
+                session.rollback()
+                return
+            movements = build_stock_movements(request)
+            session.add_all(movements)
+            apply_stock_movements(session, [m for m in movements if m.quantity > 0])
+            request.status = "approved"
+            session.commit()
+            approved.append(request.id)
+            observed.append(session.query(models.StockBalance.quantity).scalar())
+        except Exception as e:
+            errors.append(e)
+            session.rollback()
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    assert len(approved) == initial_stock
+    assert min(observed) >= 0
+    db.expire_all()
+    balance = db.query(models.StockBalance).one()
+    assert (balance.quantity, balance.reserved_quantity) == (0, 0)
+    assert db.query(models.StockMovement).count() == initial_stock
+
+def test_concurrent_first_deltas_create_one_balance(auth_client, db):
+    create_product_and_warehouse(auth_client)
+    workers = 10
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=db.get_bind())
+    errors = []
+    start_barrier = threading.Barrier(workers)
+
+    def worker():
+        session = Session()
+        try:
+            start_barrier.wait()
+            apply_stock_delta(session, 1, 1, 1)
+            apply_stock_delta(session, 1, 1, 1)
+            session.commit()
+        except Exception as e:
+            errors.append(e)
+            session.rollback()
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    db.expire_all()
+    assert db.query(models.StockBalance.quantity).one()[0] == 2 * workers
@@ -52,3 +52,115 @@ def test_delete_warehouse(auth_client):
     assert response.status_code == 204
     response = auth_client.get("/warehouses/1")
     assert response.status_code == 404
+
+def test_list_warehouses_reads_maintained_stats(auth_client, db):
+    from app import models
+    from app.crud.stock_crud import rebuild_warehouse_stats
+    auth_client.post("/products", json={"name": "Test Product", "sku": "TEST001", "price": 10.0})
+    auth_client.post("/products", json={"name": "Other Product", "sku": "TEST002", "price": 2.0})
+    auth_client.post("/warehouses", json={"name": "Test Warehouse", "location": "Test Location"})
+    for product_id, movement_type, quantity in ((1, "in", 10), (2, "in", 5), (1, "out", 4)):
+        request_id = auth_client.post("/stock-movements", json={
+            "product_id": product_id,
+            "warehouse_id": 1,
+            "movement_type": movement_type,
+            "quantity": quantity
+        }).json()["request_id"]
+        response = auth_client.post(f"/stock-movements/requests/{request_id}/approve", json={"action": "approve"})
+        assert response.status_code == 200
+
+    data = auth_client.get("/warehouses").json()
+    assert (data[0]["product_count"], data[0]["total_value"]) == (2, 70.0)
+
+    # Repricing and deactivating products adjust the stats without touching the balances
+    auth_client.put("/products/1", json={"name": "Test Product", "sku": "TEST001", "price": 20.0})
+    auth_client.put("/products/2", json={"name": "Other Product", "sku": "TEST002", "price": 2.0, "is_active": False})
+    data = auth_client.get("/warehouses").json()
+    assert (data[0]["product_count"], data[0]["total_value"]) == (1, 120.0)
+
+    auth_client.delete("/products/1")
+    data = auth_client.get("/warehouses").json()
+    assert (data[0]["product_count"], data[0]["total_value"]) == (0, 0.0)
+
+    # The maintained rows agree with a rebuild from the balances
+    maintained = {(s.warehouse_id, s.product_count, s.total_value) for s in db.query(models.WarehouseStats) if s.product_count}
+    rebuild_warehouse_stats(db)
+    assert {(s.warehouse_id, s.product_count, s.total_value) for s in db.query(models.WarehouseStats)} == maintained
+
+def test_warehouse_stats_count_stock_received_while_product_inactive(auth_client):
+    auth_client.post("/products", json={"name": "Test Product", "sku": "TEST001", "price": 10.0})
+    auth_client.post("/warehouses", json={"name": "Test Warehouse", "location": "Test Location"})
+    request_id = auth_client.post("/stock-movements", json={
+        "product_id": 1,
+        "warehouse_id": 1,
+        "movement_type": "in",
+        "quantity": 3
+    }).json()["request_id"]
+    auth_client.put("/products/1", json={"name": "Test Product", "sku": "TEST001", "price": 10.0, "is_active": False})
+    response = auth_client.post(f"/stock-movements/requests/{request_id}/approve", json={"action": "approve"})
+    assert response.status_code == 200
+    data = auth_client.get("/warehouses").json()
+    assert (data[0]["product_count"], data[0]["total_value"]) == (0, 0.0)
+
+    # The warehouse has no stats row yet; reactivating must create it
+    auth_client.put("/products/1", json={"name": "Test Product", "sku": "TEST001", "price": 10.0, "is_active": True})
+    data = auth_client.get("/warehouses").json()
+    assert (data[0]["product_count"], data[0]["total_value"]) == (1, 30.0)
+    assert auth_client.get("/warehouses/1/details").json()["product_count"] == 1
+
+def test_nearest_warehouses_with_stock(auth_client):
+    auth_client.post("/products", json={"name": "Test Product", "sku": "TEST001", "price": 10.0})
+    sites = [
+        ("Paris", 48.8566, 2.3522),
+        ("Versailles", 48.8049, 2.1204),
+        ("London", 51.5074, -0.1278),
+        ("Closed Paris", 48.86, 2.35),
+        ("Empty Paris", 48.85, 2.34),
+    ]
+    for name, latitude, longitude in sites:
+        auth_client.post("/warehouses", json={"name": name, "location": name, "latitude": latitude, "longitude": longitude})
+    for warehouse_id in (1, 2, 3, 4):
+        request_id = auth_client.post("/stock-movements", json={
+            "product_id": 1, "warehouse_id": warehouse_id, "movement_type": "in", "quantity": 5
+        }).json()["request_id"]
+        auth_client.post(f"/stock-movements/requests/{request_id}/approve", json={"action": "approve"})
+    auth_client.patch("/warehouses/4/availability")
+
+    response = auth_client.get("/warehouses/nearest", params={"product_id": 1, "latitude": 48.86, "longitude": 2.34})
+    assert response.status_code == 200
+    data = response.json()
+    assert [w["name"] for w in data] == ["Paris", "Versailles", "London"]
+    assert data[0]["available_quantity"] == 5
+    assert 330 < data[2]["distance_km"] < 350
+
+    nearby = auth_client.get("/warehouses/nearest", params={
+        "product_id": 1, "latitude": 48.86, "longitude": 2.34, "radius_km": 50, "limit": 1
+    }).json()
+    assert [w["name"] for w in nearby] == ["Paris"]
+
+    assert auth_client.get("/warehouses/nearest", params={"product_id": 99, "latitude": 0, "longitude": 0}).status_code == 404
+
+def test_nearest_warehouses_checks_product_owner_and_warehouse_access(auth_client, client):
+    auth_client.post("/products", json={"name": "Test Product", "sku": "TEST001", "price": 10.0})
+    auth_client.post("/warehouses", json={"name": "Paris", "location": "Paris", "latitude": 48.8566, "longitude": 2.3522})
+    client.post("/auth/register", json={
+        "username": "other", "email": "other@example.com", "password": "Password1!", "role": "warehouse_owner"
+    })
+    token = client.post("/auth/login", data={"username": "other", "password": "Password1!"}).json()["access_token"]
+    other_headers = {"Authorization": f"Bearer {token}"}
+    params = {"latitude": 48.86, "longitude": 2.34}
+
+    # Someone else's product
+    response = client.get("/warehouses/nearest", params={"product_id": 1, **params}, headers=other_headers)
+    assert response.status_code == 403
+
+    # Their own product, stocked only in a warehouse they do not own
+    client.post("/products", json={"name": "Other Product", "sku": "OTHER001", "price": 10.0}, headers=other_headers)
+    request_id = auth_client.post("/stock-movements", json={
+        "product_id": 2, "warehouse_id": 1, "movement_type": "in", "quantity": 5
+    }).json()["request_id"]
+    auth_client.post(f"/stock-movements/requests/{request_id}/approve", json={"action": "approve"})
+    assert [w["name"] for w in auth_client.get("/warehouses/nearest", params={"product_id": 2, **params}).json()] == ["Paris"]
+    response = client.get("/warehouses/nearest", params={"product_id": 2, **params}, headers=other_headers)
+    assert response.status_code == 200
+    assert response.json() == []
@@ -171,15 +171,29 @@ export const auth = {
 };
 
 export const stockMovements = {
-  list: async (token) => {
+  // One keyset page: { data, pagination: { page_size, next_cursor } }. Pass
+  // pagination.next_cursor back as params.cursor to fetch the next page.
+  list: async (token, params = {}) => {
     try {
-      const response = await api.get('/stock-movements', { headers: authHeader(token) });
+      const response = await api.get('/stock-movements', { headers: authHeader(token), params });
       return response.data;
     } catch (error) {
       throw new Error(error.response?.data?.detail || 'Failed to fetch stock movements');
     }
   },
 
+  // Follows next_cursor until the ledger is exhausted and returns every movement
+  listAll: async (token, params = {}) => {
+    const movements = [];
+    let cursor = null;
+    do {
+      const page = await stockMovements.list(token, { ...params, page_size: 1000, ...(cursor ? { cursor } : {}) });
+      movements.push(...page.data);
+      cursor = page.pagination.next_cursor;
+    } while (cursor);
+    return movements;
+  },
+
   create: async (data, token) => {
     try {
       const response = await api.post('/stock-movements', data, {
@@ -28,7 +28,7 @@ export default function DashboardPage() {
     try {
       const [statsRes, movementsRes] = await Promise.allSettled([
         dashboard.stats(token),
-        stockMovements.list(token),
+        stockMovements.listAll(token),
       ]);
 
       if (statsRes.status === "rejected") {
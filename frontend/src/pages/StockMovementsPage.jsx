@@ -6,6 +6,8 @@ import PendingStockRequests from "../components/PendingStockRequests";
 export default function StockMovementsPage() {
   const { token, user } = useAuth();
   const [movements, setMovements] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [productsList, setProductsList] = useState([]);
   const [warehousesList, setWarehousesList] = useState([]);
   const [loading, setLoading] = useState(false);
@@ -32,7 +34,8 @@ export default function StockMovementsPage() {
         products.list({ include_inactive: false }, token),
         warehouses.list(token),
       ]);
-      setMovements(Array.isArray(m) ? m : []);
+      setMovements(Array.isArray(m.data) ? m.data : []);
+      setNextCursor(m.pagination?.next_cursor || null);
       setProductsList(Array.isArray(p.data) ? p.data : []);
       setWarehousesList(Array.isArray(w) ? w : []);
     } catch (e) {
@@ -41,6 +44,21 @@ export default function StockMovementsPage() {
     }
   }
 
+  async function loadMore() {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const page = await stockMovements.list(token, { cursor: nextCursor });
+      setMovements((current) => [...current, ...page.data]);
+      setNextCursor(page.pagination.next_cursor || null);
+    } catch (e) {
+      console.error(e);
+      setError("Failed to load more movements: " + e.message);
+    } finally {
+      setLoadingMore(false);
+    }
+  }
+
   async function checkStockDistribution(productId) {
     if (!productId || actionType === "transfer") {
       setStockDistribution({});
@@ -305,6 +323,17 @@ export default function StockMovementsPage() {
             )}
           </tbody>
         </table>
+        {nextCursor && (
+          <div className="p-4 text-center border-t">
+            <button
+              className="bg-gray-100 hover:bg-gray-200 rounded px-4 py-2 font-medium disabled:opacity-50"
+              onClick={loadMore}
+              disabled={loadingMore}
+            >
+              {loadingMore ? "Loading..." : "Load more"}
+            </button>
+          </div>
+        )}
       </div>
     </div>
   );